@@ -13,6 +13,7 @@ from . import yin_parser
 from . import grammar
 from . import util
 from . import statements
+from . import cache
 
 __version__ = '1.7.3'
 __date__ = '2017-06-27'
@@ -33,7 +34,9 @@ class Context(object):
 
         self.strict = False
         self.repository = repository
-        self.errors = []
+        self.errors = error.ErrorList()
+        """an `error.ErrorList` of (pos, tag, args) tuples, see
+        set_error_sink()"""
         self.canonical = False
         self.max_line_len = None
         self.max_identifier_len = None
@@ -45,6 +48,19 @@ class Context(object):
         self.max_status = None
         self.keep_comments = False
         self.ensure_hyphenated_names = False
+        self.parse_cache = None
+        """a `cache.ParseCache` instance, or None"""
+        self.lazy_validation = False
+        """if True, imported modules are validated only as far as needed"""
+        self.phase_timer = None
+        """a `bench.Timer` which measures the time spent parsing and in
+        each validation phase, or None"""
+        self.error_budget = None
+        """an `error.ErrorBudget`; if set, validation stops when it is
+        exhausted, see too_many_errors()"""
+        self.validation_depth = 0
+        """the number of modules being validated; an imported module is
+        validated while the importing module is validated"""
 
         for mod, rev, handle in self.repository.get_modules_and_revisions(self):
             if mod not in self.revs:
@@ -54,25 +70,22 @@ class Context(object):
 
     def add_module(self, ref, text, format=None,
                    expect_modulename=None, expect_revision=None,
-                   expect_failure_error=True):
+                   expect_failure_error=True, lazy=False):
         """Parse a module text and add the module data to the context
 
         `ref` is a string which is used to identify the source of
               the text for the user.  used in error messages
         `text` is the raw text data
         `format` is one of 'yang' or 'yin'.
+        `lazy` is True if the module should be validated lazily, see
+              statements.validate_module().
 
         Returns the parsed and validated module on success, and None on error.
         """
         if format == None:
             format = util.guess_format(text)
 
-        if format == 'yin':
-            p = yin_parser.YinParser()
-        else:
-            p = yang_parser.YangParser()
-
-        module = p.parse(self, ref, text)
+        module = self._parse(ref, text, format)
         if module is None:
             return None
 
@@ -100,9 +113,30 @@ class Context(object):
             revs = self.revs[module.arg]
             revs.append((latest_rev, None))
 
-        return self.add_parsed_module(module)
+        return self.add_parsed_module(module, lazy)
 
-    def add_parsed_module(self, module):
+    def _parse(self, ref, text, format, extra={}):
+        """Parse `text` with the parser for `format`.
+
+        YANG modules are looked up in the parse cache, if enabled.
+        YIN modules are never cached, since the result of the YIN parser
+        depends on other modules.
+        """
+        if self.phase_timer is not None:
+            self.phase_timer.start('parse')
+        try:
+            if format == 'yin':
+                p = yin_parser.YinParser(extra)
+            elif self.parse_cache is not None:
+                return self.parse_cache.parse(self, ref, text)
+            else:
+                p = yang_parser.YangParser(extra)
+            return p.parse(self, ref, text)
+        finally:
+            if self.phase_timer is not None:
+                self.phase_timer.stop()
+
+    def add_parsed_module(self, module, lazy=False):
         if module is None:
             return None
         if module.arg is None:
@@ -119,10 +153,12 @@ class Context(object):
         rev = util.get_latest_revision(module)
         if (module.arg, rev) in self.modules:
             other = self.modules[(module.arg, rev)]
+            if not lazy:
+                statements.complete_module(self, other)
             return other
 
         self.modules[(module.arg, rev)] = module
-        statements.validate_module(self, module)
+        statements.validate_module(self, module, lazy)
 
         return module
 
@@ -157,7 +193,13 @@ class Context(object):
         while i < length:
             (rev, handle) = revs[i]
             if rev is None:
-                # now we must read the revision from the module
+                # scan the module header for the revision
+                rev = self.repository.get_revision_from_handle(self, handle)
+                if rev is not None:
+                    revs[i] = (rev, handle)
+                    i += 1
+                    continue
+                # otherwise parse the entire module
                 try:
                     r = self.repository.get_module_from_handle(handle)
                 except self.repository.ReadError as ex:
@@ -170,24 +212,31 @@ class Context(object):
 
                 if format == 'yin':
                     yintext = text
-                    p = yin_parser.YinParser({'no_include':True,
-                                              'no_extensions':True})
                 else:
                     yintext = None
-                    p = yang_parser.YangParser()
 
-                module = p.parse(self, ref, text)
+                module = self._parse(ref, text, format,
+                                     {'no_include':True,
+                                      'no_extensions':True})
                 if module is not None:
                     rev = util.get_latest_revision(module)
                     revs[i] = (rev, ('parsed', module, ref, yintext))
             i += 1
 
-    def search_module(self, pos, modulename, revision=None):
+    def search_module(self, pos, modulename, revision=None, lazy=False):
         """Searches for a module named `modulename` in the repository
 
-        If the module is found, it is added to the context.
+        If the module is found, it is added to the context.  If `lazy`
+        is True, the module is validated lazily, see
+        statements.validate_module().
         Returns the module if found, and None otherwise"""
 
+        module = self._search_module(pos, modulename, revision, lazy)
+        if module is not None and not lazy:
+            statements.complete_module(self, module)
+        return module
+
+    def _search_module(self, pos, modulename, revision, lazy):
         if modulename not in self.revs:
             # this module doesn't exist in the repos at all
             error.err_add(self.errors, pos, 'MODULE_NOT_FOUND', modulename)
@@ -232,20 +281,20 @@ class Context(object):
                               (module.arg, ref, modulename))
                 module = None
             elif yintext is None:
-                module = self.add_parsed_module(handle[1])
+                module = self.add_parsed_module(handle[1], lazy)
             else:
                 p = yin_parser.YinParser()
                 self.yin_module_map[module.arg] = []
                 module = p.parse(self, ref, yintext)
                 if module is not None:
-                    module = self.add_parsed_module(module)
+                    module = self.add_parsed_module(module, lazy)
         else:
             # get it from the repos
             try:
                 r = self.repository.get_module_from_handle(handle)
                 (ref, format, text) = r
                 module = self.add_module(ref, text, format,
-                                         modulename, revision)
+                                         modulename, revision, lazy=lazy)
             except self.repository.ReadError as ex:
                 error.err_add(self.errors, pos, 'READ_ERROR', str(ex))
                 module = None
@@ -309,15 +358,29 @@ class Context(object):
                 if format == None:
                     format = util.guess_format(text)
 
-                if format == 'yin':
-                    p = yin_parser.YinParser(extra)
-                else:
-                    p = yang_parser.YangParser(extra)
-
-                return p.parse(self, ref, text)
+                return self._parse(ref, text, format, extra)
             except self.repository.ReadError as ex:
                 return None
 
+    def set_error_sink(self, sink):
+        """Call `sink` with each error as it is reported
+
+        `sink` is called as sink(pos, tag, args) for each error which
+        is added to `errors` from now on, before validation is done.
+        The errors are still kept in `errors`.  If `sink` is None, no
+        function is called.
+        """
+        self.errors.sink = sink
+
+    def too_many_errors(self):
+        """Return True if the error budget is exhausted
+
+        When it is, the remaining validation phases of all modules are
+        skipped, and no more modules are imported.
+        """
+        return (self.error_budget is not None and
+                self.error_budget.exhausted(self.errors))
+
     def validate(self):
         uris = {}
         for k in self.modules:
@@ -360,6 +423,24 @@ class Repository(object):
         Raises `ReadError`
         """
 
+    def get_revision_from_handle(self, ctx, handle):
+        """Return the latest revision of the module in `handle`
+
+        Only the header of the module is scanned.  Returns "unknown"
+        if the module has no revision, and None if the revision cannot
+        be found without parsing the entire module.
+        """
+        try:
+            (ref, format, text) = self.get_module_from_handle(handle)
+        except self.ReadError:
+            return None
+        if format == None:
+            format = util.guess_format(text)
+        if format == 'yin':
+            return yin_parser.peek_revision(ref, text)
+        else:
+            return yang_parser.peek_revision(ref, text)
+
     class ReadError(Exception):
         """Signals that an error occured during module retrieval"""
 
@@ -439,27 +520,17 @@ class FileRepository(Repository):
         for d in self.dirs:
             add_files_from_dir(d)
 
-    # FIXME: bad strategy; when revisions are not used in the filename
-    # this code parses all modules :(  need to do this lazily
-    def _peek_revision(self, absfilename, format, ctx):
-        try:
-            fd = io.open(absfilename, "r", encoding="utf-8")
-            text = fd.read()
-        except IOError as ex:
-            return None
-        except UnicodeDecodeError as ex:
-            return None
-        if format == 'yin':
-            p = yin_parser.YinParser()
-        else:
-            p = yang_parser.YangParser()
-
-        # FIXME: optimization - do not parse the entire text
-        # just to read the revisions...
-        module = p.parse(ctx, absfilename, text)
-        if module is None:
-            return None
-        return (util.get_latest_revision(module), module)
+    def get_revision_from_handle(self, ctx, handle):
+        (format, absfilename) = handle
+        cache = ctx.parse_cache
+        if cache is not None:
+            rev = cache.get_revision(absfilename)
+            if rev is not None:
+                return rev
+        rev = Repository.get_revision_from_handle(self, ctx, handle)
+        if cache is not None and rev is not None:
+            cache.add_revision(absfilename, rev)
+        return rev
 
     def get_modules_and_revisions(self, ctx):
         if self.modules is None:
@@ -0,0 +1,559 @@
+"""Benchmarks for parsing, validating and emitting YANG modules
+
+A benchmark run parses and validates each corpus of modules, and emits
+the modules in some output formats.  The time spent in parsing, in each
+validation phase, and in each output format is measured, together with
+the peak memory used.  The results can be saved as JSON, and compared
+with the results from an earlier run, in order to find performance
+regressions.
+
+The corpora are the directories `modules/ietf`, `modules/iana` and
+`test/test_good` in the pyang source tree, and a set of generated
+modules, whose size is controlled by the `--scale` option.
+"""
+
+import os
+import sys
+import io
+import json
+import time
+import shutil
+import tempfile
+import optparse
+
+if sys.version < '3':
+    from StringIO import StringIO
+else:
+    from io import StringIO
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+import pyang
+from . import plugin
+from . import error
+
+if hasattr(time, 'perf_counter'):
+    clock = time.perf_counter
+else:
+    clock = time.time
+
+default_formats = ['yang', 'yin', 'tree', 'jstree', 'depend']
+
+class Timer(object):
+    """Measures the time spent in named sections, which may be nested
+
+    The time spent in a nested section is not included in the time of
+    the enclosing section.  A Timer can be set as `ctx.phase_timer`, in
+    order to measure the time spent parsing and in each validation phase.
+    """
+
+    def __init__(self):
+        self.times = {}
+        """dict of name:seconds"""
+        self.stack = []
+        self.started = None
+
+    def start(self, name):
+        now = clock()
+        if len(self.stack) > 0:
+            self._add(self.stack[-1], now - self.started)
+        self.stack.append(name)
+        self.started = now
+
+    def stop(self):
+        now = clock()
+        self._add(self.stack.pop(), now - self.started)
+        self.started = now
+
+    def _add(self, name, t):
+        self.times[name] = self.times.get(name, 0.0) + t
+
+class Corpus(object):
+    """A set of YANG files, and the directories to search for imports"""
+
+    def __init__(self, name, filenames, path):
+        self.name = name
+        self.filenames = filenames
+        self.path = path
+
+def source_dir():
+    """Return the top directory of the pyang source tree"""
+    return os.path.dirname(os.path.dirname(os.path.abspath(pyang.__file__)))
+
+def dir_corpus(name, dirname, path=[]):
+    filenames = [os.path.join(dirname, f)
+                 for f in sorted(os.listdir(dirname)) if f.endswith('.yang')]
+    return Corpus(name, filenames, [dirname] + path)
+
+def modules_path():
+    """Return the directories with the modules shipped with pyang"""
+    top = os.path.join(source_dir(), 'modules')
+    if not os.path.isdir(top):
+        # use the installed modules
+        top = os.path.join(sys.prefix, 'share', 'yang', 'modules')
+    return [os.path.join(top, 'ietf'), os.path.join(top, 'iana')]
+
+def builtin_corpora():
+    """Return a dict of name:Corpus for the corpora in the source tree"""
+    top = source_dir()
+    modules = modules_path()
+    res = {}
+    for (name, dirname) in [('ietf', modules[0]),
+                            ('iana', modules[1]),
+                            ('test_good', os.path.join(top, 'test',
+                                                       'test_good'))]:
+        if os.path.isdir(dirname):
+            res[name] = dir_corpus(name, dirname, modules)
+    return res
+
+def generate_modules(dirname, scale):
+    """Write generated modules with `scale` top-level nodes to `dirname`
+
+    The modules use the features that are typically expensive to
+    validate: groupings used many times, typedef chains, identities,
+    augments, leafrefs and XPath expressions.
+    """
+    types = []
+    types.append('module bench-types {\n'
+                 '  namespace "urn:example:bench-types";\n'
+                 '  prefix bt;\n\n'
+                 '  identity base-id;\n')
+    for i in range(scale):
+        types.append('  identity id-%d { base base-id; }\n' % i)
+        if i == 0:
+            types.append('  typedef t-0 { type uint32 { range "0..%d"; } }\n'
+                         % (scale * 1000))
+        else:
+            types.append('  typedef t-%d { type t-%d; default %d; }\n'
+                         % (i, i - 1, i))
+    types.append('  grouping endpoint {\n'
+                 '    description "An endpoint, used in many places.";\n'
+                 '    leaf name {\n'
+                 '      type string { length "1..64"; pattern "[a-z0-9-]+"; }\n'
+                 '      description "The name of the endpoint.";\n'
+                 '    }\n'
+                 '    leaf address { type string; description "Address."; }\n'
+                 '    leaf port { type uint16; default 830; }\n'
+                 '    leaf kind { type identityref { base base-id; } }\n'
+                 '    container options {\n'
+                 '      leaf enabled { type boolean; default true; }\n'
+                 '      leaf-list tag { type string; }\n'
+                 '    }\n'
+                 '  }\n'
+                 '}\n')
+    write_file(os.path.join(dirname, 'bench-types.yang'), ''.join(types))
+
+    data = []
+    data.append('module bench-data {\n'
+                '  namespace "urn:example:bench-data";\n'
+                '  prefix bd;\n\n'
+                '  import bench-types { prefix bt; }\n\n')
+    for i in range(scale):
+        data.append(
+            '  container c-%d {\n'
+            '    description "Container number %d.";\n'
+            '    list entry {\n'
+            '      key name;\n'
+            '      uses bt:endpoint;\n'
+            '      leaf value { type bt:t-%d; }\n'
+            '      leaf ref {\n'
+            '        type leafref { path "../../entry/name"; }\n'
+            '        must "../value > 0";\n'
+            '      }\n'
+            '    }\n'
+            '    container peer {\n'
+            '      when "../entry";\n'
+            '      uses bt:endpoint {\n'
+            '        refine port { default %d; }\n'
+            '      }\n'
+            '    }\n'
+            '  }\n' % (i, i, i, 1000 + i))
+    data.append('}\n')
+    write_file(os.path.join(dirname, 'bench-data.yang'), ''.join(data))
+
+    aug = []
+    aug.append('module bench-augment {\n'
+               '  namespace "urn:example:bench-augment";\n'
+               '  prefix ba;\n\n'
+               '  import bench-data { prefix bd; }\n'
+               '  import bench-types { prefix bt; }\n\n')
+    for i in range(scale):
+        aug.append('  augment "/bd:c-%d/bd:entry" {\n'
+                   '    leaf extra { type bt:t-%d; }\n'
+                   '  }\n' % (i, i))
+    aug.append('}\n')
+    write_file(os.path.join(dirname, 'bench-augment.yang'), ''.join(aug))
+
+def write_file(filename, text):
+    fd = open(filename, 'w')
+    try:
+        fd.write(text)
+    finally:
+        fd.close()
+
+def read_file(filename):
+    fd = io.open(filename, 'r', encoding='utf-8')
+    try:
+        return fd.read()
+    finally:
+        fd.close()
+
+def make_context(o, corpus, emit_obj=None):
+    repos = pyang.FileRepository(os.pathsep.join(corpus.path),
+                                 use_env=False)
+    ctx = pyang.Context(repos)
+    ctx.opts = o
+    for p in plugin.plugins:
+        p.setup_ctx(ctx)
+    if emit_obj is not None:
+        emit_obj.setup_fmt(ctx)
+    return ctx
+
+def load_corpus(ctx, texts):
+    modules = []
+    for (filename, text) in texts:
+        module = ctx.add_module(filename, text)
+        if module is not None:
+            modules.append(module)
+    return modules
+
+def run_corpus(o, corpus, fmts, formats):
+    """Run the benchmark for `corpus` once
+
+    Returns a dict with the times spent in each phase and output format,
+    and the number of modules and errors.
+    """
+    texts = [(f, read_file(f)) for f in corpus.filenames]
+    ctx = make_context(o, corpus)
+    timer = Timer()
+    ctx.phase_timer = timer
+    start = clock()
+    modules = load_corpus(ctx, texts)
+    timer.start('context')
+    ctx.validate()
+    timer.stop()
+    total = clock() - start
+    res = {'modules': len(modules),
+           'errors': len([e for e in ctx.errors
+                          if error.is_error(error.err_level(e[1]))]),
+           'phases': timer.times,
+           'total': total,
+           'formats': {}}
+    for f in formats:
+        (t, skipped) = run_format(o, corpus, texts, f, fmts[f])
+        res['formats'][f] = t
+        if skipped > 0:
+            res.setdefault('skipped', {})[f] = skipped
+    return res
+
+def run_format(o, corpus, texts, name, emit_obj):
+    """Return (time, skipped) for emitting the modules in `texts`
+
+    The modules are validated as the pyang front-end does for the
+    output format, but only the time spent in emit() is measured.
+    Modules which the format cannot handle, i.e. for which emit()
+    raises EmitError, are skipped and counted in `skipped`.  The time
+    is None if no module could be emitted.
+    """
+    ctx = make_context(o, corpus, emit_obj)
+    modules = [m for m in load_corpus(ctx, texts) if m.keyword == 'module']
+    emit_obj.pre_validate(ctx, modules)
+    ctx.validate()
+    emit_obj.post_validate(ctx, modules)
+    if emit_obj.multiple_modules:
+        batches = [modules]
+    else:
+        batches = [[m] for m in modules]
+    total = 0.0
+    skipped = 0
+    msg = None
+    while len(batches) > 0:
+        batch = batches.pop(0)
+        start = clock()
+        try:
+            emit_obj.emit(ctx, batch, StringIO())
+        except error.EmitError as ex:
+            if len(batch) > 1:
+                # emit the modules one by one, to skip only those which
+                # the format cannot handle
+                batches[0:0] = [[m] for m in batch]
+                continue
+            skipped += 1
+            if msg is None:
+                msg = ex.msg
+            continue
+        except Exception as ex:
+            sys.stderr.write("%s: -f %s failed: %r\n" %
+                             (corpus.name, name, ex))
+            return (None, skipped)
+        total += clock() - start
+    if skipped > 0:
+        sys.stderr.write("%s: -f %s: %d of %d modules skipped: %s\n" %
+                         (corpus.name, name, skipped, len(modules), msg))
+    if skipped == len(modules) and skipped > 0:
+        return (None, skipped)
+    return (total, skipped)
+
+def peak_memory(o, corpus):
+    """Return the peak memory in bytes used to validate `corpus`, or None"""
+    if tracemalloc is None:
+        return None
+    texts = [(f, read_file(f)) for f in corpus.filenames]
+    tracemalloc.start()
+    try:
+        ctx = make_context(o, corpus)
+        load_corpus(ctx, texts)
+        ctx.validate()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def merge_min(best, res):
+    """Keep the minimum of each time in `best` and `res`"""
+    if best is None:
+        return res
+    for key in ('phases', 'formats'):
+        for (name, t) in res[key].items():
+            if name not in best[key] or best[key][name] is None:
+                best[key][name] = t
+            elif t is not None:
+                best[key][name] = min(best[key][name], t)
+    best['total'] = min(best['total'], res['total'])
+    return best
+
+def max_rss():
+    """Return the peak resident set size of this process in bytes"""
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        return rss
+    return rss * 1024
+
+def compare(results, baseline, threshold, min_time):
+    """Compare `results` with `baseline`
+
+    Returns a list of strings describing each time that is more than
+    `threshold` percent slower than in the baseline, and at least
+    `min_time` seconds slower.
+    """
+    res = []
+    def chk(what, t, bt):
+        if t is None or bt is None:
+            return
+        if t > bt * (1 + threshold / 100.0) and t - bt >= min_time:
+            res.append("%s: %.4fs, baseline %.4fs (%s)" %
+                       (what, t, bt, increase(t, bt)))
+    for (name, r) in sorted(results['corpora'].items()):
+        b = baseline.get('corpora', {}).get(name)
+        if b is None:
+            continue
+        chk('%s total' % name, r['total'], b.get('total'))
+        for key in ('phases', 'formats'):
+            for (n, t) in sorted(r[key].items()):
+                chk('%s %s' % (name, n), t, b.get(key, {}).get(n))
+        if (r.get('peak-memory') is not None and
+            b.get('peak-memory') is not None):
+            m = r['peak-memory']
+            bm = b['peak-memory']
+            if m > bm * (1 + threshold / 100.0):
+                res.append("%s peak memory: %d bytes, baseline %d bytes "
+                           "(%s)" % (name, m, bm, increase(m, bm)))
+    return res
+
+def increase(v, bv):
+    """Return the increase from the baseline `bv` to `v` in percent"""
+    if bv == 0:
+        # e.g. a phase which took no measurable time in the baseline
+        return "+inf%"
+    return "+%.0f%%" % ((v - bv) * 100.0 / bv)
+
+def print_results(results, fd):
+    for (name, r) in sorted(results['corpora'].items()):
+        fd.write("%s: %d modules, %d errors, total %.4fs" %
+                 (name, r['modules'], r['errors'], r['total']))
+        if r.get('peak-memory') is not None:
+            fd.write(", peak memory %.1fMB" % (r['peak-memory'] / 1e6))
+        fd.write("\n")
+        for phase in phase_order(r['phases']):
+            fd.write("  %-22s %.4fs\n" % (phase, r['phases'][phase]))
+        for (f, t) in sorted(r['formats'].items()):
+            if t is None:
+                fd.write("  %-22s failed" % ('-f ' + f))
+            else:
+                fd.write("  %-22s %.4fs" % ('-f ' + f, t))
+            skipped = r.get('skipped', {}).get(f)
+            if skipped is not None:
+                fd.write(" (%d modules skipped)" % skipped)
+            fd.write("\n")
+    if results.get('max-rss') is not None:
+        fd.write("max rss: %.1fMB\n" % (results['max-rss'] / 1e6))
+
+def phase_order(phases):
+    from . import statements
+    order = ['parse'] + statements._validation_phases + ['context']
+    return ([p for p in order if p in phases] +
+            sorted([p for p in phases if p not in order]))
+
+def main(args=None):
+    usage = """%prog [options]
+
+Measures the time spent parsing, validating and emitting YANG modules."""
+    optparser = optparse.OptionParser(usage)
+    optparser.version = '%prog ' + pyang.__version__
+    optparser.add_option("-c", "--corpus",
+                         dest="corpora",
+                         action="append",
+                         default=[],
+                         metavar="NAME",
+                         help="Run the benchmark for the corpus NAME, one " \
+                         "of ietf, iana, test_good and generated.  " \
+                         "This option can be given multiple times.  " \
+                         "Default is all corpora, unless --corpus-dir " \
+                         "is given.")
+    optparser.add_option("-d", "--corpus-dir",
+                         dest="corpus_dirs",
+                         action="append",
+                         default=[],
+                         metavar="DIR",
+                         help="Run the benchmark for the modules in DIR.")
+    optparser.add_option("-f", "--format",
+                         dest="formats",
+                         action="append",
+                         default=[],
+                         help="Measure the output format FORMAT.  This " \
+                         "option can be given multiple times.  Default is " \
+                         + ", ".join(default_formats) + ".")
+    optparser.add_option("-n", "--repeat",
+                         dest="repeat",
+                         type="int",
+                         default=3,
+                         help="Run each benchmark N times, and report the " \
+                         "best time.  Default is 3.")
+    optparser.add_option("--scale",
+                         dest="scale",
+                         type="int",
+                         default=200,
+                         help="Number of top-level nodes in the generated " \
+                         "modules.  Default is 200.")
+    optparser.add_option("-o", "--output",
+                         dest="output",
+                         metavar="FILE",
+                         help="Write the results as JSON to FILE.")
+    optparser.add_option("-b", "--baseline",
+                         dest="baseline",
+                         metavar="FILE",
+                         help="Compare the results with the results in " \
+                         "FILE, and exit with status 1 if any of them is " \
+                         "slower.")
+    optparser.add_option("--threshold",
+                         dest="threshold",
+                         type="float",
+                         default=20.0,
+                         metavar="PERCENT",
+                         help="Report a regression if a time is more than " \
+                         "PERCENT percent slower than in the baseline.  " \
+                         "Default is 20.")
+    optparser.add_option("--min-time",
+                         dest="min_time",
+                         type="float",
+                         default=0.005,
+                         metavar="SECONDS",
+                         help="Ignore regressions smaller than SECONDS.  " \
+                         "Default is 0.005.")
+    optparser.add_option("--no-memory",
+                         dest="memory",
+                         action="store_false",
+                         default=True,
+                         help="Do not measure the peak memory.")
+
+    plugin.init([])
+    fmts = {}
+    for p in plugin.plugins:
+        p.add_output_format(fmts)
+        p.add_opts(optparser)
+
+    (o, args) = optparser.parse_args(args)
+    # options used by plugins in the pyang front-end
+    o.features = []
+    o.path = []
+
+    formats = o.formats or [f for f in default_formats if f in fmts]
+    for f in formats:
+        if f not in fmts:
+            sys.stderr.write("unsupported format '%s'\n" % f)
+            return 1
+
+    corpora = builtin_corpora()
+    names = o.corpora
+    if len(names) == 0 and len(o.corpus_dirs) == 0:
+        names = sorted(corpora.keys()) + ['generated']
+    tmpdir = None
+    try:
+        selected = []
+        for name in names:
+            if name == 'generated':
+                tmpdir = tempfile.mkdtemp()
+                generate_modules(tmpdir, o.scale)
+                corpora[name] = dir_corpus(name, tmpdir)
+            elif name not in corpora:
+                sys.stderr.write("unknown corpus '%s'\n" % name)
+                return 1
+            selected.append(corpora[name])
+        for d in o.corpus_dirs:
+            selected.append(dir_corpus(os.path.basename(os.path.normpath(d)),
+                                       d, modules_path()))
+
+        results = {'pyang-version': pyang.__version__,
+                   'python-version': sys.version.split()[0],
+                   'repeat': o.repeat,
+                   'scale': o.scale,
+                   'corpora': {}}
+        for corpus in selected:
+            best = None
+            for _i in range(o.repeat):
+                best = merge_min(best, run_corpus(o, corpus, fmts, formats))
+            if o.memory:
+                best['peak-memory'] = peak_memory(o, corpus)
+            results['corpora'][corpus.name] = best
+        results['max-rss'] = max_rss()
+    finally:
+        if tmpdir is not None:
+            shutil.rmtree(tmpdir)
+
+    print_results(results, sys.stdout)
+
+    if o.output is not None:
+        fd = open(o.output, 'w')
+        try:
+            json.dump(results, fd, indent=2, sort_keys=True)
+            fd.write('\n')
+        finally:
+            fd.close()
+
+    if o.baseline is not None:
+        try:
+            fd = open(o.baseline)
+            try:
+                baseline = json.load(fd)
+            finally:
+                fd.close()
+        except (IOError, ValueError) as ex:
+            sys.stderr.write("error %s: %s\n" % (o.baseline, ex))
+            return 1
+        regressions = compare(results, baseline, o.threshold, o.min_time)
+        if len(regressions) > 0:
+            sys.stdout.write("regressions compared to %s:\n" % o.baseline)
+            for r in regressions:
+                sys.stdout.write("  %s\n" % r)
+            return 1
+        sys.stdout.write("no regressions compared to %s\n" % o.baseline)
+    return 0
@@ -0,0 +1,182 @@
+"""On-disk cache of parsed YANG modules
+
+Parsing is a large part of the time spent when a set of modules is
+validated, and the same set of imported modules is typically parsed
+over and over again.  The cache stores the Statement tree produced by
+the parser, together with any errors reported by the parser, so that
+the tokenizer can be skipped when the same text is parsed again.
+
+The cache also keeps an index of the latest revision of each file in
+the module repository, so that files without a revision in their name
+need not be read at all to find their revision.
+"""
+
+import os
+import sys
+import hashlib
+import tempfile
+
+if sys.version < '3':
+    import cPickle as pickle
+else:
+    import pickle
+
+from . import error
+from . import yang_parser
+
+def default_cache_dir():
+    """Return the default cache directory, `$XDG_CACHE_HOME/pyang`"""
+    base = os.getenv('XDG_CACHE_HOME')
+    if base is None:
+        base = os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'pyang')
+
+class ParseCache(object):
+    """Cache of parsed YANG modules, stored in a directory
+
+    An entry is keyed on the name of the file, the parser options that
+    affect the result, and a hash of the text.  Entries are never
+    invalidated explicitly; a modified file has a different hash and
+    thus a different key.
+
+    The cache is an optimization only; any problem reading or writing
+    the cache makes the module be parsed as usual.
+    """
+
+    def __init__(self, cachedir=None):
+        if cachedir is None:
+            cachedir = default_cache_dir()
+        self.cachedir = cachedir
+        self.enabled = True
+        if not os.path.isdir(cachedir):
+            try:
+                os.makedirs(cachedir)
+            except OSError:
+                self.enabled = False
+
+    def _key(self, ctx, ref, text):
+        from . import __version__
+        h = hashlib.sha1()
+        opts = (__version__, sys.version_info[0], ref, ctx.max_line_len,
+                ctx.keep_comments, ctx.lax_quote_checks)
+        h.update(repr(opts).encode('utf-8'))
+        h.update(text.encode('utf-8'))
+        return h.hexdigest()
+
+    def _filename(self, key):
+        return os.path.join(self.cachedir, key + '.pickle')
+
+    def parse(self, ctx, ref, text):
+        """Parse the YANG `text`, or load it from the cache.
+
+        Errors found by the parser are added to `ctx.errors`, also
+        when the module is loaded from the cache.
+
+        Return a Statement on success or None on failure.
+        """
+        if not self.enabled:
+            return yang_parser.YangParser().parse(ctx, ref, text)
+        key = self._key(ctx, ref, text)
+        res = self._load(key)
+        if res is not None:
+            (module, errors) = res
+        else:
+            # parse with an empty error list, so that the errors
+            # reported by the parser can be saved with the module
+            saved_errors = ctx.errors
+            ctx.errors = []
+            try:
+                module = yang_parser.YangParser().parse(ctx, ref, text)
+                errors = ctx.errors
+            finally:
+                ctx.errors = saved_errors
+            if module is not None:
+                self._store(key, (module, errors))
+        for (epos, etag, eargs) in errors:
+            error.err_add(ctx.errors, epos, etag, eargs)
+        return module
+
+    def get_revision(self, filename):
+        """Return the revision of `filename` from the revision index.
+
+        Returns None if the file is not in the index, or if it has been
+        modified since it was added to the index.
+        """
+        key = self._revision_key(filename)
+        if key is None:
+            return None
+        try:
+            fd = open(self._revision_filename(key), 'r')
+        except IOError:
+            return None
+        try:
+            rev = fd.read().strip()
+        finally:
+            fd.close()
+        if rev == '':
+            return None
+        return rev
+
+    def add_revision(self, filename, revision):
+        """Add the latest `revision` of `filename` to the revision index."""
+        key = self._revision_key(filename)
+        if key is None:
+            return
+        self._write(self._revision_filename(key), revision, 'w')
+
+    def _revision_key(self, filename):
+        if not self.enabled:
+            return None
+        try:
+            st = os.stat(filename)
+        except OSError:
+            return None
+        h = hashlib.sha1()
+        h.update(repr((os.path.abspath(filename), st.st_mtime, st.st_size))
+                 .encode('utf-8'))
+        return h.hexdigest()
+
+    def _revision_filename(self, key):
+        return os.path.join(self.cachedir, key + '.rev')
+
+    def _load(self, key):
+        try:
+            fd = open(self._filename(key), 'rb')
+        except IOError:
+            return None
+        try:
+            try:
+                return pickle.load(fd)
+            except Exception:
+                # a corrupt or incompatible entry; just parse again
+                return None
+        finally:
+            fd.close()
+
+    def _store(self, key, data):
+        try:
+            s = pickle.dumps(data, pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            # e.g. a too deeply nested module
+            return
+        self._write(self._filename(key), s, 'wb')
+
+    def _write(self, filename, data, mode):
+        # write to a temporary file which is then renamed, so that
+        # concurrent pyang processes never see a partial entry
+        try:
+            (fd, tmpname) = tempfile.mkstemp(dir=self.cachedir)
+        except OSError:
+            return
+        try:
+            f = os.fdopen(fd, mode)
+            try:
+                f.write(data)
+            finally:
+                f.close()
+            os.rename(tmpname, filename)
+        except (IOError, OSError):
+            try:
+                os.remove(tmpname)
+            except OSError:
+                pass
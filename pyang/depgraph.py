@@ -0,0 +1,344 @@
+"""Module dependency graph
+
+A DependencyGraph holds the modules and submodules of a repository,
+and the import, include, augment and deviation statements which refer
+from one module to another.  The modules are scanned, not validated;
+only the module header and the top-level statements are read, see
+yang_parser.peek_linkage().
+
+The graph gives the dependencies and the dependents of a module, the
+strongly connected components (modules which depend on each other),
+and an order in which the modules can be built, where each module
+comes after the modules it depends on.
+"""
+
+from . import util
+from . import error
+from . import yang_parser
+
+edge_kinds = ('import', 'include', 'augment', 'deviation')
+"""the kinds of dependencies, in the order they are listed"""
+
+class ModuleInfo(object):
+    """The statements of a (sub)module which refer to other modules"""
+
+    def __init__(self, keyword, name, revision, ref):
+        self.keyword = keyword
+        """'module' or 'submodule'"""
+        self.name = name
+        self.revision = revision
+        """the latest revision, or "unknown" as util.get_latest_revision()"""
+        self.ref = ref
+        """the file name of the module"""
+        self.prefix = None
+        """the prefix of the module, or the belongs-to prefix"""
+        self.belongs_to = None
+        self.imports = []
+        """list of (modulename, revision-date or None, prefix)"""
+        self.includes = []
+        """list of (submodulename, revision-date or None)"""
+        self.augments = []
+        """the target paths of the augment statements"""
+        self.deviations = []
+        """the target paths of the deviation statements"""
+
+    def id(self):
+        """Return "name@revision", or the name if there is no revision"""
+        if self.revision == 'unknown':
+            return self.name
+        return '%s@%s' % (self.name, self.revision)
+
+    def __repr__(self):
+        return '<pyang.depgraph.ModuleInfo %s>' % self.id()
+
+def info_from_stmt(module):
+    """Return a ModuleInfo for a parsed (sub)module statement"""
+    info = ModuleInfo(module.keyword, module.arg,
+                      util.get_latest_revision(module), module.pos.ref)
+    prefix = module.search_one('prefix')
+    if prefix is not None:
+        info.prefix = prefix.arg
+    b = module.search_one('belongs-to')
+    if b is not None:
+        info.belongs_to = b.arg
+        prefix = b.search_one('prefix')
+        if prefix is not None:
+            info.prefix = prefix.arg
+    for i in module.search('import'):
+        info.imports.append((i.arg, _revision_date(i), _prefix(i)))
+    for i in module.search('include'):
+        info.includes.append((i.arg, _revision_date(i)))
+    info.augments = [s.arg for s in module.search('augment')]
+    info.deviations = [s.arg for s in module.search('deviation')]
+    return info
+
+def _revision_date(stmt):
+    r = stmt.search_one('revision-date')
+    if r is not None:
+        return r.arg
+    return None
+
+def _prefix(stmt):
+    p = stmt.search_one('prefix')
+    if p is not None:
+        return p.arg
+    return None
+
+def info_from_linkage(ref, linkage):
+    """Return a ModuleInfo for the result of yang_parser.peek_linkage()"""
+    (keyword, name, stmts) = linkage
+    info = ModuleInfo(keyword, name, 'unknown', ref)
+    for (keywd, arg, substmts) in stmts:
+        subs = dict(substmts)
+        if keywd == 'prefix':
+            info.prefix = arg
+        elif keywd == 'belongs-to':
+            info.belongs_to = arg
+            info.prefix = subs.get('prefix')
+        elif keywd == 'import':
+            info.imports.append((arg, subs.get('revision-date'),
+                                 subs.get('prefix')))
+        elif keywd == 'include':
+            info.includes.append((arg, subs.get('revision-date')))
+        elif keywd == 'revision':
+            if arg is not None and (info.revision == 'unknown' or
+                                    arg > info.revision):
+                info.revision = arg
+        elif keywd == 'augment':
+            info.augments.append(arg)
+        elif keywd == 'deviation':
+            info.deviations.append(arg)
+    return info
+
+def scan_module(ctx, ref, text, format=None):
+    """Return a ModuleInfo for the module in `text`, or None on error
+
+    YANG modules are only scanned.  YIN modules, and YANG modules
+    which cannot be scanned, are parsed, and the errors are added to
+    `ctx.errors`.
+    """
+    if format is None:
+        format = util.guess_format(text)
+    if format == 'yang':
+        linkage = yang_parser.peek_linkage(ref, text)
+        if linkage is not None:
+            return info_from_linkage(ref, linkage)
+    module = ctx._parse(ref, text, format)
+    if module is None:
+        return None
+    if module.keyword not in ('module', 'submodule') or module.arg is None:
+        error.err_add(ctx.errors, module.pos, 'UNEXPECTED_KEYWORD_N',
+                      (module.keyword, ['module', 'submodule']))
+        return None
+    return info_from_stmt(module)
+
+class DependencyGraph(object):
+    """The dependencies between a set of modules and submodules"""
+
+    def __init__(self):
+        self.modules = {}
+        """dict of (name, revision) -> ModuleInfo"""
+        self._latest = {}
+        self._edges = {}
+        self._dependents = None
+        self._sccs = None
+
+    def add_module(self, info):
+        """Add the ModuleInfo `info`; replaces a module with the same
+        name and revision"""
+        key = (info.name, info.revision)
+        self.modules[key] = info
+        latest = self._latest.get(info.name)
+        if latest is None or (_rev_key(info.revision) >=
+                               _rev_key(latest.revision)):
+            self._latest[info.name] = info
+        self._edges = {}
+        self._dependents = None
+        self._sccs = None
+
+    def add_repository(self, ctx, repository=None):
+        """Scan and add all modules in `repository`
+
+        `repository` defaults to the repository of `ctx`.  Read and
+        parse errors are added to `ctx.errors`.
+        """
+        if repository is None:
+            repository = ctx.repository
+        for (_name, _rev, handle) in repository.get_modules_and_revisions(ctx):
+            try:
+                (ref, format, text) = repository.get_module_from_handle(handle)
+            except repository.ReadError as ex:
+                error.err_add(ctx.errors, error.Position(str(handle)),
+                              'READ_ERROR', str(ex))
+                continue
+            info = scan_module(ctx, ref, text, format)
+            if info is not None:
+                self.add_module(info)
+
+    def get_module(self, name, revision=None):
+        """Return the ModuleInfo for `name` and `revision`, or None
+
+        If `revision` is None, or that revision is not in the graph, the
+        latest revision is returned.
+        """
+        if revision is not None and (name, revision) in self.modules:
+            return self.modules[(name, revision)]
+        return self._latest.get(name)
+
+    def sorted_modules(self):
+        """Return all modules, sorted by name and revision"""
+        return [self.modules[k] for k in sorted(self.modules)]
+
+    def edges(self, info):
+        """Return the dependencies of `info` as a list of (kind, name, dep)
+
+        `kind` is one of `edge_kinds`, and `dep` is the ModuleInfo of
+        the module `name`, or None if it is not in the graph.  The
+        target of an augment or deviation is the module of the first
+        node in the path; there is no edge to the module itself.
+        """
+        key = (info.name, info.revision)
+        if key in self._edges:
+            return self._edges[key]
+        res = []
+        prefixes = {}
+        for (name, rev, prefix) in info.imports:
+            prefixes[prefix] = (name, rev)
+            res.append(('import', name, self.get_module(name, rev)))
+        for (name, rev) in info.includes:
+            res.append(('include', name, self.get_module(name, rev)))
+        for (kind, paths) in (('augment', info.augments),
+                              ('deviation', info.deviations)):
+            seen = set()
+            for path in paths:
+                target = _target_prefix(path)
+                if (target is not None and target in prefixes and
+                    target not in seen):
+                    seen.add(target)
+                    (name, rev) = prefixes[target]
+                    res.append((kind, name, self.get_module(name, rev)))
+        self._edges[key] = res
+        return res
+
+    def dependencies(self, info, kinds=edge_kinds):
+        """Return the modules in the graph which `info` depends on"""
+        res = []
+        seen = set()
+        for (kind, _name, dep) in self.edges(info):
+            if kind in kinds and dep is not None and id(dep) not in seen:
+                seen.add(id(dep))
+                res.append(dep)
+        return res
+
+    def dependents(self, info):
+        """Return the modules in the graph which depend on `info`"""
+        if self._dependents is None:
+            self._dependents = {}
+            for m in self.sorted_modules():
+                for dep in self.dependencies(m):
+                    self._dependents.setdefault(id(dep), []).append(m)
+        return self._dependents.get(id(info), [])
+
+    def strongly_connected_components(self):
+        """Return the strongly connected components of the graph
+
+        Returns a list of lists of ModuleInfo.  The modules in a
+        component depend on each other, and each component comes after
+        the components it depends on.
+        """
+        if self._sccs is not None:
+            return self._sccs
+        # Tarjan's algorithm, with an explicit stack so that long
+        # import chains do not hit the recursion limit
+        index = {}
+        lowlink = {}
+        stack = []
+        on_stack = set()
+        sccs = []
+        for root in self.sorted_modules():
+            if id(root) in index:
+                continue
+            work = [(root, iter(self.dependencies(root)))]
+            index[id(root)] = lowlink[id(root)] = len(index)
+            stack.append(root)
+            on_stack.add(id(root))
+            while work:
+                (node, deps) = work[-1]
+                for dep in deps:
+                    if id(dep) not in index:
+                        index[id(dep)] = lowlink[id(dep)] = len(index)
+                        stack.append(dep)
+                        on_stack.add(id(dep))
+                        work.append((dep, iter(self.dependencies(dep))))
+                        break
+                    elif id(dep) in on_stack:
+                        lowlink[id(node)] = min(lowlink[id(node)],
+                                                index[id(dep)])
+                else:
+                    work.pop()
+                    if work:
+                        parent = work[-1][0]
+                        lowlink[id(parent)] = min(lowlink[id(parent)],
+                                                  lowlink[id(node)])
+                    if lowlink[id(node)] == index[id(node)]:
+                        scc = []
+                        while True:
+                            m = stack.pop()
+                            on_stack.discard(id(m))
+                            scc.append(m)
+                            if m is node:
+                                break
+                        scc.sort(key=lambda m: (m.name, m.revision))
+                        sccs.append(scc)
+        self._sccs = sccs
+        return sccs
+
+    def cycles(self):
+        """Return the components with modules which depend on themselves"""
+        return [scc for scc in self.strongly_connected_components()
+                if len(scc) > 1 or scc[0] in self.dependencies(scc[0])]
+
+    def topological_order(self):
+        """Return all modules, each after the modules it depends on
+
+        The modules in a cycle are next to each other, in name order.
+        """
+        return [m for scc in self.strongly_connected_components()
+                for m in scc]
+
+    def levels(self):
+        """Return the modules grouped in levels, for parallel builds
+
+        Returns a list of lists of ModuleInfo.  A module depends only on
+        modules in earlier levels, or in its own level if it is part of
+        a cycle.
+        """
+        level = {}
+        levels = []
+        for scc in self.strongly_connected_components():
+            n = 0
+            for m in scc:
+                for dep in self.dependencies(m):
+                    if id(dep) in level:
+                        n = max(n, level[id(dep)] + 1)
+            for m in scc:
+                level[id(m)] = n
+            if n == len(levels):
+                levels.append([])
+            levels[n].extend(scc)
+        for l in levels:
+            l.sort(key=lambda m: (m.name, m.revision))
+        return levels
+
+def _rev_key(revision):
+    # a module without revision is older than one with a revision
+    return (revision != 'unknown', revision)
+
+def _target_prefix(path):
+    # the prefix of the first node in a schema node identifier
+    if path is None:
+        return None
+    step = path.lstrip().lstrip('/').split('/', 1)[0]
+    if ':' in step:
+        return step.split(':', 1)[0].strip()
+    return None
@@ -3,11 +3,19 @@ import copy
 ### struct to keep track of position for error messages
 
 class Position(object):
+    __slots__ = ('ref', 'line', 'top', 'uses_pos')
+
     def __init__(self, ref):
         self.ref = ref
         self.line = 0
         self.top = None
         self.uses_pos = None
+    def __copy__(self):
+        p = Position(self.ref)
+        p.line = self.line
+        p.top = self.top
+        p.uses_pos = self.uses_pos
+        return p
     def __str__(self):
         s = self.ref + ':' + str(self.line)
         if self.uses_pos is None:
@@ -278,9 +286,6 @@ error_codes = \
     'PATTERN_ERROR':
       (2,
        'syntax error in pattern: %s'),
-    'PATTERN_FAILURE':
-      (4,
-       'could not verify pattern: %s'),
     'LEAFREF_TOO_MANY_UP':
       (1,
        'the path for %s at %s has too many ".."'),
@@ -408,6 +413,12 @@ error_codes = \
     'XPATH_SYNTAX_ERROR':
       (2,
        'XPath syntax error: %s'),
+    'XPATH_NODE_NOT_FOUND1':
+      (4,
+       'node %s::%s in the XPath expression is not found in %s::%s'),
+    'XPATH_NODE_NOT_FOUND2':
+      (4,
+       'node %s::%s in the XPath expression is not found in module %s'),
     'XPATH_VARIABLE':
       (2,
        'XPath variable "%s" is not defined in the XPath context'),
@@ -479,14 +490,60 @@ def err_to_str(tag, args):
         return 'unknown error %s' % tag
 
 def err_add(errors, pos, tag, args):
+    if isinstance(errors, ErrorList):
+        key = _error_key(pos, tag, args)
+        if key is not None:
+            if key not in errors._keys:
+                errors.append((copy.copy(pos), tag, args))
+            return
+    # the args cannot be hashed; compare with each error
     error = (copy.copy(pos), tag, args)
-    # surely this can be done more elegant??
     for (p, t, a) in errors:
         if (p.line == pos.line and p.ref == pos.ref and
             p.top == pos.top and t == tag and a == args):
             return
     errors.append(error)
 
+def _error_key(pos, tag, args):
+    key = (pos.ref, pos.line, pos.top, tag, args)
+    try:
+        hash(key)
+    except TypeError:
+        return None
+    return key
+
+class ErrorList(list):
+    """A list of errors, as (pos, tag, args) tuples.
+
+    The list has an index of the errors, which err_add() uses to find
+    duplicates without scanning the list.  If `sink` is set, it is
+    called as sink(pos, tag, args) with each error as it is added.
+    """
+
+    __slots__ = ('_keys', 'sink')
+
+    def __init__(self, errors=()):
+        list.__init__(self)
+        self._keys = set()
+        self.sink = None
+        self.extend(errors)
+
+    def __reduce__(self):
+        return (ErrorList, (list(self),))
+
+    def append(self, error):
+        list.append(self, error)
+        (pos, tag, args) = error
+        key = _error_key(pos, tag, args)
+        if key is not None:
+            self._keys.add(key)
+        if self.sink is not None:
+            self.sink(pos, tag, args)
+
+    def extend(self, errors):
+        for error in errors:
+            self.append(error)
+
 def is_warning(level):
     return not is_error(level)
 
@@ -495,3 +552,35 @@ def is_error(level):
 
 def allow_warning(level):
     return level > 2
+
+class ErrorBudget(object):
+    """Keeps track of the number of errors reported in a list of errors.
+
+    `counts_as_error` is a function (pos, tag) -> boolean, which tells if
+    an entry in the list is an error.  By default, the entries with an
+    error level are counted.
+    """
+    def __init__(self, max_errors, counts_as_error=None):
+        self.max_errors = max_errors
+        if counts_as_error is None:
+            counts_as_error = lambda pos, tag: is_error(err_level(tag))
+        self.counts_as_error = counts_as_error
+        self.nerrors = 0
+        self._scanned = 0
+
+    def exhausted(self, errors):
+        """Return True if `max_errors` errors are found in `errors`
+
+        Only the entries added since the last call are examined.
+        """
+        n = len(errors)
+        if n != self._scanned:
+            if n < self._scanned:
+                # the list has been reset
+                self.nerrors = 0
+                self._scanned = 0
+            for (pos, tag, args) in errors[self._scanned:]:
+                if self.counts_as_error(pos, tag):
+                    self.nerrors += 1
+            self._scanned = n
+        return self.nerrors >= self.max_errors
@@ -0,0 +1,188 @@
+"""Fingerprints of validated definitions
+
+A fingerprint is a digest of a definition in a validated module: a
+data node, typedef, grouping, identity, feature, extension, rpc or
+notification.  It covers the statement and its substatements, and the
+results of the validation which are not visible in the text: the
+module the definition belongs to, the config property, the
+fingerprints of the typedefs used, the bases of identities and
+identityrefs, and the target of a leafref.
+
+The fingerprint of a node with children includes the fingerprints of
+its children (i_children), so two nodes with the same fingerprint
+have identical subtrees, as in a Merkle tree.  Fingerprints are
+computed when they are first asked for, and kept in the statements.
+
+The fingerprints of a module can be written to a file with
+write_fingerprints(), see `pyang -f fingerprint`, and read back with
+read_fingerprints().  A module can thus be compared with an older
+revision of itself without parsing and validating the older revision.
+"""
+
+import os
+import json
+import hashlib
+
+from . import util
+
+VERSION = 1
+"""the version of the fingerprints and the file format"""
+
+_child_keywords = ('container', 'leaf', 'leaf-list', 'list', 'choice',
+                   'case', 'anyxml', 'anydata', 'input', 'output',
+                   'action', 'rpc', 'notification', 'uses', 'augment',
+                   'grouping', 'typedef')
+"""substatements which are not part of the fingerprint of their parent;
+data nodes are included through i_children, and typedefs through the
+types that use them"""
+
+_definition_keywords = ('feature', 'identity', 'typedef', 'grouping',
+                        'rpc', 'notification', 'extension')
+"""top-level definitions in a fingerprint file"""
+
+def get_fingerprint(stmt):
+    """Return the fingerprint of the validated `stmt`, as a hex string"""
+    try:
+        return stmt.i_fingerprint
+    except AttributeError:
+        pass
+    # a circular typedef refers to itself as None
+    stmt.i_fingerprint = None
+    parts = []
+    _add_stmt(parts, stmt)
+    module = getattr(stmt, 'i_module', None)
+    if module is not None:
+        _add(parts, 'module', module.i_modulename)
+    if hasattr(stmt, 'i_config'):
+        _add(parts, 'config', stmt.i_config)
+    ptr = getattr(stmt, 'i_leafref_ptr', None)
+    if ptr is not None:
+        # the path from the target leaf to its module
+        _add(parts, 'leafref')
+        node = ptr[0]
+        while node.parent is not None:
+            _add(parts, node.i_module.i_modulename, node.arg)
+            node = node.parent
+    if hasattr(stmt, 'i_children'):
+        _add(parts, 'children', len(stmt.i_children))
+        for ch in stmt.i_children:
+            _add(parts, get_fingerprint(ch))
+    h = hashlib.sha1(u''.join(parts).encode('utf-8'))
+    stmt.i_fingerprint = h.hexdigest()
+    return stmt.i_fingerprint
+
+def _add_stmt(parts, stmt):
+    # a keyword is an identifier, possibly with a prefix, so it ends at
+    # the space
+    arg = stmt.arg
+    if arg is None:
+        parts.append('(%s N' % util.keyword_to_str(stmt.keyword))
+    else:
+        parts.append(u'(%s S%d:%s' % (util.keyword_to_str(stmt.keyword),
+                                      len(arg), arg))
+    if stmt.keyword == 'type':
+        typedef = getattr(stmt, 'i_typedef', None)
+        if typedef is not None:
+            _add(parts, 'typedef', typedef.i_module.i_modulename,
+                 get_fingerprint(typedef))
+        type_spec = getattr(stmt, 'i_type_spec', None)
+        for base in getattr(type_spec, 'idbases', []):
+            _add(parts, 'idbase', base.i_module.i_modulename, base.arg)
+    elif stmt.keyword == 'base':
+        identity = getattr(stmt, 'i_identity', None)
+        if identity is not None:
+            _add(parts, 'identity', identity.i_module.i_modulename,
+                 identity.arg)
+    for s in stmt.substmts:
+        if s.keyword not in _child_keywords:
+            _add_stmt(parts, s)
+    parts.append(')')
+
+def _add(parts, *items):
+    # each item is encoded so that different sequences of items give
+    # different text, in the same way in python 2 and 3
+    for x in items:
+        if x is None:
+            parts.append('N')
+        elif x is True:
+            parts.append('T')
+        elif x is False:
+            parts.append('F')
+        elif isinstance(x, int):
+            parts.append('I%d;' % x)
+        else:
+            parts.append(u'S%d:%s' % (len(x), x))
+
+def module_fingerprints(module):
+    """Return a dict with the fingerprints of the definitions in `module`
+
+    The keys are as for module_definitions().
+    """
+    res = {}
+    for (key, stmt) in module_definitions(module):
+        res[key] = get_fingerprint(stmt)
+    return res
+
+def module_definitions(module):
+    """Return a list of (key, stmt) for the definitions in `module`
+
+    The key is "<keyword> <name>" for the top-level definitions, and
+    "data <path>" for the data nodes, where <path> is the names of the
+    node and its ancestors, e.g. "data /interfaces/interface/name".
+    """
+    res = []
+    for keyword in _definition_keywords:
+        for s in module.search(keyword):
+            res.append((keyword + ' ' + s.arg, s))
+    def add_children(stmt, path):
+        for ch in stmt.i_children:
+            chpath = path + '/' + ch.arg
+            res.append(('data ' + chpath, ch))
+            if hasattr(ch, 'i_children'):
+                add_children(ch, chpath)
+    add_children(module, '')
+    return res
+
+def is_top_level(key):
+    """Return True if `key` is a top-level definition or data node"""
+    return not key.startswith('data ') or key.count('/') == 1
+
+def module_header(module):
+    """Return a dict with the name, namespace and revision of `module`"""
+    namespace = module.search_one('namespace')
+    if namespace is not None:
+        namespace = namespace.arg
+    revs = [r.arg for r in module.search('revision')]
+    revs.sort()
+    if revs:
+        revision = revs[-1]
+    else:
+        revision = None
+    return {'module': module.arg,
+            'namespace': namespace,
+            'revision': revision}
+
+def write_fingerprints(module, fd):
+    """Write the fingerprints of the validated `module` to `fd` as JSON"""
+    doc = module_header(module)
+    doc['version'] = VERSION
+    doc['file'] = os.path.basename(module.pos.ref)
+    doc['fingerprints'] = module_fingerprints(module)
+    fd.write(json.dumps(doc, indent=1, sort_keys=True,
+                        separators=(',', ': ')))
+    fd.write('\n')
+
+def read_fingerprints(text):
+    """Parse a file written by write_fingerprints()
+
+    Return a dict with the members 'module', 'namespace', 'revision',
+    'file' and 'fingerprints', as for write_fingerprints(), or None if
+    `text` is not a fingerprint file of this version.
+    """
+    try:
+        doc = json.loads(text)
+    except ValueError:
+        return None
+    if not isinstance(doc, dict) or doc.get('version') != VERSION:
+        return None
+    return doc
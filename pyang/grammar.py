@@ -1,6 +1,5 @@
 """Description of YANG & YIN grammar."""
 
-import copy
 import re
 
 from . import util
@@ -34,6 +33,11 @@ revision_stmts = [
     ('revision', '*'),
 ]
 
+header_keywords = [keyword for (keyword, _occurance) in
+                   module_header_stmts + submodule_header_stmts +
+                   linkage_stmts + meta_stmts + revision_stmts]
+"""Keywords that can occur before the body of a (sub)module"""
+
 data_def_stmts = [
     ('container', '*'),
     ('leaf', '*'),
@@ -78,6 +82,7 @@ def add_stmt(stmt, arg_rules):
     """Use by plugins to add grammar for an extension statement."""
     (arg, rules) = arg_rules
     stmt_map[stmt] = (arg, rules)
+    _reset_automata()
 
 def add_to_stmts_rules(stmts, rules):
     """Use by plugins to add extra rules to the existing rules for
@@ -104,6 +109,7 @@ def add_to_stmts_rules(stmts, rules):
                 i += 1
             if i == len(rules0):
                 rules0.insert(i, r)
+    _reset_automata()
 
 stmt_map = {
     'module':
@@ -584,14 +590,138 @@ def chk_statement(ctx, stmt, grammar, canonical=False):
     Return True if stmt is valid, False otherwise.
     """
     n = len(ctx.errors)
+    spec = _freeze(grammar)
     if canonical == True:
-        canspec = grammar
+        canspec = spec
     else:
-        canspec = []
-    _chk_stmts(ctx, stmt.pos, [stmt], None, (grammar, canspec), canonical)
+        canspec = ()
+    _chk_stmts(ctx, stmt.pos, [stmt], None, _state(spec, canspec, canonical),
+               canonical)
     return n == len(ctx.errors)
 
-def _chk_stmts(ctx, pos, stmts, parent, spec, canonical):
+### The grammar automata
+#
+# The substatements of a statement are checked by an automaton, whose
+# states are the remaining specifications, i.e. what _match_stmt()
+# returns.  The transitions are computed by _match_stmt() when they are
+# first needed, and then kept in the state, so that checking a
+# substatement is normally a single dict lookup.  The specifications
+# are frozen into tuples so that they can be used to find equal states.
+
+class _State(object):
+    """A state in a grammar automaton"""
+
+    __slots__ = ('specs', 'canonical', 'trans', 'v11', 'required')
+
+    def __init__(self, spec, canspec, canonical):
+        self.specs = (spec, canspec)
+        self.canonical = canonical
+        self.trans = {}
+        """Maps a keyword to (state | None, [(errtag, keyword)], errtag)"""
+        self.v11 = _v11_keywords(spec) | _v11_keywords(canspec)
+        """Keywords which are matched differently in YANG version 1"""
+        self.required = [util.keyword_to_str(keywd)
+                         for (keywd, occurance) in spec
+                         if occurance == '1' or occurance == '+']
+        """The keywords which are missing if no more statements follow"""
+
+    def next(self, stmt):
+        """Return the transition for `stmt`"""
+        keyword = stmt.keyword
+        if keyword in self.v11:
+            key = (keyword, stmt.i_module.i_version == '1')
+        else:
+            key = keyword
+        try:
+            return self.trans[key]
+        except KeyError:
+            pass
+        if keyword in self.v11:
+            is_v1 = key[1]
+        else:
+            is_v1 = None
+        errs = []
+        res = _match_stmt(keyword, is_v1, self.specs, self.canonical, errs)
+        if res is not None:
+            t = (_state(res[0], res[1], self.canonical), errs, None)
+        elif (self.canonical == True and
+              _match_stmt(keyword, is_v1, (self.specs[1], ()),
+                          False, []) is not None):
+            t = (None, errs, 'UNEXPECTED_KEYWORD_CANONICAL')
+        else:
+            t = (None, errs, 'UNEXPECTED_KEYWORD')
+        self.trans[key] = t
+        return t
+
+_states = {}
+"""Maps (spec, canspec, canonical) to a _State"""
+
+_keyword_states = {}
+"""Maps (keyword, canonical) to (arg_type, _State) for its substatements"""
+
+_any_spec = (('$any', '*'),)
+
+def _reset_automata():
+    """Forget the automata, called when the grammar is changed"""
+    global _frozen_top_stmts
+    _states.clear()
+    _keyword_states.clear()
+    _frozen_top_stmts = _freeze(top_stmts)
+
+def _freeze(spec):
+    """Return `spec` with all lists replaced by tuples"""
+    res = []
+    for (keywd, occurance) in spec:
+        if keywd == '$interleave':
+            occurance = _freeze(occurance)
+        elif keywd == '$choice':
+            occurance = tuple([_freeze(case) for case in occurance])
+        res.append((keywd, occurance))
+    return tuple(res)
+
+def _v11_keywords(spec):
+    """Return the set of keywords in $1.1 rules in `spec`"""
+    res = set()
+    for (keywd, occurance) in spec:
+        if keywd == '$1.1':
+            res.add(occurance[0])
+        elif keywd == '$interleave':
+            res |= _v11_keywords(occurance)
+        elif keywd == '$choice':
+            for case in occurance:
+                res |= _v11_keywords(case)
+    return res
+
+def _state(spec, canspec, canonical):
+    key = (spec, canspec, canonical)
+    try:
+        return _states[key]
+    except KeyError:
+        state = _states[key] = _State(spec, canspec, canonical)
+        return state
+
+def _keyword_state(keyword, canonical):
+    """Return (arg_type, state) for the substatements of `keyword`.
+
+    Raise KeyError if `keyword` is not in the grammar.
+    """
+    try:
+        return _keyword_states[(keyword, canonical)]
+    except KeyError:
+        pass
+    (arg_type, subspec) = stmt_map[keyword]
+    subspec = _freeze(subspec)
+    if canonical == True:
+        cansubspec = subspec
+    else:
+        cansubspec = ()
+    res = (arg_type, _state(subspec, cansubspec, canonical))
+    _keyword_states[(keyword, canonical)] = res
+    return res
+
+_reset_automata()
+
+def _chk_stmts(ctx, pos, stmts, parent, state, canonical):
     for stmt in stmts:
         stmt.is_grammatically_valid = False
         if stmt.keyword == '_comment':
@@ -605,28 +735,18 @@ def _chk_stmts(ctx, pos, stmts, parent, spec, canonical):
             else:
                 chk_grammar = False
         if chk_grammar == True:
-            match_res = _match_stmt(ctx, stmt, spec, canonical)
-        else:
-            match_res = None
-        if match_res is None and chk_grammar == True:
-            if canonical == True:
-                save_errors = ctx.errors
-                ctx.errors = []
-                if _match_stmt(ctx, stmt, (spec[1], []), False) is not None:
-                    ctx.errors = save_errors
-                    error.err_add(ctx.errors, stmt.pos,
-                                  'UNEXPECTED_KEYWORD_CANONICAL',
-                                  util.keyword_to_str(stmt.raw_keyword))
-                else:
-                    ctx.errors = save_errors
-                    error.err_add(ctx.errors, stmt.pos, 'UNEXPECTED_KEYWORD',
-                                  util.keyword_to_str(stmt.raw_keyword))
-            else:
-                error.err_add(ctx.errors, stmt.pos, 'UNEXPECTED_KEYWORD',
-                              util.keyword_to_str(stmt.raw_keyword))
-        elif match_res is not None and chk_grammar == True:
+            (next_state, errs, errtag) = state.next(stmt)
+            if errs:
+                raw_keyword = util.keyword_to_str(stmt.raw_keyword)
+                for (tag, keywd) in errs:
+                    error.err_add(ctx.errors, stmt.pos, tag,
+                                  (raw_keyword, keywd))
+        if chk_grammar == True and next_state is None:
+            error.err_add(ctx.errors, stmt.pos, errtag,
+                          util.keyword_to_str(stmt.raw_keyword))
+        elif chk_grammar == True:
             try:
-                (arg_type, subspec) = stmt_map[stmt.keyword]
+                (arg_type, substate) = _keyword_state(stmt.keyword, canonical)
             except KeyError:
                 error.err_add(ctx.errors, stmt.pos, 'UNEXPECTED_KEYWORD',
                               util.keyword_to_str(stmt.raw_keyword))
@@ -665,34 +785,31 @@ def _chk_stmts(ctx, pos, stmts, parent, spec, canonical):
             else:
                 stmt.is_grammatically_valid = True
 
-            if canonical == True:
-                cansubspec = subspec
-            else:
-                cansubspec = []
-            _chk_stmts(ctx, stmt.pos, stmt.substmts, stmt,
-                       (subspec, cansubspec), canonical)
-            spec = match_res
+            _chk_stmts(ctx, stmt.pos, stmt.substmts, stmt, substate,
+                       canonical)
+            state = next_state
         else:
             # unknown extension
             stmt.is_grammatically_valid = True
-            nspec = [('$any', '*')]
             _chk_stmts(ctx, stmt.pos, stmt.substmts, stmt,
-                       (nspec, nspec), canonical)
+                       _state(_any_spec, _any_spec, canonical), canonical)
         # update last know position
         pos = stmt.pos
     # any non-optional statements left are errors
-    for (keywd, occurance) in spec[0]:
-        if occurance == '1' or occurance == '+':
-            if parent is None:
-                error.err_add(ctx.errors, pos, 'EXPECTED_KEYWORD',
-                              util.keyword_to_str(keywd))
-            else:
-                error.err_add(ctx.errors, pos, 'EXPECTED_KEYWORD_2',
-                              (util.keyword_to_str(keywd),
-                               util.keyword_to_str(parent.raw_keyword)))
+    for keywd in state.required:
+        if parent is None:
+            error.err_add(ctx.errors, pos, 'EXPECTED_KEYWORD', keywd)
+        else:
+            error.err_add(ctx.errors, pos, 'EXPECTED_KEYWORD_2',
+                          (keywd, util.keyword_to_str(parent.raw_keyword)))
 
-def _match_stmt(ctx, stmt, specs, canonical):
-    """Match stmt against the spec.
+def _match_stmt(keyword, is_v1, specs, canonical, errs):
+    """Match a statement with `keyword` against the spec.
+
+    `is_v1` is True if the statement is in a YANG version 1 module; it
+    is only used for keywords in $1.1 rules.  Errors are added to
+    `errs` as (error tag, keyword) pairs, with the statement's keyword
+    as the first argument to the error.
 
     Return None | spec'
     spec' is an updated spec with the matching spec consumed
@@ -705,10 +822,10 @@ def _match_stmt(ctx, stmt, specs, canonical):
             return (spec, canspec)
         if keywd == '$1.1':
             (keywd, occurance) = occurance
-            if (stmt.i_module.i_version == '1' and
-                keywd == stmt.keyword):
+            if (is_v1 == True and
+                keywd == keyword):
                 return None
-        if keywd == stmt.keyword:
+        if keywd == keyword:
             if occurance == '1' or occurance == '?':
                 # consume this match
                 if canonical == True:
@@ -719,9 +836,9 @@ def _match_stmt(ctx, stmt, specs, canonical):
                 # mark that we have found the one that was needed
                 c = (keywd, '*')
                 if canonical == True:
-                    return ([c] + spec[i+1:], canspec)
+                    return ((c,) + spec[i+1:], canspec)
                 else:
-                    return (spec[:i] + [c] + spec[i+1:], canspec)
+                    return (spec[:i] + (c,) + spec[i+1:], canspec)
             else:
                 # occurane == '*'
                 if canonical == True:
@@ -734,31 +851,35 @@ def _match_stmt(ctx, stmt, specs, canonical):
             while j < len(cases):
                 # check if this alternative matches - check for a
                 # match with each optional keyword
-                save_errors = copy.copy(ctx.errors)
-                if spec == top_stmts:
-                    match_res = _match_stmt(ctx, stmt, (cases[j],[]), False)
+                n = len(errs)
+                if spec == _frozen_top_stmts:
+                    match_res = _match_stmt(keyword, is_v1, (cases[j], ()),
+                                            False, errs)
                 else:
-                    match_res = _match_stmt(ctx, stmt, (cases[j],cases[j]),
-                                            canonical)
+                    match_res = _match_stmt(keyword, is_v1,
+                                            (cases[j], cases[j]),
+                                            canonical, errs)
                 if match_res != None:
                     # this case branch matched, use it.
                     # remove the choice and add res to the spec.
                     nspec = spec[:i] + match_res[0] + spec[i+1:]
                     return (nspec, canspec)
                 # we must not report errors on non-matching branches
-                ctx.errors = save_errors
+                del errs[n:]
                 j += 1
         elif keywd == '$interleave':
             cspec = occurance
-            match_res = _match_stmt(ctx, stmt, (cspec, cspec), canonical)
+            match_res = _match_stmt(keyword, is_v1, (cspec, cspec),
+                                    canonical, errs)
             if match_res != None:
                 # we got a match
                 return (spec, canspec)
-        elif util.is_prefixed(stmt.keyword):
+        elif util.is_prefixed(keyword):
             # allow extension statements mixed with these
             # set canonical to False in this call to just remove the
             # matching stmt from the spec
-            match_res = _match_stmt(ctx, stmt, (spec[i+1:], canspec), False)
+            match_res = _match_stmt(keyword, is_v1, (spec[i+1:], canspec),
+                                    False, errs)
             if match_res != None:
                 return (spec[:i+1] + match_res[0], canspec)
             else:
@@ -767,18 +888,15 @@ def _match_stmt(ctx, stmt, specs, canonical):
             # any non-optional statements left are errors
             for (keywd, occurance) in spec[:i]:
                 if occurance == '1' or occurance == '+':
-                    error.err_add(ctx.errors, stmt.pos, 'UNEXPECTED_KEYWORD_1',
-                                  (util.keyword_to_str(stmt.raw_keyword),
-                                   util.keyword_to_str(keywd)))
+                    errs.append(('UNEXPECTED_KEYWORD_1',
+                                 util.keyword_to_str(keywd)))
             # consume them so we don't report the same error again
             spec = spec[i:]
             i = 0
         elif canonical == True:
             if occurance == '1' or occurance == '+':
-                error.err_add(ctx.errors, stmt.pos,
-                              'UNEXPECTED_KEYWORD_CANONICAL_1',
-                              (util.keyword_to_str(stmt.raw_keyword),
-                               util.keyword_to_str(keywd)))
+                errs.append(('UNEXPECTED_KEYWORD_CANONICAL_1',
+                             util.keyword_to_str(keywd)))
                 # consume it so we don't report the same error again
                 spec = spec[i:]
                 i = 0
@@ -0,0 +1,837 @@
+"""Streaming validation of instance data against validated modules
+
+The data nodes of the modules in a Context are compiled into a tree of
+SchemaNode objects, which works as an automaton for the instance
+documents: each element or JSON member moves from one node to one of
+its children.  Each child node has a check for its value, derived from
+the chain of TypeSpecs of its type.
+
+XML documents are read with expat, and JSON documents with a small
+incremental tokenizer, so the documents are never held in memory.  The
+memory used is proportional to the depth of the document, and to the
+number of entries in the list instances that are being read, for the
+key and unique checks.
+
+The following is checked:
+  - that each node is defined in the schema
+  - the value of each leaf and leaf-list
+  - that each list entry has all keys, and that the keys are unique
+  - the unique statements
+  - min-elements and max-elements
+  - that containers and leafs occur at most once
+  - that nodes from different cases of a choice are not mixed
+  - that mandatory nodes and choices are present, unless they have a
+    when statement or are part of a choice
+
+must and when expressions, leafrefs and instance-identifiers are not
+evaluated, since that needs the whole document.
+"""
+
+import re
+import io
+import json
+import xml.parsers.expat
+
+from . import error
+from . import types
+from .error import err_add
+
+class SchemaNode(object):
+    """A data node in the compiled schema
+
+    The children are compiled when they are needed for the first time.
+    """
+
+    __slots__ = ('stmt', 'keyword', 'name', 'modulename', '_children',
+                 'cases', 'check', 'identityref', 'strip', 'wanted', 'keys',
+                 'uniques', 'min_elements', 'max_elements', 'mandatory',
+                 'mandatory_choices')
+
+    def __init__(self, stmt, cases=()):
+        self.stmt = stmt
+        self.keyword = stmt.keyword
+        self.name = stmt.arg
+        self.modulename = stmt.i_module.i_modulename
+        self._children = None
+        self.cases = cases
+        """tuple of (choice, case) statements for the choices the node
+        is in, outermost first"""
+        self.check = None
+        """for leafs and leaf-lists, a function which returns None if
+        a value is valid, and otherwise a string describing the
+        problem"""
+        self.identityref = False
+        """True if the value is an identityref, or a union with an
+        identityref member type, which is encoded differently in XML
+        and JSON"""
+        self.strip = False
+        self.wanted = None
+        """for lists, a dict of leaf:index for the leafs whose values
+        are needed for the key and unique checks"""
+        self.keys = []
+        self.uniques = []
+        """for lists, a list of (unique, [index]) for each unique stmt"""
+        self.min_elements = 0
+        self.max_elements = None
+        self.mandatory = []
+        """list of mandatory child nodes, see is_mandatory()"""
+        self.mandatory_choices = []
+        """list of mandatory choice statements"""
+        if self.keyword in ('leaf', 'leaf-list'):
+            self.check = type_checker(stmt)
+            t = stmt.search_one('type')
+            spec = getattr(t, 'i_type_spec', None)
+            self.identityref = _has_identityref(spec)
+            # whitespace is significant in strings only
+            self.strip = (spec is None or
+                          spec.name not in ('string', 'union'))
+        if self.keyword in ('list', 'leaf-list'):
+            m = stmt.search_one('min-elements')
+            if m is not None:
+                self.min_elements = int(m.arg)
+            m = stmt.search_one('max-elements')
+            if m is not None and m.arg != 'unbounded':
+                self.max_elements = int(m.arg)
+        if self.keyword == 'list':
+            self.wanted = {}
+            for k in getattr(stmt, 'i_key', []):
+                self.keys.append(self._want(k))
+            for (u, leafs) in getattr(stmt, 'i_unique', []):
+                self.uniques.append((u, [self._want(l) for l in leafs]))
+
+    def _want(self, leaf):
+        if leaf not in self.wanted:
+            self.wanted[leaf] = len(self.wanted)
+        return self.wanted[leaf]
+
+    def children(self):
+        """Return a dict of (modulename, name):SchemaNode"""
+        if self._children is None:
+            self._children = {}
+            if self.keyword not in ('anyxml', 'anydata'):
+                self._add_children(getattr(self.stmt, 'i_children', []), ())
+        return self._children
+
+    def _add_children(self, stmts, cases):
+        for s in stmts:
+            if s.keyword == 'choice':
+                if len(cases) == 0 and is_mandatory(s):
+                    self.mandatory_choices.append(s)
+                for c in s.i_children:
+                    if c.keyword == 'case':
+                        self._add_children(c.i_children,
+                                           cases + ((s, c),))
+            elif s.keyword in _data_keywords:
+                n = SchemaNode(s, cases)
+                self._children[(n.modulename, n.name)] = n
+                if len(cases) == 0 and is_mandatory(s):
+                    self.mandatory.append(n)
+
+    def is_leaf(self):
+        return self.keyword in ('leaf', 'leaf-list')
+
+class Schema(SchemaNode):
+    """The root of the compiled schema"""
+
+    def __init__(self, ctx, modules=None):
+        self.keyword = 'root'
+        self.name = ''
+        self.modulename = None
+        self.cases = ()
+        self.check = None
+        self.identityref = False
+        self.strip = False
+        self.wanted = None
+        self.keys = []
+        self.uniques = []
+        self.min_elements = 0
+        self.max_elements = None
+        self.mandatory = []
+        self.mandatory_choices = []
+        self._children = {}
+        self.stmt = None
+        self.namespaces = {}
+        """dict of namespace:modulename"""
+        for m in ctx.modules.values():
+            if m is None or m.keyword != 'module':
+                continue
+            ns = m.search_one('namespace')
+            if ns is not None:
+                self.namespaces[ns.arg] = m.i_modulename
+        if modules is None:
+            modules = ctx.modules.values()
+        # the nodes which other modules augment into these modules are
+        # in the i_children of the target nodes
+        done = {}
+        for m in modules:
+            if m is not None and m.keyword == 'submodule':
+                m = m.main_module()
+            if m is None or m.keyword != 'module' or m in done:
+                continue
+            done[m] = True
+            self._add_children(getattr(m, 'i_children', []), ())
+
+_data_keywords = ['container', 'list', 'leaf', 'leaf-list', 'anyxml',
+                  'anydata']
+
+def _has_identityref(spec):
+    if spec is None:
+        return False
+    if spec.name == 'union':
+        for t in spec.types:
+            if _has_identityref(t.i_type_spec):
+                return True
+        return False
+    return spec.name == 'identityref'
+
+def is_mandatory(stmt):
+    """Return True if `stmt` is a mandatory node, as defined in RFC 7950,
+    section 3
+
+    A node with a when statement is not mandatory here, since the when
+    expression is not evaluated.
+    """
+    if stmt.search_one('when') is not None:
+        return False
+    if stmt.keyword in ('leaf', 'choice', 'anyxml', 'anydata'):
+        m = stmt.search_one('mandatory')
+        return m is not None and m.arg == 'true'
+    elif stmt.keyword in ('list', 'leaf-list'):
+        m = stmt.search_one('min-elements')
+        return m is not None and int(m.arg) > 0
+    elif stmt.keyword == 'container':
+        if stmt.search_one('presence') is not None:
+            return False
+        for c in getattr(stmt, 'i_children', []):
+            if is_mandatory(c):
+                return True
+    return False
+
+def compile_schema(ctx, modules=None):
+    """Return the compiled Schema for `modules`, or for all modules in
+    `ctx`
+
+    Only the top-level nodes of `modules` are in the schema; the
+    modules which they import are not implemented.  The modules must be
+    validated.
+    """
+    return Schema(ctx, modules)
+
+### Value checks
+
+_re_int = re.compile(r'^[-+]?[0-9]+$')
+_re_decimal = re.compile(r'^[-+]?[0-9]+(\.[0-9]+)?$')
+
+_int_types = ['int8', 'int16', 'int32', 'int64',
+              'uint8', 'uint16', 'uint32', 'uint64']
+
+def type_checker(stmt):
+    """Return a function which checks a value of the leaf `stmt`"""
+    t = stmt.search_one('type')
+    if t is None or getattr(t, 'i_type_spec', None) is None:
+        return lambda value: None
+    return _spec_checker(t.i_type_spec, stmt)
+
+def _spec_checker(spec, stmt):
+    name = spec.name
+    if isinstance(spec, types.PathTypeSpec):
+        # check the value against the type of the leafref's target
+        target = getattr(spec, 'i_target_node', None)
+        if target is None:
+            return lambda value: None
+        return type_checker(target)
+    if name == 'empty':
+        def check(value):
+            if value != '':
+                return 'a value is given for type empty'
+        return check
+    elif name in ('instance-identifier', 'leafref'):
+        return lambda value: None
+    elif name == 'identityref':
+        # the reader has replaced the prefix with the module name
+        ctx = stmt.i_module.i_ctx
+        default = stmt.i_module.i_modulename
+        def check(value):
+            i = value.find(':')
+            if i == -1:
+                (modulename, idname) = (default, value)
+            else:
+                (modulename, idname) = (value[:i], value[i+1:])
+            m = ctx.get_module(modulename)
+            if m is None:
+                return 'unknown module %s' % modulename
+            if idname not in m.i_identities:
+                return 'identity not found'
+            val = m.i_identities[idname]
+            for base in spec.idbases:
+                if not types.is_derived_from(val, base.i_identity):
+                    return 'identity not derived from %s' % base.arg
+            return None
+        return check
+    elif name == 'union':
+        # each member type has its own whitespace rule
+        checks = [(_spec_checker(t.i_type_spec, stmt),
+                   t.i_type_spec.name not in ('string', 'union'))
+                  for t in spec.types
+                  if t.i_type_spec is not None]
+        def check(value):
+            for (c, strip) in checks:
+                if strip:
+                    v = value.strip()
+                else:
+                    v = value
+                if c(v) is None:
+                    return None
+            return 'no member type matched'
+        return check
+    pre = None
+    if name in _int_types:
+        pre = _re_int
+    elif name == 'decimal64':
+        pre = _re_decimal
+    pos = error.Position('')
+    def check(value):
+        if pre is not None and pre.match(value) is None:
+            return 'not a valid %s' % name
+        errors = []
+        try:
+            val = spec.str_to_val(errors, pos, value)
+            if val is not None:
+                spec.validate(errors, pos, val)
+        except Exception:
+            return 'not a valid %s' % name
+        if len(errors) > 0:
+            (_pos, tag, args) = errors[0]
+            if tag == 'TYPE_VALUE':
+                return args[2]
+            return error.err_to_str(tag, args)
+        if val is None:
+            return 'not a valid %s' % name
+        return None
+    return check
+
+### The validator
+
+class Frame(object):
+    """An open node in the instance document"""
+
+    __slots__ = ('node', 'parent', 'line', 'counts', 'cases', 'entries',
+                 'text', 'entry', 'values')
+
+    def __init__(self, node, parent, line):
+        self.node = node
+        self.parent = parent
+        self.line = line
+        self.counts = {}
+        """dict of child SchemaNode:number of instances"""
+        self.cases = {}
+        """dict of choice:(case, child name)"""
+        self.entries = {}
+        """dict of list SchemaNode:{(values):line} for each key and
+        unique constraint"""
+        self.text = []
+        self.entry = None
+        """the closest enclosing list entry frame"""
+        self.values = None
+        """in a list entry, the values of the wanted leafs"""
+
+    def path(self):
+        l = []
+        f = self
+        while f is not None and f.node.keyword != 'root':
+            s = f.node.name
+            if f.parent is None or f.parent.node.keyword == 'root' or \
+               f.parent.node.modulename != f.node.modulename:
+                s = f.node.modulename + ':' + s
+            if f.values is not None and len(f.node.keys) > 0:
+                s += ''.join(["[%s='%s']" % (k.arg, f.values[i])
+                              for (k, i) in _key_list(f.node)
+                              if f.values[i] is not None])
+            l.append(s)
+            f = f.parent
+        l.reverse()
+        return '/' + '/'.join(l)
+
+def _key_list(node):
+    return [(k, node.wanted[k]) for k in node.stmt.i_key]
+
+class Validator(object):
+    """Validates one instance document, fed as a sequence of nodes
+
+    The reader calls enter() for each node, value() for the value of a
+    leaf or leaf-list, and leave() at the end of the node.
+    """
+
+    def __init__(self, schema, filename, errors):
+        self.schema = schema
+        self.filename = filename
+        self.errors = errors
+        self.frame = Frame(schema, None, 0)
+
+    def pos(self, line):
+        pos = error.Position(self.filename)
+        pos.line = line
+        return pos
+
+    def error(self, line, tag, args):
+        err_add(self.errors, self.pos(line), tag, args)
+
+    def enter(self, modulename, name, line):
+        """Enter the child `name` of the current node
+
+        Returns False if the node is not defined in the schema; the
+        reader must then skip the node and its children.
+        """
+        parent = self.frame
+        node = parent.node.children().get((modulename, name))
+        if node is None:
+            if modulename is None:
+                s = name
+            else:
+                s = modulename + ':' + name
+            self.error(line, 'INSTANCE_UNKNOWN_NODE', (s, parent.path()))
+            return False
+        f = Frame(node, parent, line)
+        if node.keyword == 'list':
+            f.entry = f
+            f.values = [None] * len(node.wanted)
+        else:
+            f.entry = parent.entry
+        n = parent.counts.get(node, 0) + 1
+        parent.counts[node] = n
+        if n == 2 and node.keyword not in ('list', 'leaf-list'):
+            self.error(line, 'INSTANCE_DUPLICATE_NODE', f.path())
+        for (choice, case) in node.cases:
+            if choice in parent.cases:
+                (other, othername) = parent.cases[choice]
+                if other != case:
+                    self.error(line, 'INSTANCE_CASE_CONFLICT',
+                               (node.name, othername, choice.arg,
+                                parent.path()))
+            else:
+                parent.cases[choice] = (case, node.name)
+        self.frame = f
+        return True
+
+    def value(self, text):
+        self.frame.text.append(text)
+
+    def leave(self, line, check=True):
+        """Leave the current node
+
+        If `check` is False, the value of a leaf is not checked; the
+        reader has already reported an error for it.
+        """
+        f = self.frame
+        node = f.node
+        self.frame = f.parent
+        if node.check is not None and not check:
+            return
+        if node.check is not None:
+            value = ''.join(f.text)
+            if node.strip:
+                value = value.strip()
+            problem = node.check(value)
+            if problem is not None:
+                self.error(f.line, 'INSTANCE_BAD_VALUE',
+                           (value, f.path(), problem))
+            entry = f.parent.entry
+            if entry is not None and node.stmt in entry.node.wanted:
+                entry.values[entry.node.wanted[node.stmt]] = value
+            if node.keyword == 'leaf-list' and \
+               getattr(node.stmt, 'i_config', False) == True:
+                self._chk_unique(f.parent, node, (None, [value]), f.line,
+                                 'INSTANCE_DUPLICATE_VALUE')
+            return
+        self._chk_children(f, line)
+        if node.keyword == 'list':
+            for (k, i) in _key_list(node):
+                if f.values[i] is None:
+                    self.error(f.line, 'INSTANCE_MISSING_KEY',
+                               (k.arg, f.path()))
+                    break
+            else:
+                # a list without keys can have duplicate entries
+                if len(node.keys) > 0:
+                    self._chk_unique(f.parent, node,
+                                     (None,
+                                      [f.values[i] for i in node.keys]),
+                                     f.line, 'INSTANCE_DUPLICATE_KEY')
+            for (u, idxs) in node.uniques:
+                vals = [f.values[i] for i in idxs]
+                if None not in vals:
+                    self._chk_unique(f.parent, node, (u, vals), f.line,
+                                     'INSTANCE_DUPLICATE_UNIQUE')
+
+    def _chk_unique(self, parent, node, key, line, tag):
+        (u, vals) = key
+        entries = parent.entries.setdefault((node, u), {})
+        vals = tuple(vals)
+        if vals in entries:
+            if u is None:
+                args = (', '.join(vals), self.frame_path(parent, node),
+                        entries[vals])
+            else:
+                args = (self.frame_path(parent, node), u.arg,
+                        entries[vals])
+            self.error(line, tag, args)
+        else:
+            entries[vals] = line
+
+    def frame_path(self, parent, node):
+        return Frame(node, parent, 0).path()
+
+    def _chk_children(self, f, line):
+        for child in f.node.mandatory:
+            if child in f.counts:
+                pass
+            elif child.keyword in ('list', 'leaf-list'):
+                self.error(line, 'INSTANCE_TOO_FEW_ELEMENTS',
+                           (self.frame_path(f, child), 0,
+                            child.min_elements))
+            else:
+                self.error(line, 'INSTANCE_MISSING_MANDATORY',
+                           (child.name, f.path()))
+        for choice in f.node.mandatory_choices:
+            if choice not in f.cases:
+                self.error(line, 'INSTANCE_MISSING_MANDATORY',
+                           (choice.arg, f.path()))
+        for (child, n) in f.counts.items():
+            if n < child.min_elements:
+                self.error(line, 'INSTANCE_TOO_FEW_ELEMENTS',
+                           (self.frame_path(f, child), n,
+                            child.min_elements))
+            elif child.max_elements is not None and n > child.max_elements:
+                self.error(line, 'INSTANCE_TOO_MANY_ELEMENTS',
+                           (self.frame_path(f, child), n,
+                            child.max_elements))
+        f.entries = None
+
+    def close(self, line):
+        """Check the top-level nodes, at the end of the document"""
+        self._chk_children(self.frame, line)
+
+### XML
+
+def validate_xml(schema, fd, filename, errors):
+    """Validate the XML document read from the binary file `fd`
+
+    The document element is either a top-level data node, or an element
+    called 'data' or 'config' which contains the top-level data nodes.
+    """
+    v = Validator(schema, filename, errors)
+    p = xml.parsers.expat.ParserCreate(namespace_separator=' ')
+    # the state is kept in a list, so that the handlers can modify it;
+    # it is [depth of the element being skipped, or 0; document element
+    # depth, or None; current depth]
+    state = [0, None, 0]
+    # stack of dicts of prefix:namespace, for identityref values
+    ns_stack = [{}]
+    new_ns = {}
+
+    def split(name):
+        i = name.find(' ')
+        if i == -1:
+            return (None, name)
+        return (name[:i], name[i+1:])
+
+    def start_ns(prefix, uri):
+        new_ns[prefix] = uri
+
+    def start(name, _attrs):
+        state[2] += 1
+        if len(new_ns) > 0:
+            nsmap = dict(ns_stack[-1])
+            nsmap.update(new_ns)
+            new_ns.clear()
+            ns_stack.append(nsmap)
+        else:
+            ns_stack.append(ns_stack[-1])
+        if state[0] > 0:
+            return
+        if v.frame.node.keyword in ('anyxml', 'anydata'):
+            # the contents are not validated
+            state[0] = state[2]
+            return
+        (uri, local) = split(name)
+        line = p.CurrentLineNumber
+        if state[1] is None:
+            state[1] = state[2]
+            if ((schema.namespaces.get(uri), local) not in
+                schema.children() and local in ('data', 'config')):
+                # a wrapper element
+                return
+        modulename = schema.namespaces.get(uri)
+        if modulename is None and uri is not None:
+            modulename = uri
+        if not v.enter(modulename, local, line):
+            state[0] = state[2]
+
+    def end(_name):
+        depth = state[2]
+        state[2] -= 1
+        nsmap = ns_stack.pop()
+        if state[0] > 0:
+            if state[0] == depth:
+                state[0] = 0
+            return
+        if depth == state[1] and v.frame.node is schema:
+            # the end of the wrapper element
+            return
+        f = v.frame
+        ok = True
+        if f.node.identityref:
+            ok = _xml_identityref(v, f, nsmap, schema)
+        v.leave(p.CurrentLineNumber, ok)
+
+    def chars(data):
+        if state[0] == 0 and v.frame.node.check is not None:
+            v.value(data)
+
+    p.StartNamespaceDeclHandler = start_ns
+    p.StartElementHandler = start
+    p.EndElementHandler = end
+    p.CharacterDataHandler = chars
+    p.buffer_text = True
+    try:
+        while True:
+            data = fd.read(65536)
+            if not data:
+                break
+            p.Parse(data, False)
+        p.Parse(b'', True)
+    except xml.parsers.expat.ExpatError as e:
+        v.error(e.lineno, 'INSTANCE_SYNTAX_ERROR',
+                xml.parsers.expat.ErrorString(e.code))
+        return
+    v.close(p.CurrentLineNumber)
+
+def _xml_identityref(v, f, nsmap, schema):
+    """Replace the XML prefix in an identityref value with the module name
+
+    Returns False if the prefix is not defined.  In a union, the value
+    is left as it is if the prefix is not defined, since it may match
+    another member type.
+    """
+    value = ''.join(f.text).strip()
+    i = value.find(':')
+    if i == -1:
+        (prefix, name) = (None, value)
+    else:
+        (prefix, name) = (value[:i], value[i+1:])
+    modulename = schema.namespaces.get(nsmap.get(prefix))
+    if modulename is None:
+        if f.node.stmt.search_one('type').i_type_spec.name != 'union':
+            v.error(f.line, 'INSTANCE_BAD_VALUE',
+                    (value, f.path(), 'unknown prefix %s' % prefix))
+            return False
+        return True
+    f.text = [modulename + ':' + name]
+    return True
+
+### JSON
+
+_re_json_token = re.compile(
+    r'([ \t\r\n]*)(?:([{}\[\]:,])|("(?:[^"\\\x00-\x1f]|\\.)*")'
+    r'|(-?(?:0|[1-9][0-9]*)(?:\.[0-9]+)?(?:[eE][-+]?[0-9]+)?)'
+    r'|(true|false|null))')
+
+class JSONSyntaxError(Exception):
+    def __init__(self, line, msg):
+        Exception.__init__(self, msg)
+        self.line = line
+
+class JSONReader(object):
+    """Reads JSON tokens incrementally from a text file
+
+    Each token is a tuple (kind, value), where kind is one of the
+    punctuation characters, 'string', 'number' or 'literal'.  `line` is
+    the line of the last token.
+    """
+
+    def __init__(self, fd):
+        self.fd = fd
+        self.buf = ''
+        self.i = 0
+        self.eof = False
+        self.line = 1
+
+    def _fill(self):
+        data = self.fd.read(65536)
+        if not data:
+            self.eof = True
+        self.buf = self.buf[self.i:] + data
+        self.i = 0
+
+    def next(self):
+        while True:
+            m = _re_json_token.match(self.buf, self.i)
+            if m is not None and (m.end() < len(self.buf) or self.eof):
+                break
+            if self.eof:
+                if self.buf[self.i:].strip() == '':
+                    return (None, None)
+                raise JSONSyntaxError(self.line, 'unexpected character')
+            self._fill()
+        self.line += self.buf.count('\n', m.start(1), m.end(1))
+        self.i = m.end()
+        if m.group(2) is not None:
+            return (m.group(2), m.group(2))
+        elif m.group(3) is not None:
+            return ('string', json.loads(m.group(3)))
+        elif m.group(4) is not None:
+            return ('number', m.group(4))
+        else:
+            return ('literal', m.group(5))
+
+    def expect(self, kind):
+        (k, value) = self.next()
+        if k != kind:
+            raise JSONSyntaxError(self.line, "expected '%s'" % kind)
+        return value
+
+def validate_json(schema, fd, filename, errors):
+    """Validate the JSON document read from the text file `fd`
+
+    The document is encoded as in RFC 7951.  The top-level object
+    contains the top-level data nodes, or a single member
+    "ietf-restconf:data" which contains them.
+    """
+    v = Validator(schema, filename, errors)
+    r = JSONReader(fd)
+    try:
+        r.expect('{')
+        (kind, name) = r.next()
+        if kind == 'string' and name == 'ietf-restconf:data':
+            r.expect(':')
+            r.expect('{')
+            _json_members(v, r)
+            if r.next()[0] != '}':
+                raise JSONSyntaxError(r.line, "expected '}'")
+        elif kind == 'string':
+            _json_members(v, r, name)
+        elif kind != '}':
+            raise JSONSyntaxError(r.line, "expected a member")
+        if r.next()[0] is not None:
+            raise JSONSyntaxError(r.line, "expected end of document")
+    except JSONSyntaxError as e:
+        v.error(e.line, 'INSTANCE_SYNTAX_ERROR', str(e))
+        return
+    v.close(r.line)
+
+def _json_members(v, r, name=None):
+    """Read the members of an object, up to and including the '}'"""
+    if name is None:
+        (kind, name) = r.next()
+        if kind == '}':
+            return
+        if kind != 'string':
+            raise JSONSyntaxError(r.line, "expected a member")
+    while True:
+        r.expect(':')
+        _json_member(v, r, name)
+        (kind, _) = r.next()
+        if kind == '}':
+            return
+        if kind != ',':
+            raise JSONSyntaxError(r.line, "expected ',' or '}'")
+        name = r.expect('string')
+
+def _json_member(v, r, name):
+    line = r.line
+    i = name.find(':')
+    if i == -1:
+        modulename = v.frame.node.modulename
+        local = name
+    else:
+        modulename = name[:i]
+        local = name[i+1:]
+    if modulename is None or \
+       (modulename, local) not in v.frame.node.children():
+        v.enter(modulename, local, line)
+        _json_skip(r)
+        return
+    node = v.frame.node.children()[(modulename, local)]
+    if node.keyword in ('list', 'leaf-list'):
+        r.expect('[')
+        (kind, value) = r.next()
+        if kind == ']':
+            return
+        while True:
+            v.enter(modulename, local, r.line)
+            _json_node(v, r, node, kind, value)
+            (kind, value) = r.next()
+            if kind == ']':
+                return
+            if kind != ',':
+                raise JSONSyntaxError(r.line, "expected ',' or ']'")
+            (kind, value) = r.next()
+    else:
+        v.enter(modulename, local, line)
+        (kind, value) = r.next()
+        _json_node(v, r, node, kind, value)
+
+def _json_node(v, r, node, kind, value):
+    if node.keyword in ('anyxml', 'anydata'):
+        _json_skip(r, kind)
+    elif node.keyword in ('container', 'list'):
+        if kind != '{':
+            raise JSONSyntaxError(r.line, "expected an object")
+        _json_members(v, r)
+    elif kind == '[' and node.keyword == 'leaf':
+        # an empty value is encoded as [null]
+        r.expect('literal')
+        r.expect(']')
+        v.value('')
+    elif kind in ('string', 'number', 'literal'):
+        if kind == 'literal' and value == 'null':
+            raise JSONSyntaxError(r.line, "unexpected null")
+        v.value(value)
+    else:
+        raise JSONSyntaxError(r.line, "expected a value")
+    v.leave(r.line)
+
+def _json_skip(r, kind=None):
+    """Skip a value; `kind` is the first token, if already read"""
+    if kind is None:
+        (kind, _) = r.next()
+    depth = 0
+    while True:
+        if kind in ('{', '['):
+            depth += 1
+        elif kind in ('}', ']'):
+            depth -= 1
+        elif kind is None:
+            raise JSONSyntaxError(r.line, "unexpected end of document")
+        if depth == 0:
+            return
+        (kind, _) = r.next()
+
+def validate_file(schema, filename, errors, format=None):
+    """Validate the instance document in `filename`
+
+    `format` is 'xml' or 'json'; if it is None, the format is guessed
+    from the first character in the file.
+    """
+    if format is None:
+        fd = io.open(filename, 'rb')
+        try:
+            start = fd.read(1024).lstrip()
+        finally:
+            fd.close()
+        if start.startswith(b'{'):
+            format = 'json'
+        else:
+            format = 'xml'
+    if format == 'json':
+        fd = io.open(filename, 'r', encoding='utf-8')
+        try:
+            validate_json(schema, fd, filename, errors)
+        finally:
+            fd.close()
+    else:
+        fd = io.open(filename, 'rb')
+        try:
+            validate_xml(schema, fd, filename, errors)
+        finally:
+            fd.close()
@@ -2,34 +2,125 @@
 
 import os
 import sys
-import pkg_resources
+import importlib
 
 plugins = []
 """List of registered PyangPlugin instances"""
 
-def init(plugindirs=[]):
-    """Initialize the plugin framework"""
+builtin_plugins = [
+    # (module, output formats, command line options, always loaded)
+    #
+    #
+    # A builtin plugin which is not always loaded is loaded only if
+    # one of its formats or options is given on the command line.
+    ('pyang.translators.yang', ['yang'],
+     ['--yang-canonical', '--yang-remove-unused-imports',
+      '--yang-expand-groupings'], False),
+    ('pyang.translators.yin', ['yin'],
+     ['--yin-canonical', '--yin-pretty-strings'], False),
+    ('pyang.translators.dsdl', ['dsdl'],
+     ['--dsdl-no-documentation', '--dsdl-no-dublin-core',
+      '--dsdl-record-defs', '--dsdl-lax-yang-version'], False),
+    ('bbf', [], ['--bbf'], False),
+    ('capability', ['capability'], ['--capability-entity'], False),
+    ('check_update', [],
+     ['--check-update-from', '-P', '--check-update-from-path'], False),
+    ('depend', ['depend'],
+     ['--depend-target', '--depend-no-submodules',
+      '--depend-from-submodules', '--depend-recurse',
+      '--depend-extension', '--depend-include-path',
+      '--depend-ignore-module', '--depend-repository',
+      '--depend-format'], False),
+    ('fingerprint', ['fingerprint'], [], False),
+    ('ieee', [], ['--ieee'], False),
+    ('ietf', [], ['--ietf'], False),
+    ('ietf_model', [], ['--ietf-to-split-state-tree'], False),
+    ('ietf_to_combined', [],
+     ['--ietf-split-to-combined-tree', '--remove-state-nodes'], False),
+    ('ietf_to_oc_style', [], ['--ietf-to-oc-style'], False),
+    ('ietf_to_state_module', [], ['--ietf-to-state-module'], False),
+    ('instance_data', [],
+     ['--instance-data', '--instance-data-format'], False),
+    ('jsonxsl', ['jsonxsl'], [], False),
+    ('jstree', ['jstree'], ['--jstree-no-path', '--jstree-path'], False),
+    ('jtox', ['jtox'], [], False),
+    ('lint', [],
+     ['--lint', '--lint-namespace-prefix', '--lint-modulename-prefix'],
+     False),
+    ('mef', [], ['--mef'], False),
+    # metadata, restconf and smi add extension statements to the grammar
+    ('metadata', [], [], True),
+    ('name', ['name'], ['--name-print-revision'], False),
+    ('omni', ['omni'], ['--omni-path'], False),
+    ('openconfig', [], ['--ietf-to-oc'], False),
+    ('restconf', [], [], True),
+    ('sample-xml-skeleton', ['sample-xml-skeleton'],
+     ['--sample-xml-skeleton-doctype', '--sample-xml-skeleton-defaults',
+      '--sample-xml-skeleton-annotations', '--sample-xml-skeleton-path'],
+     False),
+    ('smi', [], [], True),
+    ('tree', ['tree'],
+     ['--tree-help', '--tree-depth', '--tree-line-length', '--tree-path',
+      '--tree-print-groupings', '--tree-print-yang-data'], False),
+    ('uml', ['uml'],
+     ['--uml-classes-only', '--uml-split-pages', '--uml-output-directory',
+      '--uml-title', '--uml-header', '--uml-footer',
+      '--uml-long-identifiers', '--uml-inline-groupings',
+      '--uml-inline-augments', '--uml-description', '--uml-no',
+      '--uml-truncate', '--uml-max-enums', '--uml-filter',
+      '--uml-filter-file'], False),
+    ]
+"""The builtin plugins, i.e. the translators and the modules in the
+plugins directory, with the output formats and options they add."""
+
+builtin_plugin_requires = {
+    # these use the options of the lint plugin
+    'bbf': ['lint'],
+    'ieee': ['lint'],
+    'ietf': ['lint'],
+    'mef': ['lint'],
+    # these use the options of the yang translator
+    'ietf_model': ['pyang.translators.yang'],
+    'ietf_to_combined': ['pyang.translators.yang'],
+    'ietf_to_state_module': ['pyang.translators.yang'],
+    }
+"""Maps a builtin plugin to the builtin plugins it needs"""
+
+def init(plugindirs=[], args=None):
+    """Initialize the plugin framework
+
+    If `args` is given, it is the list of command line arguments, and
+    only the builtin plugins which are needed for these arguments are
+    loaded; see `builtin_plugins`.  Otherwise all plugins are loaded.
+    Installed plugins and plugins in `plugindirs` are always loaded.
+    """
+    if args is None:
+        wanted = None
+    else:
+        wanted = wanted_plugins(args)
 
-    # initialize the builtin plugins
-    from .translators import yang,yin,dsdl
-    yang.pyang_plugin_init()
-    yin.pyang_plugin_init()
-    dsdl.pyang_plugin_init()
+    # initialize the builtin translators
+    for (name, _formats, _options, _always) in builtin_plugins:
+        if (name.startswith('pyang.translators.') and
+            (wanted is None or name in wanted)):
+            importlib.import_module(name).pyang_plugin_init()
 
     # initialize installed plugins
-    for ep in pkg_resources.iter_entry_points(group='pyang.plugin'):
+    for ep in _entry_points():
         plugin_init = ep.load()
         plugin_init()
 
     # search for plugins in std directory
     basedir = os.path.split(sys.modules['pyang'].__file__)[0]
-    plugindirs.insert(0, basedir + "/plugins")
+    stddir = basedir + "/plugins"
+    plugindirs.insert(0, stddir)
 
     # add paths from env
     pluginpath = os.getenv('PYANG_PLUGINPATH')
     if pluginpath is not None:
         plugindirs.extend(pluginpath.split(os.pathsep))
 
+    builtin = set([name for (name, _f, _o, _a) in builtin_plugins])
     syspath = sys.path
     for plugindir in plugindirs:
         sys.path = [plugindir] + syspath
@@ -40,6 +131,9 @@ def init(plugindirs=[]):
         for fname in fnames:
             if not fname.startswith(".#") and fname.endswith(".py") and \
                fname != '__init__.py':
+                if (wanted is not None and plugindir == stddir and
+                    fname[:-3] in builtin and fname[:-3] not in wanted):
+                    continue
                 pluginmod = __import__(fname[:-3])
                 try:
                     pluginmod.pyang_plugin_init()
@@ -48,6 +142,56 @@ def init(plugindirs=[]):
                     raise AttributeError(pluginmod.__file__ + ': ' + str(s))
         sys.path = syspath
 
+def wanted_plugins(args):
+    """Return the names of the builtin plugins needed for `args`
+
+    A plugin is needed if it is always loaded, or if one of its output
+    formats or options, or an abbreviation of one of its long options,
+    is found in `args`.  Since `args` is not parsed, a plugin may be
+    loaded even if it is not needed.
+    """
+    words = set()
+    for arg in args:
+        if arg.startswith('--'):
+            (opt, _eq, val) = arg.partition('=')
+            words.add(opt)
+            words.add(val)
+        elif arg.startswith('-'):
+            # short options, or a short option with its argument,
+            # e.g. -ftree
+            for c in arg[1:]:
+                words.add('-' + c)
+            words.add(arg[2:])
+        else:
+            words.add(arg)
+    longopts = [w for w in words if w.startswith('--') and len(w) > 2]
+    wanted = set()
+    for (name, formats, options, always) in builtin_plugins:
+        if always or words.intersection(formats + options):
+            wanted.add(name)
+        else:
+            for w in longopts:
+                if [opt for opt in options if opt.startswith(w)]:
+                    wanted.add(name)
+                    break
+    for name in list(wanted):
+        wanted.update(builtin_plugin_requires.get(name, []))
+    return wanted
+
+def _entry_points():
+    """Return the entry points of the installed plugins"""
+    try:
+        from importlib import metadata
+    except ImportError:
+        # importing pkg_resources is slow; use it only when
+        # importlib.metadata is not available
+        import pkg_resources
+        return pkg_resources.iter_entry_points(group='pyang.plugin')
+    eps = metadata.entry_points()
+    if hasattr(eps, 'select'):
+        return eps.select(group='pyang.plugin')
+    return eps.get('pyang.plugin', [])
+
 def register_plugin(plugin):
     """Call this to register a pyang plugin. See class PyangPlugin
     for more info.
@@ -78,6 +222,9 @@ class PyangPlugin(object):
         self.name = name
         self.multiple_modules = False
         self.handle_comments = False
+        self.modules_optional = False
+        """if True, the output format does not need any modules, and
+        no module is read from stdin if no file is given"""
 
     ## pyang front-end program methods
 
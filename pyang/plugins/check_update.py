@@ -1,6 +1,12 @@
 """YANG module update check tool
 This plugin checks if an updated version of a module follows
 the rules defined in Section 10 of RFC 6020.
+
+The old module can also be given as a file written with
+`-f fingerprint`, see pyang/fingerprint.py.  The old module is then
+parsed and validated only if some top-level definition has changed, and
+the definitions and subtrees with the same fingerprint in the old and
+new module are not checked further.
 """
 
 import optparse
@@ -14,6 +20,7 @@ from pyang import statements
 from pyang import error
 from pyang import util
 from pyang import types
+from pyang import fingerprint
 from pyang.error import err_add
 
 def pyang_plugin_init():
@@ -26,7 +33,9 @@ class CheckUpdatePlugin(plugin.PyangPlugin):
                                  metavar="OLDMODULE",
                                  dest="check_update_from",
                                  help="Verify that upgrade from OLDMODULE" \
-                                      " follows RFC 6020 rules."),
+                                      " follows RFC 6020 rules.  OLDMODULE" \
+                                      " can also be a file written with" \
+                                      " -f fingerprint."),
             optparse.make_option("-P", "--check-update-from-path",
                                  dest="old_path",
                                  default=[],
@@ -125,6 +134,18 @@ class CheckUpdatePlugin(plugin.PyangPlugin):
         check_update(ctx, ctx.opts.check_update_from, modules[0])
 
 def check_update(ctx, oldfilename, newmod):
+    try:
+        fd = io.open(oldfilename, "r", encoding="utf-8")
+        text = fd.read()
+    except IOError as ex:
+        sys.stderr.write("error %s: %s\n" % (oldfilename, str(ex)))
+        sys.exit(1)
+    if text.lstrip().startswith('{'):
+        doc = fingerprint.read_fingerprints(text)
+        if doc is not None:
+            check_update_from_fingerprints(ctx, oldfilename, doc, newmod)
+            return
+
     oldpath = os.pathsep.join(ctx.opts.old_path)
     olddir = os.path.dirname(oldfilename)
     if olddir == '':
@@ -145,13 +166,6 @@ def check_update(ctx, oldfilename, newmod):
     for p in plugin.plugins:
         p.setup_ctx(oldctx)
 
-    oldfilename = ctx.opts.check_update_from
-    try:
-        fd = io.open(oldfilename, "r", encoding="utf-8")
-        text = fd.read()
-    except IOError as ex:
-        sys.stderr.write("error %s: %s\n" % (oldfilename, str(ex)))
-        sys.exit(1)
     oldmod = oldctx.add_module(oldfilename, text)
     ctx.errors.extend(oldctx.errors)
 
@@ -170,11 +184,13 @@ def check_update(ctx, oldfilename, newmod):
             print("  %s" % filename)
         print("")
 
-    chk_modulename(oldmod, newmod, ctx)
+    old = fingerprint.module_header(oldmod)
+
+    chk_modulename(old, newmod, ctx)
 
-    chk_namespace(oldmod, newmod, ctx)
+    chk_namespace(old, newmod, ctx)
 
-    chk_revision(oldmod, newmod, ctx)
+    chk_revision(old, newmod, ctx)
 
     for olds in oldmod.search('feature'):
         chk_feature(olds, newmod, ctx)
@@ -199,18 +215,70 @@ def check_update(ctx, oldfilename, newmod):
 
     chk_i_children(oldmod, newmod, ctx)
 
-def chk_modulename(oldmod, newmod, ctx):
-    if oldmod.arg != newmod.arg:
+def check_update_from_fingerprints(ctx, fpfilename, doc, newmod):
+    """Check `newmod` against the fingerprints of the old module in `doc`
+
+    If all old top-level definitions are unchanged, only the module
+    header and the new top-level nodes are checked.  Otherwise the old
+    module, which is expected to be found next to the fingerprint file,
+    is checked, except for the definitions and subtrees which are
+    unchanged.
+    """
+    for (epos, etag, eargs) in ctx.errors:
+        if (epos.ref == newmod.pos.ref and
+            error.is_error(error.err_level(etag))):
+            return
+
+    oldfps = doc['fingerprints']
+    newfps = {}
+    for (key, news) in fingerprint.module_definitions(newmod):
+        newfps[key] = fingerprint.get_fingerprint(news)
+        if newfps[key] == oldfps.get(key):
+            # the old statement is identical; see chk_stmt() and
+            # chk_child()
+            news.i_unchanged = True
+    changed = [k for k in oldfps
+               if fingerprint.is_top_level(k) and newfps.get(k) != oldfps[k]]
+    if changed:
+        oldfilename = os.path.join(os.path.dirname(fpfilename), doc['file'])
+        if ctx.opts.verbose:
+            print("Changed since %s:" % fpfilename)
+            for k in sorted(changed):
+                print("  %s" % k)
+            print("")
+        if not os.path.isfile(oldfilename):
+            sys.stderr.write("error %s: the old module %s is needed to "
+                             "check the changed definitions\n" %
+                             (fpfilename, oldfilename))
+            sys.exit(1)
+        check_update(ctx, oldfilename, newmod)
+        return
+
+    chk_modulename(doc, newmod, ctx)
+
+    chk_namespace(doc, newmod, ctx)
+
+    chk_revision(doc, newmod, ctx)
+
+    for newch in newmod.i_children:
+        if ('data /' + newch.arg not in oldfps and
+            statements.is_mandatory_node(newch)):
+            err_add(ctx.errors, newch.pos, 'CHK_NEW_MANDATORY', newch.arg)
+
+# `old` is the header of the old module; see fingerprint.module_header()
+
+def chk_modulename(old, newmod, ctx):
+    if old['module'] != newmod.arg:
         err_add(ctx.errors, newmod.pos, 'CHK_INVALID_MODULENAME', ())
 
-def chk_namespace(oldmod, newmod, ctx):
-    oldns = oldmod.search_one('namespace')
+def chk_namespace(old, newmod, ctx):
+    oldns = old['namespace']
     newns = newmod.search_one('namespace')
-    if oldns is not None and newns is not None and oldns.arg != newns.arg:
+    if oldns is not None and newns is not None and oldns != newns.arg:
         err_add(ctx.errors, newmod.pos, 'CHK_INVALID_NAMESPACE', ())
 
-def chk_revision(oldmod, newmod, ctx):
-    oldrev = get_latest_revision(oldmod)
+def chk_revision(old, newmod, ctx):
+    oldrev = old['revision']
     newrev = get_latest_revision(newmod)
     if newrev is None:
         err_add(ctx.errors, newmod.pos, 'CHK_NO_REVISION', ())
@@ -296,6 +364,8 @@ def chk_stmt(olds, newp, ctx):
     if news is None:
         err_def_removed(olds, newp, ctx)
         return None
+    if getattr(news, 'i_unchanged', False):
+        return None
     chk_status(olds, news, ctx)
     chk_if_feature(olds, news, ctx)
     return news
@@ -322,6 +392,8 @@ def chk_child(oldch, newp, ctx):
         err_add(ctx.errors, newch.pos, 'CHK_CHILD_KEYWORD_CHANGED',
                 (oldch.keyword, newch.arg, newch.keyword))
         return
+    if getattr(newch, 'i_unchanged', False):
+        return
     chk_status(oldch, newch, ctx)
     chk_if_feature(oldch, newch, ctx)
     chk_config(oldch, newch, ctx)
@@ -1,13 +1,19 @@
 """Makefile dependency rule output plugin
 
+The dependencies can also be written as JSON or as a graph in the
+DOT language, for the given modules or, with --depend-repository,
+for all modules in the search path.  See pyang/depgraph.py.
 """
 
 import optparse
 import sys
 import os.path
+import json
 
 from pyang import plugin
 from pyang import error
+from pyang import depgraph
+from pyang import util
 
 def pyang_plugin_init():
     plugin.register_plugin(DependPlugin())
@@ -47,12 +53,35 @@ class DependPlugin(plugin.PyangPlugin):
                                  help="(sub)module to ignore in the" \
                                      " prerequisites.  This option can be" \
                                      " given multiple times."),
+            optparse.make_option("--depend-repository",
+                                 dest="depend_repository",
+                                 action="store_true",
+                                 help="Generate dependencies for all" \
+                                     " modules in the search path." \
+                                     " The modules are scanned, not" \
+                                     " validated."),
+            optparse.make_option("--depend-format",
+                                 dest="depend_format",
+                                 type="choice",
+                                 choices=["make", "json", "dot"],
+                                 default="make",
+                                 help="Write Makefile rules (default), a" \
+                                     " JSON object or a DOT graph"),
             ]
         g = optparser.add_option_group("Depend output specific options")
         g.add_options(optlist)
     def add_output_format(self, fmts):
         self.multiple_modules = True
         fmts['depend'] = self
+    def setup_fmt(self, ctx):
+        if ctx.opts.depend_repository:
+            self.modules_optional = True
+    def pre_load_modules(self, ctx):
+        if ctx.opts.depend_repository:
+            # scanned before the given modules are added, so that
+            # errors are reported with the other errors
+            self.graph = depgraph.DependencyGraph()
+            self.graph.add_repository(ctx)
     def emit(self, ctx, modules, fd):
         # cannot do this unless everything is ok for our module
         modulenames = [m.arg for m in modules]
@@ -60,48 +89,164 @@ class DependPlugin(plugin.PyangPlugin):
             if ((epos.top is None or epos.top.arg in modulenames) and
                 error.is_error(error.err_level(etag))):
                 raise error.EmitError("%s contains errors" % epos.top.arg)
-        emit_depend(ctx, modules, fd)
+        if ctx.opts.depend_repository:
+            graph = self.graph
+            for m in modules:
+                graph.add_module(depgraph.info_from_stmt(m))
+            infos = graph.sorted_modules()
+        else:
+            graph = depgraph.DependencyGraph()
+            for m in ctx.modules.values():
+                graph.add_module(depgraph.info_from_stmt(m))
+            infos = [graph.get_module(m.arg, util.get_latest_revision(m))
+                     for m in modules]
+        if ctx.opts.depend_format == 'json':
+            emit_json(ctx, graph, fd)
+        elif ctx.opts.depend_format == 'dot':
+            emit_dot(ctx, graph, fd)
+        else:
+            emit_depend(ctx, graph, infos, fd)
 
-def emit_depend(ctx, modules, fd):
-    for module in modules:
+def emit_depend(ctx, graph, infos, fd):
+    for info in infos:
         if ctx.opts.depend_target is None:
-            fd.write('%s :' % module.pos.ref)
+            line = ['%s :' % info.ref]
         else:
-            fd.write('%s :' % ctx.opts.depend_target)
-        prereqs = []
-        add_prereqs(ctx, module, prereqs)
-        for i in prereqs:
+            line = ['%s :' % ctx.opts.depend_target]
+        for i in get_prereqs(ctx, graph, info):
             if i in ctx.opts.depend_ignore:
                 continue
-            if ctx.opts.depend_include_path:
-                m = ctx.get_module(i)
+            m = graph.get_module(i)
+            if ctx.opts.depend_include_path and m is not None:
                 if ctx.opts.depend_extension is None:
-                    filename = m.pos.ref
+                    filename = m.ref
                 else:
-                    basename = os.path.splitext(m.pos.ref)[0]
+                    basename = os.path.splitext(m.ref)[0]
                     filename = '%s%s' % (basename, ctx.opts.depend_extension)
-                fd.write(' %s' % filename)
+                line.append(' %s' % filename)
             else:
                 if ctx.opts.depend_extension is None:
                     ext = ""
                 else:
                     ext = ctx.opts.depend_extension
-                fd.write(' %s%s' % (i, ext))
-        fd.write('\n')
+                line.append(' %s%s' % (i, ext))
+        line.append('\n')
+        fd.write(''.join(line))
+    for scc in graph.cycles():
+        fd.write('# cycle: %s\n' % ' '.join([m.id() for m in scc]))
 
-def add_prereqs(ctx, module, prereqs):
-    new = [i.arg for i in module.search("import") if i.arg not in prereqs]
-    if not ctx.opts.depend_no_submodules:
-        new += [i.arg for i in module.search("include")
-                if i.arg not in prereqs and i.arg not in new]
-    if ctx.opts.depend_from_submodules:
-        for i in module.search("include"):
-            subm = ctx.get_module(i.arg)
-            if subm is not None:
-                new += [i.arg for i in subm.search("import")
-                        if i.arg not in prereqs and i.arg not in new]
-    prereqs.extend(new)
+def get_prereqs(ctx, graph, info):
+    """Return the names of the modules `info` depends on, in the order
+    they are imported or included"""
+    prereqs = []
+    seen = set()
+    def add_prereqs(info):
+        new = []
+        def add(name):
+            if name not in seen:
+                seen.add(name)
+                new.append(name)
+        for (name, _rev, _prefix) in info.imports:
+            add(name)
+        if not ctx.opts.depend_no_submodules:
+            for (name, _rev) in info.includes:
+                add(name)
+        if ctx.opts.depend_from_submodules:
+            for (name, rev) in info.includes:
+                subm = graph.get_module(name, rev)
+                if subm is not None:
+                    for (name, _rev, _prefix) in subm.imports:
+                        add(name)
+        prereqs.extend(new)
+        return new
+    new = add_prereqs(info)
     if ctx.opts.depend_recurse:
-        for i in new:
-            m = ctx.get_module(i)
-            add_prereqs(ctx, m, prereqs)
+        # depth first, with an explicit stack for long import chains
+        stack = [iter(new)]
+        while stack:
+            for name in stack[-1]:
+                m = graph.get_module(name)
+                if m is not None:
+                    stack.append(iter(add_prereqs(m)))
+                    break
+            else:
+                stack.pop()
+    return prereqs
+
+def _ignored(ctx, info):
+    return info.name in ctx.opts.depend_ignore
+
+def emit_json(ctx, graph, fd):
+    modules = {}
+    levels = graph.levels()
+    for (n, level) in enumerate(levels):
+        for info in level:
+            if _ignored(ctx, info):
+                continue
+            deps = {}
+            missing = []
+            for (kind, name, dep) in graph.edges(info):
+                if name in ctx.opts.depend_ignore:
+                    continue
+                if dep is None:
+                    if name not in missing:
+                        missing.append(name)
+                elif dep.id() not in deps.setdefault(kind, []):
+                    deps[kind].append(dep.id())
+            res = {'name': info.name,
+                   'keyword': info.keyword,
+                   'file': info.ref,
+                   'level': n,
+                   'dependencies': deps,
+                   'dependents': [m.id() for m in graph.dependents(info)
+                                  if not _ignored(ctx, m)]}
+            if info.revision != 'unknown':
+                res['revision'] = info.revision
+            if info.belongs_to is not None:
+                res['belongs-to'] = info.belongs_to
+            if missing:
+                res['missing'] = missing
+            modules[info.id()] = res
+    doc = {'modules': modules,
+           'order': [m.id() for m in graph.topological_order()
+                     if not _ignored(ctx, m)],
+           'cycles': [[m.id() for m in scc] for scc in graph.cycles()]}
+    fd.write(json.dumps(doc, indent=1, sort_keys=True,
+                        separators=(',', ': ')))
+    fd.write('\n')
+
+def emit_dot(ctx, graph, fd):
+    # the modules in a cycle are red; the edges which are not imports
+    # are labelled with their kind
+    in_cycle = set()
+    for scc in graph.cycles():
+        for m in scc:
+            in_cycle.add(id(m))
+    fd.write('digraph "dependencies" {\n')
+    for info in graph.sorted_modules():
+        if _ignored(ctx, info):
+            continue
+        attrs = []
+        if info.keyword == 'submodule':
+            attrs.append('shape=box')
+        if id(info) in in_cycle:
+            attrs.append('color=red')
+        if attrs:
+            fd.write('  "%s" [%s];\n' % (info.id(), ', '.join(attrs)))
+        else:
+            fd.write('  "%s";\n' % info.id())
+        seen = set()
+        for (kind, name, dep) in graph.edges(info):
+            if name in ctx.opts.depend_ignore:
+                continue
+            if dep is not None:
+                name = dep.id()
+            if (kind, name) in seen:
+                continue
+            seen.add((kind, name))
+            if kind == 'import':
+                fd.write('  "%s" -> "%s";\n' % (info.id(), name))
+            else:
+                fd.write('  "%s" -> "%s" [label="%s"];\n' %
+                         (info.id(), name, kind))
+    fd.write('}\n')
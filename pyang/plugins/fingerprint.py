@@ -0,0 +1,23 @@
+"""Fingerprint output plugin
+
+Writes the fingerprints of the definitions in a module, see
+pyang/fingerprint.py.  The file can be given to --check-update-from
+instead of the module.
+"""
+
+from pyang import plugin
+from pyang import error
+from pyang import fingerprint
+
+def pyang_plugin_init():
+    plugin.register_plugin(FingerprintPlugin())
+
+class FingerprintPlugin(plugin.PyangPlugin):
+    def add_output_format(self, fmts):
+        fmts['fingerprint'] = self
+
+    def emit(self, ctx, modules, fd):
+        for (epos, etag, eargs) in ctx.errors:
+            if error.is_error(error.err_level(etag)):
+                raise error.EmitError("fingerprint plugin needs a valid module")
+        fingerprint.write_fingerprints(modules[0], fd)
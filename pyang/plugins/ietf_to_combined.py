@@ -44,10 +44,12 @@ class IetfModelPlugin(plugin.PyangPlugin):
     def post_validate_ctx(self, ctx, modules):
         IetfModelPlugin.remove_state = ctx.opts.ietf_remove_state_nodes
         if ctx.opts.ietf_split_to_combined:
-            # Run the plugin here.
-            module = modules[0]
-            # TODO - Need to copy the original tree here. 
-            convert_module(ctx, module)
+            # Run the plugin here.  All given modules are converted, so
+            # that a set of modules can be converted in one run with
+            # --output-dir.
+            for module in modules:
+                # TODO - Need to copy the original tree here. 
+                convert_module(ctx, module)
     
 def add_substmt_canonical(parent_stmt, stmt):
     parent_stmt.substmts.append(stmt)
@@ -106,20 +108,16 @@ def matching_cfg_augment(state_arg):
     cfg_str = m.group(1) + m.group(2)
     return cfg_str
 
-def matches_cfg_augment(cfg_stmt, state_aug_stmt):
-    return (cfg_stmt.keyword == 'augment' and
-            cfg_stmt.arg == matching_cfg_augment(state_aug_stmt.arg))
-
 #
-# Check whether a config and state statement match and should not be copied across.
+# A config and a state statement match, and the state statement is not
+# copied across, iff they have the same key: description and presence
+# statements match any statement with the same keyword, and all other
+# statements match if both the keyword and the argument are equal.
 #
-def is_matching_stmt(cfg_stmt, state_stmt):
-    matching = False
-    if (state_stmt.keyword == cfg_stmt.keyword
-        and (state_stmt.keyword in ['description', 'presence']
-             or cfg_stmt.arg == state_stmt.arg)):
-        matching = True
-    return (matching)
+def matching_key(stmt):
+    if stmt.keyword in ['description', 'presence']:
+        return stmt.keyword
+    return (stmt.keyword, stmt.arg)
     
 # Peform any other required fix up
 if_state_ref_pattern = re.compile("^([^:]*?:?)interface-state-ref$")
@@ -138,10 +136,14 @@ def convert_stmt(config_stmt, state_stmt):
     # Iterate the state tree
     state_substmts = grammar.sort_canonical(state_stmt.keyword, state_stmt.substmts)
     config_substmts = grammar.sort_canonical(config_stmt.keyword, config_stmt.substmts)
+    # Index the config statements by their matching key; the first
+    # statement with a given key is the one that is used.
+    matching_cfg_stmts = {}
+    for c in config_substmts:
+        matching_cfg_stmts.setdefault(matching_key(c), c)
     for s in state_substmts:
-        matching_cfg_stmts = [c for c in config_substmts if is_matching_stmt(c, s)]
-        if any(matching_cfg_stmts):
-            cfg_stmt = matching_cfg_stmts[0]
+        cfg_stmt = matching_cfg_stmts.get(matching_key(s))
+        if cfg_stmt is not None:
             
             if (s.keyword in ['description', 'presence']):
                 if s.arg != cfg_stmt.arg:
@@ -233,6 +235,20 @@ def convert_module(ctx, m_stmt):
         # Look for config/state containers to convert.
         if len(m_stmt.substmts) != 0:
             m_substmts = grammar.sort_canonical(m_stmt.keyword, m_stmt.substmts)
+
+            # Index the top level state containers and augments by
+            # name, so that each config container and state augment is
+            # paired in constant time.
+            state_containers = {}
+            augments = {}
+            for s in m_substmts:
+                if is_state_container(s):
+                    state_containers.setdefault(s.arg, []).append(s)
+                elif s.keyword == 'augment':
+                    augments.setdefault(s.arg, s)
+            # Statements to remove from the module, by id
+            removed = set()
+
             for substmt in m_substmts:
                 if substmt.keyword in ['namespace', 'belongs-to']:
                     substmt.arg = substmt.arg + '-2'
@@ -240,7 +256,7 @@ def convert_module(ctx, m_stmt):
                 # Remove the interface state ref?
                 # Or, is this even appropriate.
                 if substmt.keyword == 'typedef' and substmt.arg == 'interface-state-ref':
-                    m_stmt.substmts.remove(substmt)
+                    removed.add(id(substmt))
                 
                 # Fix up import references to point to the combined modules.
                 #if (substmt.keyword in ['import', 'include']
@@ -250,32 +266,31 @@ def convert_module(ctx, m_stmt):
                 
                 # Handle top level config/state containers.
                 if is_config_container(substmt):
-                    for s in m_substmts:
-                        if (s.arg == (substmt.arg + "-state") and is_state_container(s)):
-                            convert_stmt(substmt, s)
-                            
-                            # Either remove the m_substmts, or mark it as status deprecated.
-                            if IetfModelPlugin.remove_state:
-                                m_stmt.substmts.remove(s)
-                            else:
-                                mark_stmt_deprecated(s)
+                    for s in state_containers.get(substmt.arg + "-state", []):
+                        convert_stmt(substmt, s)
+
+                        # Either remove the m_substmts, or mark it as status deprecated.
+                        if IetfModelPlugin.remove_state:
+                            removed.add(id(s))
+                        else:
+                            mark_stmt_deprecated(s)
                             
                 # Handle top level augmentations of config/state containers.
                 if is_state_augmentation(substmt):
-                    cfg_augment = [c for c in m_substmts if matches_cfg_augment(c, substmt)] 
-                    if cfg_augment:
-                        cfg_stmt = cfg_augment[0]
+                    cfg_arg = matching_cfg_augment(substmt.arg)
+                    cfg_stmt = augments.get(cfg_arg)
+                    if cfg_stmt is not None:
                         convert_stmt(cfg_stmt, substmt)
                         
                         # Either remove the m_substmts, or mark it as status deprecated.
                         if IetfModelPlugin.remove_state:
-                            m_stmt.substmts.remove(substmt)
+                            removed.add(id(substmt))
                         else:
                             mark_stmt_deprecated(substmt)
                     else:
                         # If it is just a state augmentation then just rename the augmentation.
-                        cfg_arg = matching_cfg_augment(substmt.arg)
-                        substmt.arg = cfg_arg           
+                        substmt.arg = cfg_arg
+                        augments[cfg_arg] = substmt
                             
                 # Run the fixup on any groupings (e.g. to fix up type references)
                 if substmt.keyword == 'grouping':
@@ -284,4 +299,7 @@ def convert_module(ctx, m_stmt):
                 # Assume that a grouping only contains state if it is has state in its name.
                 if substmt.keyword == 'grouping' and "-state" in substmt.arg:
                     fixup_state_grouping(substmt)
-        
+
+            if removed:
+                m_stmt.substmts = [s for s in m_stmt.substmts
+                                   if id(s) not in removed]
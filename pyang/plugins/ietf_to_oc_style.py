@@ -87,7 +87,7 @@ def i_to_o_list_keys(stmt):
 
     def attrsearch(tag, attr, lst):
         for x in lst:
-            if x.__dict__[attr] == tag:
+            if getattr(x, attr) == tag:
                 return x
         return None
 
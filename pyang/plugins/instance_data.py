@@ -0,0 +1,92 @@
+"""Instance data validation plugin
+
+Validates XML or JSON instance documents against the data nodes of the
+validated modules.  The documents are read incrementally; see
+pyang/instance.py.
+"""
+
+import optparse
+import sys
+
+from pyang import plugin
+from pyang import error
+from pyang import instance
+
+def pyang_plugin_init():
+    plugin.register_plugin(InstanceDataPlugin())
+
+class InstanceDataPlugin(plugin.PyangPlugin):
+    def add_opts(self, optparser):
+        optlist = [
+            optparse.make_option("--instance-data",
+                                 metavar="FILE",
+                                 dest="instance_data",
+                                 default=[],
+                                 action="append",
+                                 help="Validate the XML or JSON instance" \
+                                      " document FILE against the modules."),
+            optparse.make_option("--instance-data-format",
+                                 dest="instance_data_format",
+                                 type="choice",
+                                 choices=["xml", "json"],
+                                 help="The format of the instance" \
+                                      " documents, xml or json.  By default" \
+                                      " it is found from the contents."),
+            ]
+        optparser.add_options(optlist)
+
+        # register our error codes
+        error.add_error_code(
+            'INSTANCE_SYNTAX_ERROR', 1,
+            "syntax error in instance document: %s")
+        error.add_error_code(
+            'INSTANCE_UNKNOWN_NODE', 1,
+            "node %s is not defined in the schema at %s")
+        error.add_error_code(
+            'INSTANCE_BAD_VALUE', 1,
+            "bad value \"%s\" for %s: %s")
+        error.add_error_code(
+            'INSTANCE_DUPLICATE_NODE', 1,
+            "the node %s occurs more than once")
+        error.add_error_code(
+            'INSTANCE_CASE_CONFLICT', 1,
+            "the node %s cannot be given together with %s,"
+            " since they are in different cases of the choice %s in %s")
+        error.add_error_code(
+            'INSTANCE_MISSING_KEY', 1,
+            "the key %s is missing in %s")
+        error.add_error_code(
+            'INSTANCE_DUPLICATE_KEY', 1,
+            "the key values (%s) for %s are already used at line %s")
+        error.add_error_code(
+            'INSTANCE_DUPLICATE_UNIQUE', 1,
+            "the entry in %s violates the unique constraint \"%s\","
+            " the values are already used at line %s")
+        error.add_error_code(
+            'INSTANCE_DUPLICATE_VALUE', 1,
+            "the value %s in %s is already used at line %s")
+        error.add_error_code(
+            'INSTANCE_MISSING_MANDATORY', 1,
+            "the mandatory node %s is missing in %s")
+        error.add_error_code(
+            'INSTANCE_TOO_FEW_ELEMENTS', 1,
+            "%s has %s entries, but min-elements is %s")
+        error.add_error_code(
+            'INSTANCE_TOO_MANY_ELEMENTS', 1,
+            "%s has %s entries, but max-elements is %s")
+
+    def post_validate_ctx(self, ctx, modules):
+        if not ctx.opts.instance_data:
+            return
+        for (epos, etag, eargs) in ctx.errors:
+            if error.is_error(error.err_level(etag)):
+                # the schema cannot be trusted
+                return
+        schema = instance.compile_schema(ctx, modules)
+        for filename in ctx.opts.instance_data:
+            try:
+                instance.validate_file(schema, filename, ctx.errors,
+                                       ctx.opts.instance_data_format)
+            except IOError as ex:
+                sys.stderr.write("error %s: %s\n" % (filename, str(ex)))
+                sys.exit(1)
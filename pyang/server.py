@@ -0,0 +1,361 @@
+"""A validation server which keeps validated modules between requests
+
+The server keeps one Context with all modules loaded so far.  Before
+each request, the files of the loaded modules and the directories of
+the repository are checked for changes.  Only the modules that have
+changed, and the modules that depend on them, are removed from the
+context, so that the next request only has to re-validate those.
+
+Requests and replies are JSON objects, one per line, sent over a Unix
+domain socket.  One request is handled per connection.  A request is:
+
+  {"command": "validate", "files": [<filename>, ...]}
+  {"command": "emit", "files": [<filename>, ...], "format": <format>}
+  {"command": "shutdown"}
+
+and the reply is:
+
+  {"exit-code": <int>, "errors": [<string>, ...], "output": <string>}
+
+where "output" is present for the "emit" command only.
+"""
+
+import os
+import sys
+import json
+import socket
+
+if sys.version < '3':
+    from StringIO import StringIO
+else:
+    from io import StringIO
+
+from . import plugin
+from . import error
+from . import FileRepository
+
+class Server(object):
+    """Validation server
+
+    `make_context` is a function which returns a new Context.
+    `load_file` is a function (`ctx`, `filename`) which adds the module in
+    `filename` to the context, and returns the module or None.
+    `get_errors` is a function (`ctx`, `errors`, `filenames`,
+    `modulenames`) which returns a list of (`ref`, `line`, `msg`) with the
+    errors to report, and a boolean which is True if any of them is an
+    error.
+    `emit_obj` is the plugin for the output format, or None.
+    """
+
+    def __init__(self, make_context, load_file, get_errors, emit_obj=None,
+                 format=None):
+        self.make_context = make_context
+        self.load_file = load_file
+        self.get_errors = get_errors
+        self.emit_obj = emit_obj
+        self.format = format
+        self.ctx = None
+        self.files = None
+        """dict of absolute filename:(mtime, size) for all known files"""
+
+    def reset(self):
+        """Create a new, empty, context"""
+        self.ctx = self.make_context()
+        if self.emit_obj is not None:
+            self.emit_obj.setup_fmt(self.ctx)
+        for p in plugin.plugins:
+            p.pre_load_modules(self.ctx)
+        self.files = {}
+        for (_name, _rev, handle) in self._list_repository():
+            self._remember(handle[1])
+
+    def _list_repository(self):
+        repository = self.ctx.repository
+        if not isinstance(repository, FileRepository):
+            return []
+        # scan the directories again, with a new repository
+        r = FileRepository(use_env=False,
+                           no_path_recurse=repository.no_path_recurse)
+        r.dirs = repository.dirs
+        return r.get_modules_and_revisions(self.ctx)
+
+    def _stat(self, filename):
+        try:
+            st = os.stat(filename)
+            return (st.st_mtime, st.st_size)
+        except OSError:
+            return None
+
+    def _remember(self, filename):
+        filename = os.path.abspath(filename)
+        if filename not in self.files:
+            self.files[filename] = self._stat(filename)
+
+    def refresh(self):
+        """Remove all modules that have changed from the context
+
+        Returns the number of removed modules.
+        """
+        if self.ctx is None:
+            self.reset()
+            return 0
+        listing = {}
+        for (_name, _rev, handle) in self._list_repository():
+            listing[os.path.abspath(handle[1])] = True
+        for filename in listing:
+            if filename not in self.files:
+                # a new file in the repository; it might be a new
+                # revision of any module
+                n = len(self.ctx.modules)
+                self.reset()
+                return n
+        changed = {}
+        for filename in self.files:
+            if self._stat(filename) != self.files[filename]:
+                changed[filename] = True
+        if len(changed) == 0:
+            return 0
+        for filename in changed:
+            if filename not in listing and self._stat(filename) is None:
+                # a file was removed from the repository
+                n = len(self.ctx.modules)
+                self.reset()
+                return n
+            self.files[filename] = self._stat(filename)
+        evicted = self._evict([m for m in self.ctx.modules.values()
+                               if (m is not None and
+                                   os.path.abspath(m.pos.ref) in changed)])
+        return len(evicted)
+
+    def _evict(self, changed):
+        """Remove `changed` and all modules that depend on them"""
+        ctx = self.ctx
+        names = {}
+        evicted = {}
+        for m in changed:
+            names[m.arg] = True
+        done = False
+        while not done:
+            done = True
+            for m in list(ctx.modules.values()):
+                if m is None or m in evicted:
+                    continue
+                if m.arg in names or depends_on(m, names):
+                    evicted[m] = True
+                    names[m.arg] = True
+                    done = False
+                    # augments and deviations modify the target module,
+                    # so the target must be validated again as well
+                    for s in m.search('augment') + m.search('deviation'):
+                        t = getattr(s, 'i_target_node', None)
+                        if t is not None and hasattr(t, 'i_module'):
+                            names[t.i_module.i_modulename] = True
+        for (k, m) in list(ctx.modules.items()):
+            if m in evicted:
+                del ctx.modules[k]
+        ctx.errors = error.ErrorList([e for e in ctx.errors
+                                      if e[0].top not in evicted])
+        # forget the revisions found so far; a changed file may have a
+        # new revision
+        ctx.revs = {}
+        for mod, rev, handle in ctx.repository.get_modules_and_revisions(ctx):
+            if mod not in ctx.revs:
+                ctx.revs[mod] = []
+            ctx.revs[mod].append((rev, handle))
+        for (mod, rev) in ctx.modules:
+            if mod not in ctx.revs:
+                ctx.revs[mod] = [(rev, None)]
+        return evicted
+
+    def handle(self, req):
+        """Handle a request, and return the reply"""
+        command = req.get('command')
+        if command == 'shutdown':
+            return {'exit-code': 0, 'errors': []}
+        if command not in ('validate', 'emit'):
+            return {'exit-code': 1,
+                    'errors': ["unknown command '%s'\n" % command]}
+        if command == 'emit':
+            if self.emit_obj is None or req.get('format') != self.format:
+                return {'exit-code': 1,
+                        'errors': ["the server does not emit format '%s'\n" %
+                                   req.get('format')]}
+        filenames = req.get('files', [])
+        # capture messages written by load_file() etc
+        stderr = sys.stderr
+        sys.stderr = StringIO()
+        try:
+            try:
+                return self._handle(command, filenames)
+            except SystemExit as e:
+                return {'exit-code': e.code,
+                        'errors': [sys.stderr.getvalue()]}
+        finally:
+            sys.stderr = stderr
+
+    def _handle(self, command, filenames):
+        self.refresh()
+        ctx = self.ctx
+        loaded = {}
+        for m in ctx.modules.values():
+            if m is not None:
+                loaded[os.path.abspath(m.pos.ref)] = m
+        exit_code = 0
+        modules = []
+        for filename in filenames:
+            module = loaded.get(os.path.abspath(filename))
+            if module is None:
+                module = self.load_file(ctx, filename)
+                self._remember(filename)
+            if module is None:
+                exit_code = 1
+            else:
+                modules.append(module)
+        modulenames = []
+        for m in modules:
+            modulenames.append(m.arg)
+            for s in m.search('include'):
+                modulenames.append(s.arg)
+        for m in ctx.modules.values():
+            if m is not None:
+                self._remember(m.pos.ref)
+
+        for p in plugin.plugins:
+            p.pre_validate_ctx(ctx, modules)
+        if command == 'emit' and len(modules) > 0:
+            self.emit_obj.pre_validate(ctx, modules)
+        ctx.validate()
+        if command == 'emit' and len(modules) > 0:
+            self.emit_obj.post_validate(ctx, modules)
+        for p in plugin.plugins:
+            p.post_validate_ctx(ctx, modules)
+
+        # report the errors in the given modules and their dependencies
+        closure = {}
+        for m in modules:
+            add_dependencies(ctx, m, closure)
+        refs = [os.path.abspath(f) for f in filenames]
+        errors = [e for e in ctx.errors
+                  if (e[0].top in closure or
+                      os.path.abspath(e[0].ref) in refs)]
+        errors.sort(key=lambda e: (e[0].ref, e[0].line))
+        if len(filenames) > 0:
+            errors.sort(key=lambda e: e[0].ref != filenames[0])
+        (errors, found_error) = \
+            self.get_errors(ctx, errors, filenames, modulenames)
+        if found_error:
+            exit_code = 1
+        reply = {'exit-code': exit_code,
+                 'errors': [msg for (_ref, _line, msg) in errors]}
+        if command == 'emit' and len(modules) > 0:
+            fd = StringIO()
+            try:
+                self.emit_obj.emit(ctx, modules, fd)
+                reply['output'] = fd.getvalue()
+            except error.EmitError as e:
+                if e.msg != "":
+                    reply['errors'].append(e.msg + '\n')
+                reply['exit-code'] = e.exit_code
+            # some output formats modify the modules
+            self._evict(modules)
+        return reply
+
+    def serve(self, sockname):
+        """Serve requests on the Unix socket `sockname` until shutdown"""
+        if os.path.exists(sockname):
+            os.remove(sockname)
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.bind(sockname)
+        sock.listen(5)
+        self.refresh()
+        try:
+            while True:
+                (conn, _addr) = sock.accept()
+                try:
+                    req = self._serve_one(conn)
+                finally:
+                    conn.close()
+                if req.get('command') == 'shutdown':
+                    break
+        finally:
+            sock.close()
+            os.remove(sockname)
+
+    def _serve_one(self, conn):
+        """Read one request from `conn`, and send the reply
+
+        Returns the request, or an empty dict if it could not be read.
+        A failing request does not stop the server.
+        """
+        req = {}
+        try:
+            try:
+                req = json.loads(read_line(conn))
+                if not isinstance(req, dict):
+                    raise ValueError
+            except ValueError:
+                req = {}
+                data = json.dumps({'exit-code': 1,
+                                   'errors': ["bad request\n"]})
+            else:
+                try:
+                    data = json.dumps(self.handle(req))
+                except Exception as e:
+                    # the context may be half validated; start over
+                    self.ctx = None
+                    data = json.dumps({'exit-code': 1,
+                                       'errors': ["internal error: %s\n" % e]})
+            write_line(conn, data)
+        except (IOError, OSError):
+            # the client has gone away
+            pass
+        return req
+
+def request(sockname, req):
+    """Send the request `req` to the server at `sockname`
+
+    Returns the reply.
+    """
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.connect(sockname)
+    try:
+        write_line(sock, json.dumps(req))
+        return json.loads(read_line(sock))
+    finally:
+        sock.close()
+
+def read_line(sock):
+    data = []
+    while True:
+        d = sock.recv(65536)
+        if not d:
+            break
+        data.append(d)
+        if d.endswith(b'\n'):
+            break
+    return b''.join(data).decode('utf-8')
+
+def write_line(sock, s):
+    sock.sendall((s + '\n').encode('utf-8'))
+
+def depends_on(module, names):
+    """Return True if `module` imports or includes any module in `names`"""
+    for s in module.search('import') + module.search('include'):
+        if s.arg in names:
+            return True
+    b = module.search_one('belongs-to')
+    return b is not None and b.arg in names
+
+def add_dependencies(ctx, module, res):
+    """Add `module` and all modules it imports or includes to `res`"""
+    if module in res:
+        return
+    res[module] = True
+    for s in module.search('import') + module.search('include'):
+        r = s.search_one('revision-date')
+        if r is not None:
+            m = ctx.get_module(s.arg, r.arg)
+        else:
+            m = ctx.get_module(s.arg)
+        if m is not None:
+            add_dependencies(ctx, m, res)
@@ -4,6 +4,7 @@ import re
 from . import util
 from .util import attrsearch, keysearch, prefix_to_module, \
     prefix_to_modulename_and_revision
+from . import error
 from .error import err_add
 from . import types
 from . import syntax
@@ -43,12 +44,14 @@ def add_validation_fun(phase, keywords, f):
             _validation_map[(phase, keyword)] = newf
         else:
             _validation_map[(phase, keyword)] = f
+    _validation_dispatch.clear()
 
 def add_validation_var(var_name, var_fun):
     """Add a validation variable to the framework.
 
     Can be used by plugins to do special validation of extensions."""
     _validation_variables.append((var_name, var_fun))
+    _validation_dispatch.clear()
 
 def set_phase_i_children(phase):
     """Marks that the phase is run over the expanded i_children.
@@ -66,6 +69,8 @@ def add_data_keyword(keyword):
 
 def add_keyword_with_children(keyword):
     _keyword_with_children[keyword] = True
+    # '$has_children' may now match other keywords
+    _validation_dispatch.clear()
 
 def is_keyword_with_children(keyword):
     return keyword in _keyword_with_children
@@ -247,6 +252,7 @@ _validation_map = {
     ('reference_1', 'choice'):lambda ctx, s: v_reference_choice(ctx, s),
     ('reference_2', 'leaf'):lambda ctx, s:v_reference_leaf_leafref(ctx, s),
     ('reference_2', 'leaf-list'):lambda ctx, s:v_reference_leaf_leafref(ctx, s),
+    ('reference_2', '$data_node'):lambda ctx, s:v_reference_xpath_paths(ctx, s),
     ('reference_3', 'typedef'):lambda ctx, s:v_reference_leaf_leafref(ctx, s),
     ('reference_3', 'must'):lambda ctx, s:v_reference_must(ctx, s),
     ('reference_3', 'when'):lambda ctx, s:v_reference_when(ctx, s),
@@ -265,6 +271,13 @@ _validation_map = {
 
     }
 
+_validation_dispatch = {}
+"""dict of phase:{keyword:[<validation function>]}
+
+Compiled from _validation_map and _validation_variables by
+_get_validation_funs().  Cleared when a validation function or variable
+is added."""
+
 _v_i_children = {
     'unique_name':True,
     'expand_2':True,
@@ -298,6 +311,7 @@ _keyword_with_children = {
 _validation_variables = [
     ('$has_children', lambda keyword: keyword in _keyword_with_children),
     ('$extension', lambda keyword: util.is_prefixed(keyword)),
+    ('$data_node', lambda keyword: keyword in _xpath_context_keywords),
     ]
 
 _data_keywords = ['leaf', 'leaf-list', 'container', 'list', 'choice', 'case',
@@ -305,8 +319,24 @@ _data_keywords = ['leaf', 'leaf-list', 'container', 'list', 'choice', 'case',
 
 _keywords_with_no_explicit_config = ['action', 'rpc', 'notification']
 
+_xpath_context_keywords = ['leaf', 'leaf-list', 'container', 'list', 'choice',
+                           'case', 'anyxml', 'anydata', 'input', 'output',
+                           'notification']
+"""Keywords of statements which can have must or when, and which are
+the context node of the XPath expression."""
+
 _copy_uses_keywords = []
 
+_nocopy_uses_keywords = ['uses', 'unique', 'typedef', 'grouping',
+                         'description', 'reference', 'units', 'presence',
+                         'ordered-by']
+"""Keywords of statements which are shared between a grouping and the
+nodes expanded from it, instead of being copied for each uses.
+
+Statements which are validated per expanded node, and which can give
+an error with the position of the uses, such as type, if-feature and
+status, are copied."""
+
 _copy_augment_keywords = []
 
 _refinements = [
@@ -361,35 +391,36 @@ _valid_deviations = {
 
 ### Validation
 
-def validate_module(ctx, module):
-    """Validate `module`, which is a Statement representing a (sub)module"""
+def validate_module(ctx, module, lazy=False):
+    """Validate `module`, which is a Statement representing a (sub)module
+
+    If `lazy` is True, only the phases up to and including the import
+    phase are run.  The typedefs, identities and features in the module
+    are then validated when they are referenced, and the remaining
+    phases are run by complete_module() when a grouping or a node in
+    the module is referenced.
 
-    def iterate(stmt, phase):
+    When the context's error budget is exhausted, see
+    Context.too_many_errors(), validation is aborted by raising
+    error.Abort.  It is propagated through the validation of the
+    modules which import or include this module, and is caught when
+    the outermost module is validated.
+    """
+
+    def iterate(stmt, phase, dispatch, i_children):
         # if the grammar is not yet checked or if it is checked and
         # valid, then we continue.
         if (hasattr(stmt, 'is_grammatically_valid') and
             stmt.is_grammatically_valid == False):
             return
-        # first check an exact match
-        key = (phase, stmt.keyword)
+        if budget and ctx.too_many_errors():
+            raise error.Abort
         res = 'recurse'
-        if key in _validation_map:
-            f = _validation_map[key]
-            res = f(ctx, stmt)
-            if res == 'stop':
-                raise Abort
-        # then also run match by special variable
-        for (var_name, var_f) in _validation_variables:
-            key = (phase, var_name)
-            if key in _validation_map and var_f(stmt.keyword) == True:
-                f = _validation_map[key]
-                res = f(ctx, stmt)
-                if res == 'stop':
-                    raise Abort
-        # then run wildcard
-        wildcard = (phase, '*')
-        if wildcard in _validation_map:
-            f = _validation_map[wildcard]
+        try:
+            funs = dispatch[stmt.keyword]
+        except KeyError:
+            funs = _get_validation_funs(phase, stmt.keyword)
+        for f in funs:
             res = f(ctx, stmt)
             if res == 'stop':
                 raise Abort
@@ -397,7 +428,7 @@ def validate_module(ctx, module):
             pass
         else:
             # default is to recurse
-            if phase in _v_i_children:
+            if i_children:
                 if stmt.keyword == 'grouping':
                     return
                 if stmt.i_module is not None and stmt.i_module != module:
@@ -406,22 +437,86 @@ def validate_module(ctx, module):
                     return
                 if hasattr(stmt, 'i_children'):
                     for s in stmt.i_children:
-                        iterate(s, phase)
+                        iterate(s, phase, dispatch, i_children)
                 for s in stmt.substmts:
                     if (hasattr(s, 'i_has_i_children') or
                         (phase, s.keyword) in _v_i_children_keywords):
-                        iterate(s, phase)
+                        iterate(s, phase, dispatch, i_children)
             else:
                 for s in stmt.substmts:
-                    iterate(s, phase)
-
+                    iterate(s, phase, dispatch, i_children)
+
+    idx = _validation_phases.index('import') + 1
+    if getattr(module, 'i_is_validated', None) == 'lazy':
+        phases = _validation_phases[idx:]
+        lazy = False
+    elif lazy:
+        phases = _validation_phases[:idx]
+    else:
+        phases = _validation_phases
     module.i_is_validated = 'in_progress'
+    timer = getattr(ctx, 'phase_timer', None)
+    budget = getattr(ctx, 'error_budget', None) is not None
+    ctx.validation_depth += 1
     try:
-        for phase in _validation_phases:
-            iterate(module, phase)
-    except Abort:
-        pass
-    module.i_is_validated = True
+        try:
+            for phase in phases:
+                if phase not in _validation_dispatch:
+                    _validation_dispatch[phase] = {}
+                if timer is not None:
+                    timer.start(phase)
+                try:
+                    iterate(module, phase, _validation_dispatch[phase],
+                            phase in _v_i_children)
+                finally:
+                    if timer is not None:
+                        timer.stop()
+            if lazy:
+                # an identityref value can be any identity in the
+                # module, and is checked through the bases of that
+                # identity, so all identities are resolved
+                for i in module.i_identities.values():
+                    v_type_identity(ctx, i)
+        except Abort:
+            pass
+        except error.Abort:
+            # the error budget is exhausted
+            if ctx.validation_depth > 1:
+                raise
+    finally:
+        ctx.validation_depth -= 1
+    if lazy:
+        module.i_is_validated = 'lazy'
+    else:
+        module.i_is_validated = True
+
+def _get_validation_funs(phase, keyword):
+    """Return the list of functions to call for `keyword` in `phase`
+
+    The functions are, in order, the one registered for the keyword
+    itself, the ones registered for each matching validation variable,
+    and the one registered for the wildcard '*'.
+    """
+    funs = []
+    key = (phase, keyword)
+    if key in _validation_map:
+        funs.append(_validation_map[key])
+    for (var_name, var_f) in _validation_variables:
+        key = (phase, var_name)
+        if key in _validation_map and var_f(keyword) == True:
+            funs.append(_validation_map[key])
+    wildcard = (phase, '*')
+    if wildcard in _validation_map:
+        funs.append(_validation_map[wildcard])
+    if phase not in _validation_dispatch:
+        _validation_dispatch[phase] = {}
+    _validation_dispatch[phase][keyword] = funs
+    return funs
+
+def complete_module(ctx, module):
+    """Run the remaining validation phases for a lazily validated module"""
+    if getattr(module, 'i_is_validated', None) == 'lazy':
+        validate_module(ctx, module)
 
 def v_init_module(ctx, stmt):
     ## remember that the grammar is not validated
@@ -514,7 +609,7 @@ def v_init_stmt(ctx, stmt):
     stmt.i_uniques = []
 
 def v_init_has_children(ctx, stmt):
-    stmt.i_children = []
+    stmt.i_children = ChildList()
 
 def v_init_import(ctx, stmt):
     stmt.i_is_safe_import = False
@@ -586,8 +681,11 @@ def v_import_module(ctx, stmt):
         elif m is not None and m.i_is_validated == 'in_progress':
             err_add(ctx.errors, i.pos,
                     'CIRCULAR_DEPENDENCY', ('module', modulename))
-        # try to add the module to the context
-        m = ctx.search_module(i.pos, modulename, rev)
+        # try to add the module to the context.  included submodules
+        # are always validated, since their definitions are added to
+        # the including module.
+        lazy = ctx.lazy_validation and i.keyword == 'import'
+        m = ctx.search_module(i.pos, modulename, rev, lazy=lazy)
         if (m is not None and r is not None and
             stmt.i_version == '1' and m.i_version == '1.1'):
             err_add(ctx.errors, i.pos,
@@ -697,7 +795,9 @@ def v_type_typedef(ctx, stmt):
                     (name, ptype.pos))
     type_ = stmt.search_one('type')
     if type_ is None or type_.is_grammatically_valid == False:
-        # error is already reported by grammar check
+        # error is already reported by grammar check; the typedef is
+        # not in progress anymore, so a later reference is not circular
+        stmt.i_is_validated = True
         return
     # ensure our type is validated
     v_type_type(ctx, type_)
@@ -792,6 +892,11 @@ def v_type_type(ctx, stmt):
             err_add(ctx.errors, stmt.pos, 'TYPE_NOT_FOUND', (name, pmodule.arg))
             return
         else:
+            # ensure the typedef is validated, in case the module
+            # is validated lazily
+            if (ctx.lazy_validation and
+                stmt.i_typedef.is_grammatically_valid == True):
+                v_type_typedef(ctx, stmt.i_typedef)
             stmt.i_typedef.i_is_unused = False
 
     if stmt.i_typedef is not None:
@@ -1137,6 +1242,7 @@ def v_type_uses(ctx, stmt, no_error_report=False):
         pmodule = prefix_to_module(stmt.i_module, prefix, stmt.pos, ctx.errors)
         if pmodule is None:
             return
+        complete_module(ctx, pmodule)
         stmt.i_grouping = search_grouping(pmodule, name)
     if stmt.i_grouping is None and no_error_report == False:
         err_add(ctx.errors, stmt.pos,
@@ -1379,7 +1485,7 @@ def v_expand_1_children(ctx, stmt):
             # create the implicitly defined input node
             input_ = Statement(stmt.top, stmt, stmt.pos, 'input', 'input')
             v_init_stmt(ctx, input_)
-            input_.i_children = []
+            input_.i_children = ChildList()
             input_.i_module = stmt.i_module
             stmt.i_children.append(input_)
         else:
@@ -1396,7 +1502,7 @@ def v_expand_1_children(ctx, stmt):
             # create the implicitly defined output node
             output = Statement(stmt.top, stmt, stmt.pos, 'output', 'output')
             v_init_stmt(ctx, output)
-            output.i_children = []
+            output.i_children = ChildList()
             output.i_module = stmt.i_module
             stmt.i_children.append(output)
         else:
@@ -1525,13 +1631,13 @@ def v_expand_1_uses(ctx, stmt):
 
     # first, copy the grouping into our i_children
     for g in stmt.i_grouping.i_children:
-        # don't copy the type since it cannot be modified anyway.
-        # not copying the type also works better for some plugins that
-        # generate output from the i_children list, e.g. the XSD plugin.
+        # the statements in _nocopy_uses_keywords are shared with the
+        # grouping; a refine or deviation replaces them in the substmts
+        # list of the copy, but never modifies them.
         def post_copy(old, new):
             # inline the definition into our module
             new.i_module = stmt.i_module
-            new.i_children = []
+            new.i_children = ChildList()
             new.i_uniques = []
             new.pos.uses_pos = stmt.pos
             # build the i_children list of pointers
@@ -1545,12 +1651,11 @@ def v_expand_1_uses(ctx, stmt):
                     else:
                         # otherwise, copy the i_child
                         newx = x.copy(new, stmt,
-                                      nocopy=['type','uses', 'unique',
-                                              'typedef','grouping'],
+                                      nocopy=_nocopy_uses_keywords,
                                       copyf=post_copy)
                         new.i_children.append(newx)
         newg = g.copy(stmt.parent, stmt,
-                      nocopy=['type','uses','unique','typedef','grouping'],
+                      nocopy=_nocopy_uses_keywords,
                       copyf=post_copy)
         stmt.parent.i_children.append(newg)
 
@@ -1761,7 +1866,7 @@ def create_new_case(ctx, choice, child, expand=True):
     new_case = Statement(child.top, choice, child.pos, 'case', child.arg)
     v_init_stmt(ctx, new_case)
     child.parent = new_case
-    new_case.i_children = [child]
+    new_case.i_children = ChildList([child])
     new_case.i_module = child.i_module
     choice.i_children.append(new_case)
     if expand:
@@ -1861,7 +1966,7 @@ def v_reference_list(ctx, stmt):
                     if prefix != stmt.i_module.i_prefix:
                         err_add(ctx.errors, key.pos, 'BAD_KEY', x)
                         return
-                ptr = attrsearch(name, 'arg', stmt.i_children)
+                ptr = search_child_arg(stmt.i_children, name)
                 if x in found:
                     err_add(ctx.errors, key.pos, 'DUPLICATE_KEY', x)
                     return
@@ -1923,7 +2028,7 @@ def v_reference_list(ctx, stmt):
                         if prefix != stmt.i_module.i_prefix:
                             err_add(ctx.errors, u.pos, 'BAD_UNIQUE_PART', x)
                             return
-                    ptr = attrsearch(name, 'arg', ptr.i_children)
+                    ptr = search_child_arg(ptr.i_children, name)
                     if ptr is None:
                         err_add(ctx.errors, u.pos, 'BAD_UNIQUE_PART', x)
                         return
@@ -1968,7 +2073,7 @@ def v_reference_choice(ctx, stmt):
         m = stmt.search_one('mandatory')
         if m is not None and m.arg == 'true':
             err_add(ctx.errors, stmt.pos, 'DEFAULT_AND_MANDATORY', ())
-        ptr = attrsearch(d.arg, 'arg', stmt.i_children)
+        ptr = search_child_arg(stmt.i_children, d.arg)
         if ptr is None:
             err_add(ctx.errors, d.pos, 'DEFAULT_CASE_NOT_FOUND', d.arg)
         else:
@@ -2018,8 +2123,6 @@ def v_reference_leaf_leafref(ctx, stmt):
 def v_reference_must(ctx, stmt):
     # verify that the xpath expression is correct, and that
     # each prefix is defined
-    # NOTE: currently only primitive tokenization is done; we should
-    # also parse the expression to detect more errors
     v_xpath(ctx, stmt)
 
 def v_xpath(ctx, stmt):
@@ -2061,12 +2164,211 @@ def v_xpath(ctx, stmt):
                          s in yang_1_1_xpath_functions) or
                         s in extra_xpath_functions):
                     err_add(ctx.errors, stmt.pos, 'XPATH_FUNCTION', s)
-
+        # the parse result is cached, so this is cheap for expressions
+        # in groupings which are used many times
+        xpath.parse(stmt.arg)
     except SyntaxError as e:
         err_add(ctx.errors, stmt.pos, 'XPATH_SYNTAX_ERROR', e)
 
 def v_reference_when(ctx, stmt):
     v_xpath(ctx, stmt)
+    # the when statements in data nodes are checked in the expanded tree
+    # by v_reference_xpath_paths()
+    if stmt.parent.keyword == 'augment':
+        target = getattr(stmt.parent, 'i_target_node', None)
+        if target is not None and not is_in_grouping(stmt):
+            chk_xpath_paths(ctx, stmt, xpath_context_node(target))
+    elif stmt.parent.keyword == 'uses':
+        if not is_in_grouping(stmt):
+            node = xpath_context_node(stmt.parent.parent)
+            if node is not None and node.keyword == 'augment':
+                # the context node is the target of the augment
+                node = getattr(node, 'i_target_node', None)
+                if node is None:
+                    return
+                node = xpath_context_node(node)
+            chk_xpath_paths(ctx, stmt, node)
+
+def v_reference_xpath_paths(ctx, stmt):
+    """Check the location paths in the must and when statements of a node"""
+    for s in stmt.search('must'):
+        chk_xpath_paths(ctx, s, stmt)
+    s = stmt.search_one('when')
+    if s is not None:
+        chk_xpath_paths(ctx, s, xpath_context_node(stmt))
+
+def is_in_grouping(stmt):
+    while stmt is not None:
+        if stmt.keyword == 'grouping':
+            return True
+        stmt = stmt.parent
+    return False
+
+def xpath_context_node(stmt):
+    """Return the closest node to `stmt` which is a data node"""
+    while stmt is not None and stmt.keyword in ('choice', 'case'):
+        stmt = stmt.parent
+    return stmt
+
+_xpath_root = 'root'
+"""The root node in a set of schema nodes in chk_xpath_paths()"""
+
+def chk_xpath_paths(ctx, stmt, node):
+    """Check that the location paths in the XPath expression `stmt` exist
+
+    `node` is the context node of the expression.  The paths are
+    resolved against the expanded schema tree, and a warning is given
+    for each step which does not match any node.  Expressions are only
+    checked as far as the schema nodes can be known for sure; e.g.
+    paths after deref() or with axes other than child, parent and self
+    are not checked.
+    """
+    if ctx.lax_xpath_checks == True or node is None:
+        return
+    try:
+        expr = xpath.parse(stmt.arg)
+    except SyntaxError:
+        # reported by v_xpath()
+        return
+    mod = stmt.i_orig_module
+    if mod is None:
+        mod = stmt.i_module
+    if node.keyword in ('module', 'submodule'):
+        # unprefixed names are in the namespace of the current node; also
+        # allow the namespace of the module with the expression, to be
+        # safe
+        default = [(node.i_modulename, node)]
+        node = _xpath_root
+    else:
+        default = [(node.i_module.i_modulename, node.i_module)]
+    if mod.i_modulename != default[0][0]:
+        default.append((mod.i_modulename, mod))
+    _xpath_nodes(ctx, stmt, (mod, default), expr, [node], node)
+
+def _xpath_nodes(ctx, stmt, ns, expr, nodes, current):
+    """Return the list of schema nodes selected by `expr`, or None
+
+    None means that the nodes are not known, or that the expression is
+    not a node set.  `ns` is a tuple (`module`, `default`) where
+    `module` is the module in which prefixes are looked up, and
+    `default` is a list of (modulename, module) for unprefixed names.
+    """
+    op = expr[0]
+    if op == 'absolute':
+        return _xpath_steps(ctx, stmt, ns, expr[1], [_xpath_root], current)
+    elif op == 'relative':
+        return _xpath_steps(ctx, stmt, ns, expr[1], nodes, current)
+    elif op == 'filter':
+        res = _xpath_nodes(ctx, stmt, ns, expr[1], nodes, current)
+        for pred in expr[2]:
+            _xpath_nodes(ctx, stmt, ns, pred, res, current)
+        return res
+    elif op == 'path':
+        res = _xpath_nodes(ctx, stmt, ns, expr[1], nodes, current)
+        return _xpath_steps(ctx, stmt, ns, expr[2], res, current)
+    elif op == 'function':
+        for arg in expr[2]:
+            _xpath_nodes(ctx, stmt, ns, arg, nodes, current)
+        if expr[1] == 'current':
+            return [current]
+        return None
+    elif op == 'negative':
+        _xpath_nodes(ctx, stmt, ns, expr[1], nodes, current)
+        return None
+    elif op in ('variable', 'literal', 'number'):
+        return None
+    else:
+        # a binary operator
+        left = _xpath_nodes(ctx, stmt, ns, expr[1], nodes, current)
+        right = _xpath_nodes(ctx, stmt, ns, expr[2], nodes, current)
+        if op == '|' and left is not None and right is not None:
+            return left + right
+        return None
+
+def _xpath_steps(ctx, stmt, ns, steps, nodes, current):
+    for (axis, node_test, preds) in steps:
+        if nodes is not None:
+            nodes = _xpath_step(ctx, stmt, ns, axis, node_test, nodes)
+        # the predicates are checked also if the nodes are not known,
+        # since they may contain absolute paths
+        for pred in preds:
+            _xpath_nodes(ctx, stmt, ns, pred, nodes, current)
+    return nodes
+
+def _xpath_step(ctx, stmt, ns, axis, node_test, nodes):
+    if node_test[0] == 'name':
+        (_, prefix, name) = node_test
+        if prefix is None:
+            names = ns[1]
+        else:
+            module = prefix_to_module(ns[0], prefix, stmt.pos, [])
+            if module is None:
+                # reported by v_xpath()
+                return None
+            complete_module(ctx, module)
+            names = [(module.i_modulename, module)]
+    elif node_test != ('node-type', 'node', None):
+        return None
+    if axis == 'child' and node_test[0] == 'name':
+        res = []
+        for n in nodes:
+            ch = _xpath_children(n, names, name)
+            if ch is None:
+                return None
+            res.extend(ch)
+        if len(res) == 0 and len(nodes) > 0:
+            n = nodes[0]
+            if n == _xpath_root:
+                err_add(ctx.errors, stmt.pos, 'XPATH_NODE_NOT_FOUND2',
+                        (names[0][0], name, names[0][0]))
+            else:
+                err_add(ctx.errors, stmt.pos, 'XPATH_NODE_NOT_FOUND1',
+                        (names[0][0], name, n.i_module.i_modulename, n.arg))
+            return None
+        return res
+    elif axis == 'parent':
+        res = []
+        for n in nodes:
+            if n == _xpath_root:
+                continue
+            p = xpath_context_node(n.parent)
+            if p is None:
+                return None
+            elif p.keyword in ('module', 'submodule'):
+                res.append(_xpath_root)
+            elif p.keyword in _xpath_context_keywords:
+                res.append(p)
+            else:
+                # e.g. an rpc or action
+                return None
+    elif axis == 'self':
+        res = nodes
+    else:
+        return None
+    if node_test[0] == 'name':
+        res = [n for n in res
+               if (n != _xpath_root and n.arg == name and
+                   n.i_module.i_modulename in [m for (m, _) in names])]
+    return res
+
+def _xpath_children(node, names, name):
+    """Return the children of `node` called `name`, or None if unknown"""
+    res = []
+    for (modulename, module) in names:
+        if node == _xpath_root:
+            children = getattr(module, 'i_children', None)
+            if children is None:
+                return None
+        elif node.keyword in ('anyxml', 'anydata', 'rpc', 'action'):
+            return None
+        elif not hasattr(node, 'i_children'):
+            continue
+        else:
+            children = node.i_children
+        r = search_data_node(children, modulename, name)
+        if r is not None:
+            res.append(r)
+    return res
 
 def v_reference_deviation(ctx, stmt):
     stmt.i_target_node = find_target_node(ctx, stmt)
@@ -2325,7 +2627,96 @@ def is_mandatory_node(stmt):
                     return True
     return False
 
+class ChildList(list):
+    """A list of child statements, used for `i_children`
+
+    The list has an index from the argument of a child to the child, so
+    that a child can be found without scanning the list.  The index is
+    built when needed, and updated when a child is appended.  It is
+    dropped when the list is modified in any other way.
+    """
+
+    __slots__ = ('_index',)
+
+    _skip_keywords = ('choice', 'case', 'input', 'output')
+
+    def __init__(self, children=()):
+        list.__init__(self, children)
+        self._index = None
+
+    def __reduce__(self):
+        return (ChildList, (list(self),))
+
+    def get_index(self):
+        """Return the index of the children
+
+        The index is a tuple (`named`, `skip`), where `named` is a dict
+        of argument:[(position, child)], and `skip` is a list of
+        (position, child) for the choice, case, input and output
+        children.
+        """
+        if self._index is None:
+            self._index = ({}, [])
+            for (i, child) in enumerate(self):
+                self._add(i, child)
+        return self._index
+
+    def _add(self, i, child):
+        (named, skip) = self._index
+        if child.arg in named:
+            named[child.arg].append((i, child))
+        else:
+            named[child.arg] = [(i, child)]
+        if child.keyword in ChildList._skip_keywords:
+            skip.append((i, child))
+
+    def append(self, child):
+        list.append(self, child)
+        # children are mostly appended, so keep the index in this case
+        if self._index is not None:
+            self._add(len(self) - 1, child)
+
+    def search_arg(self, arg):
+        """Return the first child with the argument `arg`, or None"""
+        l = self.get_index()[0].get(arg)
+        if l is None:
+            return None
+        return l[0][1]
+
+    def _modified(f):
+        def g(self, *args):
+            self._index = None
+            return f(self, *args)
+        g.__name__ = f.__name__
+        return g
+
+    extend = _modified(list.extend)
+    insert = _modified(list.insert)
+    remove = _modified(list.remove)
+    pop = _modified(list.pop)
+    sort = _modified(list.sort)
+    reverse = _modified(list.reverse)
+    __setitem__ = _modified(list.__setitem__)
+    __delitem__ = _modified(list.__delitem__)
+    __iadd__ = _modified(list.__iadd__)
+    __imul__ = _modified(list.__imul__)
+    if hasattr(list, 'clear'):
+        clear = _modified(list.clear)
+    if hasattr(list, '__setslice__'):
+        __setslice__ = _modified(list.__setslice__)
+        __delslice__ = _modified(list.__delslice__)
+    del _modified
+
+def search_child_arg(children, arg):
+    """Return the first statement in `children` with the argument `arg`"""
+    if isinstance(children, ChildList):
+        return children.search_arg(arg)
+    return attrsearch(arg, 'arg', children)
+
 def search_child(children, modulename, identifier):
+    if isinstance(children, ChildList):
+        children = [c for (_i, c) in
+                    children.get_index()[0].get(identifier, [])]
     for child in children:
         if child.arg == identifier:
             if ((child.i_module.i_modulename == modulename) or
@@ -2338,6 +2729,26 @@ def search_data_node(children, modulename, identifier, last_skipped = None):
     skip = ['choice', 'case']
     if last_skipped is not None:
         skip.append(last_skipped)
+    if isinstance(children, ChildList):
+        # find the first matching child, and then search the choices
+        # and cases before it
+        (named, skipped) = children.get_index()
+        pos = len(children)
+        found = None
+        for (i, child) in named.get(identifier, []):
+            if (child.keyword not in skip and
+                child.i_module.i_modulename == modulename):
+                (pos, found) = (i, child)
+                break
+        for (i, child) in skipped:
+            if i > pos:
+                break
+            if child.keyword in skip:
+                r = search_data_node(child.i_children,
+                                     modulename, identifier)
+                if r is not None:
+                    return r
+        return found
     for child in children:
         if child.keyword in skip:
             r = search_data_node(child.i_children,
@@ -2409,6 +2820,7 @@ def find_target_node(ctx, stmt, is_augment=False):
     if module is None:
         # error is reported by prefix_to_module
         return None
+    complete_module(ctx, module)
 
     if (stmt.parent.keyword in ('module', 'submodule') or
         is_absolute):
@@ -2438,6 +2850,7 @@ def find_target_node(ctx, stmt, is_augment=False):
                                       ctx.errors)
             if module is None:
                 return None
+            complete_module(ctx, module)
             child = search_child(node.i_children, module.i_modulename,
                                  identifier)
             if child is None and module == stmt.i_module and is_augment:
@@ -2446,7 +2859,7 @@ def find_target_node(ctx, stmt, is_augment=False):
                                   identifier)
                 v_init_stmt(ctx, child)
                 child.i_module = module
-                child.i_children = []
+                child.i_children = ChildList()
                 child.i_config = node.i_config
                 node.i_children.append(child)
                 # keep track of this temporary statement
@@ -2536,6 +2949,8 @@ def validate_leafref_path(ctx, stmt, path_spec, path,
         local_module = stmt
     else:
         local_module = stmt.i_module
+    # the path may be defined in a typedef in a lazily validated module
+    complete_module(ctx, local_module)
     if stmt.keyword == 'typedef':
         in_typedef = True
     else:
@@ -2548,6 +2963,7 @@ def validate_leafref_path(ctx, stmt, path_spec, path,
                                        ctx.errors)
             if pmodule is None:
                 raise NotFound
+            complete_module(ctx, pmodule)
             return (pmodule, name)
         elif in_typedef and stmt.i_module.i_version != '1':
             raise Abort
@@ -2769,6 +3185,19 @@ def validate_leafref_path(ctx, stmt, path_spec, path,
 ## Each statement in YANG is represented as an instance of Statement.
 
 class Statement(object):
+    __slots__ = (
+        'top', 'parent', 'pos', 'raw_keyword', 'keyword', 'ext_mod', 'arg',
+        'substmts', 'is_grammatically_valid',
+        # validation attributes which are set on most statements; they
+        # are unset until the validation code sets them, just as other
+        # attributes
+        'i_module', 'i_orig_module', 'i_typedefs', 'i_groupings',
+        'i_uniques', 'i_children', 'i_config',
+        'i_uses', 'i_uses_pos', 'i_uses_top',
+        # all other attributes, e.g. those set by plugins
+        '__dict__',
+        )
+
     def __init__(self, top, parent, pos, keyword, arg=None):
         self.top = top
         """pointer to the top-level Statement"""
@@ -2815,9 +3244,28 @@ class Statement(object):
                 return ch
         return None
 
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        for name in Statement.__slots__:
+            if name != '__dict__' and hasattr(self, name):
+                state[name] = getattr(self, name)
+        return state
+
+    def __setstate__(self, state):
+        for name in state:
+            setattr(self, name, state[name])
+
     def copy(self, parent=None, uses=None, uses_top=True,
              nocopy=[], ignore=[], copyf=None):
-        new = copy.copy(self)
+        new = self.__class__.__new__(self.__class__)
+        # copy the slots through their descriptors, which is faster than
+        # copy.copy()
+        for (get, set) in _statement_slot_accessors:
+            try:
+                set(new, get(self))
+            except AttributeError:
+                pass
+        new.__dict__.update(self.__dict__)
         new.pos = copy.copy(new.pos)
         if uses is not None:
             if hasattr(new, 'i_uses'):
@@ -2866,6 +3314,11 @@ class Statement(object):
                x.pprint(indent + ' ', f)
            print(indent + '--- END i_children ---')
 
+_statement_slot_accessors = [
+    (getattr(Statement, name).__get__, getattr(Statement, name).__set__)
+    for name in Statement.__slots__ if name != '__dict__']
+"""list of (get, set) functions for the slots of Statement"""
+
 def print_tree(stmt, substmts=True, i_children=True, indent=0):
     istr = "  "
     print("%s%s %s      %s %s" % (indent * istr, stmt.keyword,
@@ -36,7 +36,9 @@ class YANGPlugin(plugin.PyangPlugin):
         emit_yang(ctx, module, fd)
 
 def emit_yang(ctx, module, fd):
+    fd = util.ChunkWriter(fd)
     emit_stmt(ctx, module, fd, 0, None, '', '  ', False)
+    fd.flush()
 
 _force_newline_arg = ('description', 'contact', 'organization')
 _non_quote_arg_type = ('identifier', 'identifier-ref', 'boolean', 'integer',
@@ -66,13 +68,10 @@ _kwd_class = {
     'submodule': None,
 }
 def get_kwd_class(keyword):
-    if util.is_prefixed(keyword):
+    kwd_class = _kwd_class.get(keyword, 'body')
+    if kwd_class == 'body' and util.is_prefixed(keyword):
         return 'extension'
-    else:
-        try:
-            return _kwd_class[keyword]
-        except KeyError:
-            return 'body'
+    return kwd_class
 
 _keyword_with_trailing_newline = (
     'typedef',
@@ -110,23 +109,7 @@ def emit_stmt(ctx, stmt, fd, level, prev_kwd_class, indent, indentstep, within_u
         emit_comment(stmt.arg, fd, indent)
         return
     
-    # Are we in a top level grouping, then don't expand 'uses'
-    # Not doing the right thing.
-    s = stmt
-    in_grouping = False
-    while hasattr(s, 'parent'):
-        if hasattr(s, 'keyword') and s.keyword == 'grouping':
-            in_grouping = True
-        s = s.parent
-#    while (hasattr(s, 'parent') and hasattr(s.parent, 'keyword')
-#           and not (s.parent.keyword == 'module' or s.parent.keyword == 'submodule')):
-#        s = s.parent
-#    if s.keyword == 'grouping':
-#        in_grouping = True
-#    else:
-#        in_grouping = False
-
-    if ctx.opts.yang_expand_groupings and keyword == 'uses': # and (within_uses or not in_grouping):
+    if ctx.opts.yang_expand_groupings and keyword == 'uses':
         fd.write ("\n" + indent + "// Expanded 'uses")
         emit_arg(stmt, fd, indent, indentstep)
         fd.write("'\n")
@@ -166,6 +149,10 @@ def emit_stmt(ctx, stmt, fd, level, prev_kwd_class, indent, indentstep, within_u
             emit_stmt(ctx, s, fd, level + 1, kwd_class,
                       indent + indentstep, indentstep, within_uses)
             kwd_class = get_kwd_class(s.keyword)
+            if level <= 1:
+                # write out each top-level subtree; keeps the
+                # buffered output small
+                fd.flush()
         fd.write(indent + '}\n')
 
 def emit_arg(stmt, fd, indent, indentstep):
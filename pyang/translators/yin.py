@@ -38,6 +38,7 @@ class YINPlugin(plugin.PyangPlugin):
         emit_yin(ctx, module, fd)
         
 def emit_yin(ctx, module, fd):
+    fd = util.ChunkWriter(fd)
     fd.write('<?xml version="1.0" encoding="UTF-8"?>\n')
     fd.write('<%s name="%s"\n' % (module.keyword, module.arg))
     fd.write(' ' * len(module.keyword) + '  xmlns="%s"' % yin_namespace)
@@ -89,7 +90,9 @@ def emit_yin(ctx, module, fd):
         substmts = module.substmts
     for s in substmts:
         emit_stmt(ctx, module, s, fd, '  ', '  ')
+        fd.flush()
     fd.write('</%s>\n' % module.keyword)
+    fd.flush()
     
 def emit_stmt(ctx, module, stmt, fd, indent, indentstep):
     if util.is_prefixed(stmt.raw_keyword):
@@ -3,16 +3,10 @@
 from .error import err_add
 from . import util
 from . import syntax
+from . import xsd_regex
 import base64
-from xml.sax.saxutils import quoteattr
-from xml.sax.saxutils import escape
-
-try:
-    # python 2
-    from StringIO import StringIO
-except ImportError:
-    # python 3
-    from io import StringIO
+import bisect
+import re
 
 class Abort(Exception):
     pass
@@ -275,6 +269,160 @@ def is_derived_from_or_self(a, b, visited):
                 return True
     return False
 
+## flat checkers
+
+class Intervals(object):
+    """A sorted list of disjoint, closed intervals
+
+    Membership is tested with a binary search.
+    """
+
+    def __init__(self, los, his):
+        self.los = los
+        self.his = his
+
+    def __contains__(self, val):
+        try:
+            i = bisect.bisect_right(self.los, val) - 1
+            return i >= 0 and val <= self.his[i]
+        except TypeError:
+            # e.g. 'min' or 'max' given as a value
+            return False
+
+    def intersect(self, ranges, lo_bound, hi_bound):
+        """Return the intersection with `ranges`
+
+        `ranges` is a list of (lo, hi) as returned by validate_ranges()
+        or validate_length_expr(); 'min' and 'max' are replaced with
+        `lo_bound` and `hi_bound`.  Returns None if a bound is not known.
+        """
+        los = []
+        his = []
+        for (lo, hi) in ranges:
+            if hi is None:
+                hi = lo
+            lo = bound(lo, lo_bound, hi_bound)
+            hi = bound(hi, lo_bound, hi_bound)
+            if lo is None or hi is None:
+                return None
+            # both lists are sorted, so the result is sorted
+            for (a, b) in zip(self.los, self.his):
+                l = max(a, lo)
+                h = min(b, hi)
+                if l <= h:
+                    los.append(l)
+                    his.append(h)
+        return Intervals(los, his)
+
+def bound(val, lo_bound, hi_bound):
+    if val == 'min':
+        return lo_bound
+    elif val == 'max':
+        return hi_bound
+    return val
+
+max_length = 18446744073709551615
+
+class Checker(object):
+    """The range, length and pattern restrictions of a chain of TypeSpecs
+
+    A TypeSpec which restricts another TypeSpec validates a value by
+    first validating it with its base.  The checker holds the combined
+    restrictions of the whole chain, so that a valid value can be
+    accepted without walking the chain.  If check() returns False, the
+    chain is walked to report the error.
+
+    The checker is built when the TypeSpec is created; since a typedef's
+    TypeSpec is copied with copy.copy() for each use of the typedef, all
+    uses share the checker.
+    """
+
+    def __init__(self, ranges=None, lengths=None, patterns=()):
+        self.ranges = ranges
+        self.lengths = lengths
+        self.patterns = patterns
+        self.fused = None
+        """a regular expression which matches the strings which
+        match all patterns"""
+        if len(patterns) > 1:
+            self.fused = fuse_patterns(patterns)
+
+    def restrict_ranges(self, ranges):
+        if self.ranges is None:
+            return None
+        r = self.ranges.intersect(ranges, self.ranges.los[0],
+                                  self.ranges.his[-1])
+        if r is None or len(r.los) == 0:
+            return None
+        return Checker(r, self.lengths, self.patterns)
+
+    def restrict_lengths(self, lengths):
+        if self.lengths is None:
+            l = Intervals([0], [max_length])
+        else:
+            l = self.lengths
+        l = l.intersect(lengths, 0, max_length)
+        if l is None:
+            return None
+        return Checker(self.ranges, l, self.patterns)
+
+    def restrict_patterns(self, patterns):
+        return Checker(self.ranges, self.lengths,
+                       self.patterns + tuple(patterns))
+
+    def check(self, val):
+        if self.ranges is not None and val not in self.ranges:
+            return False
+        if self.lengths is not None and len(val) not in self.lengths:
+            return False
+        if self.fused is not None:
+            return self.fused.match(val) is not None
+        for pattern in self.patterns:
+            if not match_pattern(pattern, val):
+                return False
+        return True
+
+def base_checker(base):
+    """Return the Checker for values of `base`, or None if the
+    restrictions of `base` cannot be checked by a Checker"""
+    if hasattr(base, 'checker'):
+        return base.checker
+    elif isinstance(base, (IntTypeSpec, Decimal64TypeSpec)):
+        return Checker(ranges=Intervals([base.min], [base.max]))
+    elif isinstance(base, (StringTypeSpec, BinaryTypeSpec)):
+        return Checker()
+    return None
+
+def match_pattern(pattern, val):
+    """Return True if `val` matches the compiled pattern `pattern`, as
+    returned by validate_pattern_expr(), taking invert-match into
+    account"""
+    (regex, _re_pos, invert_match) = pattern
+    return (regex.match(val) is not None) != invert_match
+
+def fuse_patterns(patterns):
+    """Return one regular expression which matches the strings that
+    match all `patterns`, or None"""
+    l = []
+    for (regex, _re_pos, invert_match) in patterns:
+        # each translated pattern is anchored at the end
+        if invert_match:
+            l.append('(?!' + regex.pattern + ')')
+        else:
+            l.append('(?=' + regex.pattern + ')')
+    try:
+        return re.compile(''.join(l), re.UNICODE)
+    except re.error:
+        return None
+
+def first_values(pairs):
+    """Return a dict of key:value for the first pair with each key"""
+    d = {}
+    for (k, v) in pairs:
+        if k not in d:
+            d[k] = v
+    return d
+
 ## type restrictions
 
 def validate_range_expr(errors, stmt, type_):
@@ -340,11 +488,16 @@ class RangeTypeSpec(TypeSpec):
             self.max = base.max
         if hasattr(base, 'fraction_digits'):
             self.fraction_digits = base.fraction_digits
+        self.checker = base_checker(base)
+        if self.checker is not None:
+            self.checker = self.checker.restrict_ranges(ranges)
 
     def str_to_val(self, errors, pos, str):
         return self.base.str_to_val(errors, pos, str)
 
     def validate(self, errors, pos, val, errstr=''):
+        if self.checker is not None and self.checker.check(val):
+            return True
         if self.base.validate(errors, pos, val, errstr) == False:
             return False
         for (lo, hi) in self.ranges:
@@ -417,11 +570,16 @@ class LengthTypeSpec(TypeSpec):
         (lengths, length_pos) = length_spec
         self.lengths = lengths
         self.length_pos = length_pos
+        self.checker = base_checker(base)
+        if self.checker is not None:
+            self.checker = self.checker.restrict_lengths(lengths)
 
     def str_to_val(self, errors, pos, str):
         return self.base.str_to_val(errors, pos, str)
 
     def validate(self, errors, pos, val, errstr=''):
+        if self.checker is not None and self.checker.check(val):
+            return True
         if self.base.validate(errors, pos, val, errstr) == False:
             return False
         vallen = len(val)
@@ -439,81 +597,38 @@ class LengthTypeSpec(TypeSpec):
         return self.base.restrictions()
 
 
-def _validate_pattern_libxml2(errors, stmt, invert_match):
-    try:
-        import libxml2
-        try:
-            re = libxml2.regexpCompile(stmt.arg)
-            return ('libxml2', re, stmt.pos, invert_match)
-        except libxml2.treeError as v:
-            err_add(errors, stmt.pos, 'PATTERN_ERROR', str(v))
-            return None
-    except ImportError:
-    ## Do not report a warning in this case.  Maybe we should add some
-    ## flag to turn on this warning...
-    #        err_add(errors, stmt.pos, 'PATTERN_FAILURE',
-    #                "Could not import python module libxml2 "
-    #                    "(see http://xmlsoft.org for installation help)")
-        return False
-
-def _validate_pattern_lxml(errors, stmt, invert_match):
-    try:
-        import lxml.etree
-        doc = StringIO(
-            '<xsd:schema xmlns:xsd="http://www.w3.org/2001/XMLSchema">' \
-            '  <xsd:element name="a" type="x"/>' \
-            '    <xsd:simpleType name="x">' \
-            '      <xsd:restriction base="xsd:string">' \
-            '        <xsd:pattern value=%s/>' \
-            '      </xsd:restriction>' \
-            '     </xsd:simpleType>' \
-            '   </xsd:schema>' % quoteattr(stmt.arg))
-        try:
-            sch = lxml.etree.XMLSchema(lxml.etree.parse(doc))
-            return ('lxml', sch, stmt.pos, invert_match)
-        except lxml.etree.XMLSchemaParseError as v:
-            err_add(errors, stmt.pos, 'PATTERN_ERROR', str(v))
-            return None
-    except ImportError:
-        return False
-
 def validate_pattern_expr(errors, stmt):
     invert_match = False
     if stmt.search_one('modifier', arg='invert-match') is not None:
         invert_match = True
     ## check that it's syntactically correct
-    # First try with lxml
-    res = _validate_pattern_lxml(errors, stmt, invert_match)
-    if res is not False:
-        return res
-    # Then try with libxml2
-    res = _validate_pattern_libxml2(errors, stmt, invert_match)
-    if res is not False:
-        return res
-    # Otherwise we can't validate patterns :(
-    return None
+    try:
+        regex = xsd_regex.compile(stmt.arg)
+    except SyntaxError as v:
+        err_add(errors, stmt.pos, 'PATTERN_ERROR', str(v))
+        return None
+    return (regex, stmt.pos, invert_match)
 
 class PatternTypeSpec(TypeSpec):
     def __init__(self, base, pattern_specs):
         TypeSpec.__init__(self, base.name)
         self.base = base
         self.res = pattern_specs
+        self.checker = base_checker(base)
+        if self.checker is not None:
+            self.checker = self.checker.restrict_patterns(pattern_specs)
 
     def str_to_val(self, errors, pos, str):
         return self.base.str_to_val(errors, pos, str)
 
     def validate(self, errors, pos, val, errstr=''):
+        if self.checker is not None and self.checker.check(val):
+            return True
         if self.base.validate(errors, pos, val, errstr) == False:
             return False
-        for (type_, re, re_pos, invert_match) in self.res:
-            if type_ == 'libxml2':
-                is_valid = re.regexpExec(val) == 1
-            elif type_ == 'lxml':
-                import lxml
-                doc = StringIO('<a>%s</a>' % escape(val))
-                is_valid = re.validate(lxml.etree.parse(doc))
-            if ((not is_valid and not invert_match) or
-                (is_valid and invert_match)):
+        for pattern in self.res:
+            (_regex, re_pos, _invert_match) = pattern
+            if not match_pattern(pattern, val):
                 err_add(errors, pos, 'TYPE_VALUE',
                         (val, self.definition, 'pattern mismatch' + errstr +
                          ' for pattern defined at ' + str(re_pos)))
@@ -585,9 +700,10 @@ class EnumTypeSpec(TypeSpec):
         TypeSpec.__init__(self, base.name)
         self.base = base
         self.enums = [(e.arg, e.i_value) for e in enums]
+        self.enum_values = first_values(self.enums)
 
     def validate(self, errors, pos, val, errstr = ''):
-        if util.keysearch(val, 0, self.enums) == None:
+        if val not in self.enum_values:
             err_add(errors, pos, 'TYPE_VALUE',
                     (val, self.definition, 'enum not defined' + errstr))
             return False
@@ -595,11 +711,7 @@ class EnumTypeSpec(TypeSpec):
             return True
 
     def get_value(self, val):
-        r  = util.keysearch(val, 0, self.enums)
-        if r is not None:
-            return r[1]
-        else:
-            return None
+        return self.enum_values.get(val)
 
     def restrictions(self):
         return self.base.restrictions()
@@ -662,24 +774,21 @@ class BitTypeSpec(TypeSpec):
         TypeSpec.__init__(self, base.name)
         self.base = base
         self.bits = [(b.arg, b.i_position) for b in bits]
+        self.bit_positions = first_values(self.bits)
 
     def str_to_val(self, errors, pos, str):
         return str.split()
 
     def validate(self, errors, pos, val, errstr = ''):
         for v in val:
-            if util.keysearch(v, 0, self.bits) == None:
+            if v not in self.bit_positions:
                 err_add(errors, pos, 'TYPE_VALUE',
                         (v, self.definition, 'bit not defined' + errstr))
                 return False
         return True
 
     def get_position(self, bit):
-        r  = util.keysearch(bit, 0, self.bits)
-        if r is not None:
-            return r[1]
-        else:
-            return None
+        return self.bit_positions.get(bit)
 
     def restrictions(self):
         return self.base.restrictions()
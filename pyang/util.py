@@ -12,9 +12,29 @@ else:
     def u(x):
         return x
 
+class ChunkWriter(object):
+    """File-like object which collects the strings written to it.
+
+    The strings are written to the underlying file `fd` as one chunk
+    when flush() is called.  This is much cheaper than writing many
+    small strings to a text file, in particular in Python 2 where each
+    write to a codecs writer is encoded separately.  The underlying
+    file is not closed.
+    """
+    def __init__(self, fd):
+        self.fd = fd
+        self.chunks = []
+        # bound method; no Python-level call per write
+        self.write = self.chunks.append
+
+    def flush(self):
+        if self.chunks:
+            self.fd.write(''.join(self.chunks))
+            del self.chunks[:]
+
 def attrsearch(tag, attr, list):
     for x in list:
-        if x.__dict__[attr] == tag:
+        if getattr(x, attr) == tag:
             return x
     return None
 
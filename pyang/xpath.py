@@ -13,6 +13,7 @@ patterns = [
     (')', re.compile(r'\)')),
     ('[', re.compile(r'\[')),
     (']', re.compile(r'\]')),
+    ('number', re.compile(r'[0-9]+(\.[0-9]*)?|\.[0-9]+')),
     ('..', re.compile(r'\.\.')),
     ('.', re.compile(r'\.')),
     ('@', re.compile(r'\@')),
@@ -32,7 +33,6 @@ patterns = [
     ('<', re.compile(r'<')),
     ('*', re.compile(r'\*')),
     # others
-    ('number', re.compile(r'[0-9]+(\.[0-9]+)?')),
     ('prefix-test', re.compile(prefixteststr)),
     ('name', re.compile(ncnamestr)),
     ('attribute', re.compile(r'\@' + ncnamestr)),
@@ -50,11 +50,25 @@ axes = [ 'ancestor-or-self', 'ancestor', 'attribute', 'child',
 re_open_para = re.compile(r'\s*\(')
 re_axis = re.compile(r'\s*::')
 
+# all patterns in one regular expression, tried in the same order as
+# in `patterns`; the name of the group that matched is the token name
+_re_token = re.compile('|'.join(['(?P<t%d>%s)' % (i, r.pattern)
+                                 for (i, (_tokname, r))
+                                 in enumerate(patterns)]))
+_group_tokname = dict([('t%d' % i, tokname)
+                       for (i, (tokname, _r)) in enumerate(patterns)])
+
+_tokens_cache = {}
+_parse_cache = {}
+# the caches are cleared when they reach this size, as in the re module,
+# so that a long-running process does not grow without bounds
+_cache_max = 10000
+
 def validate(s):
     """Validate the XPath expression in the string `s`
     Return True if the expression is correct, and throw
     SyntaxError on failure."""
-    t = tokens(s)
+    parse(s)
     return True
 
 def tokens(s):
@@ -62,55 +76,69 @@ def tokens(s):
     A token is one of the patterns or:
       ('wildcard', '*')
       ('axis', axisname)
+
+    The result is cached, and shared by all callers with the same
+    expression, so it must not be modified.
     """
+    try:
+        toks = _tokens_cache[s]
+    except KeyError:
+        try:
+            toks = _tokens(s)
+        except SyntaxError as e:
+            toks = e
+        if len(_tokens_cache) >= _cache_max:
+            _tokens_cache.clear()
+        _tokens_cache[s] = toks
+    if isinstance(toks, SyntaxError):
+        raise SyntaxError(str(toks))
+    return toks
+
+def _tokens(s):
     pos = 0
     toks = []
     while pos < len(s):
-        matched = False
-        for (tokname, r) in patterns:
-            m = r.match(s, pos)
-            if m is not None:
-                # found a matching token
-                prec = _preceding_token(toks)
-                if tokname == '*' and prec is not None and _is_special(prec):
-                    # XPath 1.0 spec, 3.7 special rule 1a
-                    # interpret '*' as a wildcard
-                    tok = ('wildcard', m.group(0))
-                elif (tokname == 'name' and
-                      prec is not None and not _is_special(prec) and
-                      m.group(0) in operators):
-                    # XPath 1.0 spec, 3.7 special rule 1b
-                    # interpret the name as an operator
-                    tok = (m.group(0), m.group(0))
-                elif tokname == 'name':
-                    # check if next token is '('
-                    if re_open_para.match(s, pos + len(m.group(0))):
-                        # XPath 1.0 spec, 3.7 special rule 2
-                        if m.group(0) in node_types:
-                            # XPath 1.0 spec, 3.7 special rule 2a
-                            tok = (m.group(0), m.group(0))
-                        else:
-                            # XPath 1.0 spec, 3.7 special rule 2b
-                            tok = ('function', m.group(0))
-                    # check if next token is '::'
-                    elif re_axis.match(s, pos + len(m.group(0))):
-                        # XPath 1.0 spec, 3.7 special rule 3
-                        if m.group(0) in axes:
-                            tok = ('axis', m.group(0))
-                        else:
-                            e = "%s: unknown axis %s" % (pos+1, m.group(0))
-                            raise SyntaxError(e)
-                    else:
-                        tok = ('name', m.group(0))
-                else:
-                    tok = (tokname, m.group(0))
-                pos += len(m.group(0))
-                toks.append(tok)
-                matched = True
-                break
-        if matched == False:
+        m = _re_token.match(s, pos)
+        if m is None:
             # no patterns matched
             raise SyntaxError("at position %s" % str(pos+1))
+        tokname = _group_tokname[m.lastgroup]
+        # found a matching token
+        prec = _preceding_token(toks)
+        if tokname == '*' and prec is not None and _is_special(prec):
+            # XPath 1.0 spec, 3.7 special rule 1a
+            # interpret '*' as a wildcard
+            tok = ('wildcard', m.group(0))
+        elif (tokname == 'name' and
+              prec is not None and not _is_special(prec) and
+              m.group(0) in operators):
+            # XPath 1.0 spec, 3.7 special rule 1b
+            # interpret the name as an operator
+            tok = (m.group(0), m.group(0))
+        elif tokname == 'name':
+            # check if next token is '('
+            if re_open_para.match(s, pos + len(m.group(0))):
+                # XPath 1.0 spec, 3.7 special rule 2
+                if m.group(0) in node_types:
+                    # XPath 1.0 spec, 3.7 special rule 2a
+                    tok = (m.group(0), m.group(0))
+                else:
+                    # XPath 1.0 spec, 3.7 special rule 2b
+                    tok = ('function', m.group(0))
+            # check if next token is '::'
+            elif re_axis.match(s, pos + len(m.group(0))):
+                # XPath 1.0 spec, 3.7 special rule 3
+                if m.group(0) in axes:
+                    tok = ('axis', m.group(0))
+                else:
+                    e = "%s: unknown axis %s" % (pos+1, m.group(0))
+                    raise SyntaxError(e)
+            else:
+                tok = ('name', m.group(0))
+        else:
+            tok = (tokname, m.group(0))
+        pos += len(m.group(0))
+        toks.append(tok)
     return toks
 
 def _preceding_token(toks):
@@ -127,6 +155,240 @@ _special_toks = [ ',', '@', '::', '(', '[', '/', '//', '|', '+', '-',
 def _is_special(tok):
     return tok in _special_toks
 
+def parse(s):
+    """Parse the XPath 1.0 expression in the string `s`
+
+    Return the abstract syntax tree of the expression, or throw
+    SyntaxError on failure.  The tree is built from tuples:
+
+      ('or' | 'and' | '=' | '!=' | '<' | '<=' | '>' | '>=' | '+' | '-' |
+       '*' | 'div' | 'mod' | '|', <expr>, <expr>)
+      ('negative', <expr>)
+      ('absolute', [<step>])      an absolute location path
+      ('relative', [<step>])      a relative location path
+      ('filter', <expr>, [<expr>])  an expression with predicates
+      ('path', <expr>, [<step>])  a filter expression followed by a path
+      ('function', name, [<expr>])
+      ('variable', name)
+      ('literal', string)         the string without the quotes
+      ('number', string)
+
+    where <step> is a tuple (axis, <node-test>, [<expr>]), and
+    <node-test> is one of:
+
+      ('name', prefix, name)      prefix is None if there is no prefix
+      ('wildcard', prefix)        prefix is None for '*'
+      ('node-type', type, literal)  literal is None unless type is
+                                  'processing-instruction'
+
+    Abbreviations are expanded, so e.g. '..' is the step
+    ('parent', ('node-type', 'node', None), []).
+
+    The result is cached, and shared by all callers with the same
+    expression, so it must not be modified.
+    """
+    try:
+        res = _parse_cache[s]
+    except KeyError:
+        try:
+            res = _Parser(s, tokens(s)).parse()
+        except SyntaxError as e:
+            res = e
+        if len(_parse_cache) >= _cache_max:
+            _parse_cache.clear()
+        _parse_cache[s] = res
+    if isinstance(res, SyntaxError):
+        raise SyntaxError(str(res))
+    return res
+
+_any_node = ('node-type', 'node', None)
+
+_binary_ops = [['or'],
+               ['and'],
+               ['=', '!='],
+               ['<', '<=', '>', '>='],
+               ['+', '-'],
+               ['*', 'div', 'mod']]
+
+_step_start = ['name', 'prefix-test', 'wildcard', '*', '.', '..', '@',
+               'axis'] + node_types
+
+class _Parser(object):
+    """Recursive descent parser for the grammar in XPath 1.0, section 3"""
+
+    def __init__(self, s, toks):
+        self.toks = []
+        """list of (tokname, value, position); whitespace is removed"""
+        pos = 1
+        for (tokname, value) in toks:
+            if tokname != 'whitespace':
+                self.toks.append((tokname, value, pos))
+            pos += len(value)
+        self.toks.append((None, None, pos))
+        self.i = 0
+
+    def peek(self):
+        return self.toks[self.i][0]
+
+    def next(self):
+        tok = self.toks[self.i]
+        self.i += 1
+        return tok
+
+    def expect(self, tokname):
+        if self.peek() != tokname:
+            self.error("expected '%s'" % tokname)
+        return self.next()
+
+    def error(self, msg=None):
+        (tokname, value, pos) = self.toks[self.i]
+        if tokname is None:
+            e = "at position %s: unexpected end of expression" % pos
+        else:
+            e = "at position %s: unexpected '%s'" % (pos, value)
+        if msg is not None:
+            e += ", " + msg
+        raise SyntaxError(e)
+
+    def parse(self):
+        expr = self.expr(0)
+        if self.peek() is not None:
+            self.error()
+        return expr
+
+    def expr(self, level):
+        if level == len(_binary_ops):
+            return self.unary_expr()
+        left = self.expr(level + 1)
+        while self.peek() in _binary_ops[level]:
+            op = self.next()[0]
+            left = (op, left, self.expr(level + 1))
+        return left
+
+    def unary_expr(self):
+        if self.peek() == '-':
+            self.next()
+            return ('negative', self.unary_expr())
+        left = self.path_expr()
+        while self.peek() == '|':
+            self.next()
+            left = ('|', left, self.path_expr())
+        return left
+
+    def path_expr(self):
+        tokname = self.peek()
+        if tokname in ('/', '//'):
+            return ('absolute', self.absolute_path())
+        elif tokname in _step_start:
+            return ('relative', self.relative_path())
+        expr = self.primary_expr()
+        preds = self.predicates()
+        if len(preds) > 0:
+            expr = ('filter', expr, preds)
+        if self.peek() in ('/', '//'):
+            steps = []
+            if self.next()[0] == '//':
+                steps.append(('descendant-or-self', _any_node, []))
+            return ('path', expr, steps + self.relative_path())
+        return expr
+
+    def primary_expr(self):
+        (tokname, value, _pos) = self.toks[self.i]
+        if tokname == 'variable':
+            self.next()
+            return ('variable', value[1:])
+        elif tokname == '(':
+            self.next()
+            expr = self.expr(0)
+            self.expect(')')
+            return expr
+        elif tokname == 'literal':
+            self.next()
+            return ('literal', value[1:-1])
+        elif tokname == 'number':
+            self.next()
+            return ('number', value)
+        elif tokname == 'function':
+            self.next()
+            self.expect('(')
+            args = []
+            if self.peek() != ')':
+                args.append(self.expr(0))
+                while self.peek() == ',':
+                    self.next()
+                    args.append(self.expr(0))
+            self.expect(')')
+            return ('function', value, args)
+        self.error()
+
+    def absolute_path(self):
+        if self.next()[0] == '//':
+            return ([('descendant-or-self', _any_node, [])] +
+                    self.relative_path())
+        elif self.peek() in _step_start:
+            return self.relative_path()
+        else:
+            return []
+
+    def relative_path(self):
+        steps = [self.step()]
+        while self.peek() in ('/', '//'):
+            if self.next()[0] == '//':
+                steps.append(('descendant-or-self', _any_node, []))
+            steps.append(self.step())
+        return steps
+
+    def step(self):
+        tokname = self.peek()
+        if tokname == '.':
+            self.next()
+            return ('self', _any_node, [])
+        elif tokname == '..':
+            self.next()
+            return ('parent', _any_node, [])
+        if tokname == 'axis':
+            axis = self.next()[1]
+            self.expect('::')
+        elif tokname == '@':
+            self.next()
+            axis = 'attribute'
+        else:
+            axis = 'child'
+        return (axis, self.node_test(), self.predicates())
+
+    def node_test(self):
+        (tokname, value, _pos) = self.toks[self.i]
+        if tokname == 'name':
+            self.next()
+            i = value.find(':')
+            if i == -1:
+                return ('name', None, value)
+            return ('name', value[:i], value[i+1:])
+        elif tokname in ('wildcard', '*'):
+            self.next()
+            return ('wildcard', None)
+        elif tokname == 'prefix-test':
+            self.next()
+            return ('wildcard', value[:-2])
+        elif tokname in node_types:
+            self.next()
+            self.expect('(')
+            literal = None
+            if tokname == 'processing-instruction' and \
+               self.peek() == 'literal':
+                literal = self.next()[1][1:-1]
+            self.expect(')')
+            return ('node-type', tokname, literal)
+        self.error()
+
+    def predicates(self):
+        preds = []
+        while self.peek() == '[':
+            self.next()
+            preds.append(self.expr(0))
+            self.expect(']')
+        return preds
+
 
 def add_prefix(prefix, s):
     "Add `prefix` to all unprefixed names in `s`"
@@ -0,0 +1,551 @@
+"""Translation of XSD regular expressions to Python regular expressions
+
+The pattern statement uses the regular expressions defined in XML
+Schema Part 2, Appendix F.  They differ from Python's regular
+expressions in a number of ways:
+
+  - the expression always matches the entire string
+  - '^' and '$' are normal characters
+  - '.' does not match '\\n' and '\\r'
+  - character classes can be subtracted, e.g. [a-z-[aeiou]]
+  - \\p{..} and \\P{..} match Unicode categories and blocks
+  - \\i and \\c match XML name characters
+  - \\s, \\d and \\w are defined differently
+
+translate() returns the Python regular expression for an XSD regular
+expression.  Character classes are expanded to ranges of characters,
+so that all of the above can be expressed with Python's re module.
+Only \\d and \\D, which are the same in Python with re.UNICODE, are
+kept as they are, unless they are part of a subtraction; this avoids
+building the table of Unicode categories for the common patterns.
+"""
+
+import re
+import sys
+import unicodedata
+
+if sys.version < '3':
+    _chr = unichr
+else:
+    _chr = chr
+
+_translate_cache = {}
+_compile_cache = {}
+# the caches are cleared when they reach this size, as in the re module
+_cache_max = 10000
+
+def compile(s):
+    """Return a compiled Python regular expression for the XSD regular
+    expression `s`, or throw SyntaxError on failure.
+
+    The returned object's match() method returns a match object if the
+    entire string matches.  The result is cached.
+    """
+    try:
+        res = _compile_cache[s]
+    except KeyError:
+        try:
+            res = re.compile(translate(s), re.UNICODE)
+        except SyntaxError as e:
+            res = e
+        except re.error as e:
+            # a construct which the re module cannot handle
+            res = SyntaxError(str(e))
+        if len(_compile_cache) >= _cache_max:
+            _compile_cache.clear()
+        _compile_cache[s] = res
+    if isinstance(res, SyntaxError):
+        raise SyntaxError(str(res))
+    return res
+
+def translate(s):
+    """Return a Python regular expression which matches the same
+    strings as the XSD regular expression `s`, or throw SyntaxError on
+    failure.
+
+    The result is anchored at the end of the string, and should be used
+    with match().
+    """
+    try:
+        res = _translate_cache[s]
+    except KeyError:
+        try:
+            res = '(?:' + _Translator(s).regexp() + ')\\Z'
+        except SyntaxError as e:
+            res = e
+        if len(_translate_cache) >= _cache_max:
+            _translate_cache.clear()
+        _translate_cache[s] = res
+    if isinstance(res, SyntaxError):
+        raise SyntaxError(str(res))
+    return res
+
+### character ranges
+# A set of characters is a sorted list of disjoint (lo, hi) code points.
+
+_maxunicode = sys.maxunicode
+
+def _normalize(ranges):
+    res = []
+    for (lo, hi) in sorted(ranges):
+        hi = min(hi, _maxunicode)
+        if lo > hi:
+            continue
+        if res and lo <= res[-1][1] + 1:
+            if hi > res[-1][1]:
+                res[-1] = (res[-1][0], hi)
+        else:
+            res.append((lo, hi))
+    return res
+
+def _complement(ranges):
+    res = []
+    nxt = 0
+    for (lo, hi) in ranges:
+        if lo > nxt:
+            res.append((nxt, lo - 1))
+        nxt = hi + 1
+    if nxt <= _maxunicode:
+        res.append((nxt, _maxunicode))
+    return res
+
+def _subtract(a, b):
+    return _intersect(a, _complement(b))
+
+def _intersect(a, b):
+    res = []
+    i = j = 0
+    while i < len(a) and j < len(b):
+        lo = max(a[i][0], b[j][0])
+        hi = min(a[i][1], b[j][1])
+        if lo <= hi:
+            res.append((lo, hi))
+        if a[i][1] < b[j][1]:
+            i += 1
+        else:
+            j += 1
+    return res
+
+def _class(ranges, escapes=[], negated=False):
+    """Return a Python character class which matches `ranges` and
+    `escapes`, or the complement of them if `negated` is True"""
+    if not escapes:
+        if negated:
+            ranges = _complement(ranges)
+        if len(ranges) == 0:
+            # matches nothing
+            return '(?!)'
+    l = []
+    for (lo, hi) in ranges:
+        if lo == hi:
+            l.append(_char(lo))
+        elif lo + 1 == hi:
+            l.append(_char(lo) + _char(hi))
+        else:
+            l.append(_char(lo) + '-' + _char(hi))
+    for esc in escapes:
+        l.append(esc.regexp)
+    if escapes and negated:
+        return '[^' + ''.join(l) + ']'
+    return '[' + ''.join(l) + ']'
+
+def _char(c):
+    """Return `c` as a Python regular expression"""
+    if c < 128 and not _chr(c).isalnum():
+        return '\\x%02x' % c
+    return _chr(c)
+
+### Unicode categories and blocks
+
+_categories = None
+
+def _category(name):
+    """Return the ranges for the category `name`, e.g. 'Lu' or 'L'"""
+    global _categories
+    if _categories is None:
+        cats = {}
+        start = 0
+        cur = unicodedata.category(_chr(0))
+        for c in range(1, _maxunicode + 1):
+            cat = unicodedata.category(_chr(c))
+            if cat != cur:
+                cats.setdefault(cur, []).append((start, c - 1))
+                start = c
+                cur = cat
+        cats.setdefault(cur, []).append((start, _maxunicode))
+        for (k, v) in list(cats.items()):
+            cats.setdefault(k[0], []).extend(v)
+        for k in cats:
+            cats[k] = _normalize(cats[k])
+        _categories = cats
+    return _categories.get(name, [])
+
+_category_names = [
+    'L', 'Lu', 'Ll', 'Lt', 'Lm', 'Lo',
+    'M', 'Mn', 'Mc', 'Me',
+    'N', 'Nd', 'Nl', 'No',
+    'P', 'Pc', 'Pd', 'Ps', 'Pe', 'Pi', 'Pf', 'Po',
+    'Z', 'Zs', 'Zl', 'Zp',
+    'S', 'Sm', 'Sc', 'Sk', 'So',
+    'C', 'Cc', 'Cf', 'Co', 'Cn']
+
+# the block names in XML Schema Part 2, F.1.1
+_blocks = [
+    (0x0000, 0x007F, 'BasicLatin'),
+    (0x0080, 0x00FF, 'Latin-1Supplement'),
+    (0x0100, 0x017F, 'LatinExtended-A'),
+    (0x0180, 0x024F, 'LatinExtended-B'),
+    (0x0250, 0x02AF, 'IPAExtensions'),
+    (0x02B0, 0x02FF, 'SpacingModifierLetters'),
+    (0x0300, 0x036F, 'CombiningDiacriticalMarks'),
+    (0x0370, 0x03FF, 'Greek'),
+    (0x0400, 0x04FF, 'Cyrillic'),
+    (0x0530, 0x058F, 'Armenian'),
+    (0x0590, 0x05FF, 'Hebrew'),
+    (0x0600, 0x06FF, 'Arabic'),
+    (0x0700, 0x074F, 'Syriac'),
+    (0x0780, 0x07BF, 'Thaana'),
+    (0x0900, 0x097F, 'Devanagari'),
+    (0x0980, 0x09FF, 'Bengali'),
+    (0x0A00, 0x0A7F, 'Gurmukhi'),
+    (0x0A80, 0x0AFF, 'Gujarati'),
+    (0x0B00, 0x0B7F, 'Oriya'),
+    (0x0B80, 0x0BFF, 'Tamil'),
+    (0x0C00, 0x0C7F, 'Telugu'),
+    (0x0C80, 0x0CFF, 'Kannada'),
+    (0x0D00, 0x0D7F, 'Malayalam'),
+    (0x0D80, 0x0DFF, 'Sinhala'),
+    (0x0E00, 0x0E7F, 'Thai'),
+    (0x0E80, 0x0EFF, 'Lao'),
+    (0x0F00, 0x0FFF, 'Tibetan'),
+    (0x1000, 0x109F, 'Myanmar'),
+    (0x10A0, 0x10FF, 'Georgian'),
+    (0x1100, 0x11FF, 'HangulJamo'),
+    (0x1200, 0x137F, 'Ethiopic'),
+    (0x13A0, 0x13FF, 'Cherokee'),
+    (0x1400, 0x167F, 'UnifiedCanadianAboriginalSyllabics'),
+    (0x1680, 0x169F, 'Ogham'),
+    (0x16A0, 0x16FF, 'Runic'),
+    (0x1780, 0x17FF, 'Khmer'),
+    (0x1800, 0x18AF, 'Mongolian'),
+    (0x1E00, 0x1EFF, 'LatinExtendedAdditional'),
+    (0x1F00, 0x1FFF, 'GreekExtended'),
+    (0x2000, 0x206F, 'GeneralPunctuation'),
+    (0x2070, 0x209F, 'SuperscriptsandSubscripts'),
+    (0x20A0, 0x20CF, 'CurrencySymbols'),
+    (0x20D0, 0x20FF, 'CombiningMarksforSymbols'),
+    (0x2100, 0x214F, 'LetterlikeSymbols'),
+    (0x2150, 0x218F, 'NumberForms'),
+    (0x2190, 0x21FF, 'Arrows'),
+    (0x2200, 0x22FF, 'MathematicalOperators'),
+    (0x2300, 0x23FF, 'MiscellaneousTechnical'),
+    (0x2400, 0x243F, 'ControlPictures'),
+    (0x2440, 0x245F, 'OpticalCharacterRecognition'),
+    (0x2460, 0x24FF, 'EnclosedAlphanumerics'),
+    (0x2500, 0x257F, 'BoxDrawing'),
+    (0x2580, 0x259F, 'BlockElements'),
+    (0x25A0, 0x25FF, 'GeometricShapes'),
+    (0x2600, 0x26FF, 'MiscellaneousSymbols'),
+    (0x2700, 0x27BF, 'Dingbats'),
+    (0x2800, 0x28FF, 'BraillePatterns'),
+    (0x2E80, 0x2EFF, 'CJKRadicalsSupplement'),
+    (0x2F00, 0x2FDF, 'KangxiRadicals'),
+    (0x2FF0, 0x2FFF, 'IdeographicDescriptionCharacters'),
+    (0x3000, 0x303F, 'CJKSymbolsandPunctuation'),
+    (0x3040, 0x309F, 'Hiragana'),
+    (0x30A0, 0x30FF, 'Katakana'),
+    (0x3100, 0x312F, 'Bopomofo'),
+    (0x3130, 0x318F, 'HangulCompatibilityJamo'),
+    (0x3190, 0x319F, 'Kanbun'),
+    (0x31A0, 0x31BF, 'BopomofoExtended'),
+    (0x3200, 0x32FF, 'EnclosedCJKLettersandMonths'),
+    (0x3300, 0x33FF, 'CJKCompatibility'),
+    (0x3400, 0x4DB5, 'CJKUnifiedIdeographsExtensionA'),
+    (0x4E00, 0x9FFF, 'CJKUnifiedIdeographs'),
+    (0xA000, 0xA48F, 'YiSyllables'),
+    (0xA490, 0xA4CF, 'YiRadicals'),
+    (0xAC00, 0xD7A3, 'HangulSyllables'),
+    (0xD800, 0xDB7F, 'HighSurrogates'),
+    (0xDB80, 0xDBFF, 'HighPrivateUseSurrogates'),
+    (0xDC00, 0xDFFF, 'LowSurrogates'),
+    (0xE000, 0xF8FF, 'PrivateUse'),
+    (0xF900, 0xFAFF, 'CJKCompatibilityIdeographs'),
+    (0xFB00, 0xFB4F, 'AlphabeticPresentationForms'),
+    (0xFB50, 0xFDFF, 'ArabicPresentationForms-A'),
+    (0xFE20, 0xFE2F, 'CombiningHalfMarks'),
+    (0xFE30, 0xFE4F, 'CJKCompatibilityForms'),
+    (0xFE50, 0xFE6F, 'SmallFormVariants'),
+    (0xFE70, 0xFEFE, 'ArabicPresentationForms-B'),
+    (0xFEFF, 0xFEFF, 'Specials'),
+    (0xFF00, 0xFFEF, 'HalfwidthandFullwidthForms'),
+    (0xFFF0, 0xFFFD, 'Specials'),
+    (0x10300, 0x1032F, 'OldItalic'),
+    (0x10330, 0x1034F, 'Gothic'),
+    (0x10400, 0x1044F, 'Deseret'),
+    (0x1D000, 0x1D0FF, 'ByzantineMusicalSymbols'),
+    (0x1D100, 0x1D1FF, 'MusicalSymbols'),
+    (0x1D400, 0x1D7FF, 'MathematicalAlphanumericSymbols'),
+    (0x20000, 0x2A6D6, 'CJKUnifiedIdeographsExtensionB'),
+    (0x2F800, 0x2FA1F, 'CJKCompatibilityIdeographsSupplement'),
+    (0xE0000, 0xE007F, 'Tags'),
+    (0xF0000, 0xFFFFD, 'PrivateUse'),
+    (0x100000, 0x10FFFD, 'PrivateUse'),
+    ]
+
+def _block(name):
+    res = [(lo, hi) for (lo, hi, n) in _blocks if n == name]
+    if len(res) == 0:
+        return None
+    return _normalize(res)
+
+def _property(name):
+    """Return the ranges for \\p{`name`}, or None if unknown"""
+    if name in _category_names:
+        return _category(name)
+    if name.startswith('Is'):
+        return _block(name[2:])
+    return None
+
+### multi-character escapes
+
+# XML 1.0 (Fifth Edition) NameStartChar
+_name_start_chars = _normalize([
+    (ord(':'), ord(':')), (ord('A'), ord('Z')), (ord('_'), ord('_')),
+    (ord('a'), ord('z')), (0xC0, 0xD6), (0xD8, 0xF6), (0xF8, 0x2FF),
+    (0x370, 0x37D), (0x37F, 0x1FFF), (0x200C, 0x200D), (0x2070, 0x218F),
+    (0x2C00, 0x2FEF), (0x3001, 0xD7FF), (0xF900, 0xFDCF),
+    (0xFDF0, 0xFFFD), (0x10000, 0xEFFFF)])
+
+_name_chars = _normalize(_name_start_chars + [
+    (ord('-'), ord('-')), (ord('.'), ord('.')), (ord('0'), ord('9')),
+    (0xB7, 0xB7), (0x300, 0x36F), (0x203F, 0x2040)])
+
+_space_chars = _normalize([(0x9, 0xA), (0xD, 0xD), (0x20, 0x20)])
+
+class _PyEscape(object):
+    """A multi-character escape which means the same in Python"""
+    def __init__(self, regexp, ranges):
+        self.regexp = regexp
+        self._ranges = ranges
+
+    def ranges(self):
+        return self._ranges()
+
+_digit = _PyEscape('\\d', lambda: _category('Nd'))
+_non_digit = _PyEscape('\\D', lambda: _complement(_category('Nd')))
+
+def _multi_char_escape(c):
+    """Return the ranges for the escape \\`c`, a _PyEscape, or None"""
+    if c == 's':
+        return _space_chars
+    elif c == 'S':
+        return _complement(_space_chars)
+    elif c == 'i':
+        return _name_start_chars
+    elif c == 'I':
+        return _complement(_name_start_chars)
+    elif c == 'c':
+        return _name_chars
+    elif c == 'C':
+        return _complement(_name_chars)
+    elif c == 'd':
+        return _digit
+    elif c == 'D':
+        return _non_digit
+    elif c == 'w':
+        return _complement(_normalize(_category('P') + _category('Z') +
+                                      _category('C')))
+    elif c == 'W':
+        return _normalize(_category('P') + _category('Z') + _category('C'))
+    return None
+
+_single_char_escapes = {
+    'n': '\n', 'r': '\r', 't': '\t',
+    '\\': '\\', '|': '|', '.': '.', '?': '?', '*': '*', '+': '+',
+    '(': '(', ')': ')', '{': '{', '}': '}', '-': '-', '[': '[', ']': ']',
+    '^': '^'}
+
+# '.' matches all characters except newline and carriage return
+_wildcard = _complement([(0xA, 0xA), (0xD, 0xD)])
+
+_re_quantity = re.compile(r'\{([0-9]+)(,([0-9]*))?\}')
+
+def _class_ranges(ranges, escapes, negated):
+    """Return the ranges matched by a character class expression"""
+    for esc in escapes:
+        ranges = ranges + esc.ranges()
+    ranges = _normalize(ranges)
+    if negated:
+        ranges = _complement(ranges)
+    return ranges
+
+class _Translator(object):
+    """Recursive descent translator, following the grammar in XML
+    Schema Part 2, Appendix F"""
+
+    def __init__(self, s):
+        self.s = s
+        self.i = 0
+
+    def error(self, msg):
+        raise SyntaxError("at position %s: %s" % (self.i + 1, msg))
+
+    def peek(self):
+        if self.i < len(self.s):
+            return self.s[self.i]
+        return None
+
+    def regexp(self):
+        res = self.branches()
+        if self.i < len(self.s):
+            self.error("unexpected '%s'" % self.s[self.i])
+        return res
+
+    def branches(self):
+        res = [self.branch()]
+        while self.peek() == '|':
+            self.i += 1
+            res.append(self.branch())
+        return '|'.join(res)
+
+    def branch(self):
+        res = []
+        while self.peek() not in (None, '|', ')'):
+            res.append(self.piece())
+        return ''.join(res)
+
+    def piece(self):
+        atom = self.atom()
+        c = self.peek()
+        if c in ('?', '*', '+'):
+            self.i += 1
+            return atom + c
+        elif c == '{':
+            m = _re_quantity.match(self.s, self.i)
+            if m is None:
+                self.error("bad quantifier")
+            self.i = m.end()
+            (lo, hi) = (m.group(1), m.group(3))
+            if hi is not None and hi != '' and int(hi) < int(lo):
+                self.error("bad quantifier")
+            return atom + m.group(0)
+        return atom
+
+    def atom(self):
+        c = self.s[self.i]
+        if c == '(':
+            self.i += 1
+            res = self.branches()
+            if self.peek() != ')':
+                self.error("missing ')'")
+            self.i += 1
+            return '(?:' + res + ')'
+        elif c == '[':
+            return _class(*self.char_class_expr())
+        elif c == '.':
+            self.i += 1
+            return _class(_wildcard)
+        elif c == '\\':
+            esc = self.escape()
+            if isinstance(esc, list):
+                return _class(esc)
+            if isinstance(esc, _PyEscape):
+                return esc.regexp
+            return _char(ord(esc))
+        elif c in '?*+{':
+            self.error("nothing to repeat")
+        elif c == ']':
+            self.error("unexpected ']'")
+        self.i += 1
+        return _char(ord(c))
+
+    def escape(self):
+        """Parse an escape; return a character, a list of ranges or a
+        _PyEscape"""
+        self.i += 1
+        c = self.peek()
+        if c is None:
+            self.error("incomplete escape")
+        self.i += 1
+        if c in _single_char_escapes:
+            return _single_char_escapes[c]
+        if c in ('p', 'P'):
+            if self.peek() != '{':
+                self.error("expected '{'")
+            j = self.s.find('}', self.i)
+            if j == -1:
+                self.error("missing '}'")
+            name = self.s[self.i+1:j]
+            ranges = _property(name)
+            if ranges is None:
+                self.error("unknown property '%s'" % name)
+            self.i = j + 1
+            if c == 'P':
+                return _complement(ranges)
+            return ranges
+        ranges = _multi_char_escape(c)
+        if ranges is None:
+            self.i -= 1
+            self.error("unknown escape '\\%s'" % c)
+        return ranges
+
+    def char_class_expr(self):
+        """Parse '[' charGroup ']', and return (ranges, escapes, negated)
+
+        `escapes` is a list of _PyEscape which are matched in addition
+        to `ranges`.
+        """
+        self.i += 1
+        negated = False
+        if self.peek() == '^':
+            negated = True
+            self.i += 1
+        ranges = []
+        escapes = []
+        first = True
+        while True:
+            c = self.peek()
+            if c is None:
+                self.error("missing ']'")
+            elif c == ']' and not first:
+                self.i += 1
+                break
+            elif c == '-' and self.s[self.i+1:self.i+2] == '[' and not first:
+                # subtraction
+                self.i += 1
+                sub = _class_ranges(*self.char_class_expr())
+                if self.peek() != ']':
+                    self.error("expected ']' after subtraction")
+                self.i += 1
+                ranges = _class_ranges(ranges, escapes, negated)
+                return (_subtract(ranges, sub), [], False)
+            elif c == '[':
+                self.error("unexpected '['")
+            first = False
+            lo = self.class_char()
+            if isinstance(lo, list):
+                ranges.extend(lo)
+                continue
+            if isinstance(lo, _PyEscape):
+                escapes.append(lo)
+                continue
+            if (self.peek() == '-' and
+                self.s[self.i+1:self.i+2] not in (']', '[', '')):
+                self.i += 1
+                hi = self.class_char()
+                if isinstance(hi, (list, _PyEscape)):
+                    self.error("bad character range")
+                if ord(hi) < ord(lo):
+                    self.error("bad character range")
+                ranges.append((ord(lo), ord(hi)))
+            else:
+                ranges.append((ord(lo), ord(lo)))
+        return (_normalize(ranges), escapes, negated)
+
+    def class_char(self):
+        """Parse a character or escape in a character group"""
+        c = self.s[self.i]
+        if c == '\\':
+            return self.escape()
+        self.i += 1
+        return c
@@ -6,18 +6,45 @@ from . import error
 from . import util
 from . import statements
 from . import syntax
-import collections
+from . import grammar
+import re
 import sys
 
+re_space = re.compile(r'\s*', re.UNICODE)
+re_dquote_special = re.compile(r'["\\]')
+re_unquoted_end = re.compile(r'\s|[;{}]|//|/\*|\*/', re.UNICODE)
+
 class YangTokenizer(object):
+    """Tokenizer for YANG text
+
+    The tokenizer works on offsets into the text, which is never copied
+    or sliced except to produce the tokens.  The text is handled line by
+    line, in order to keep track of the current line number in `pos`,
+    and to check the line length.
+    """
+
     def __init__(self, text, pos, errors,
                  max_line_len=None, keep_comments=False,
                  strict_quoting = False):
-        self.lines = collections.deque(text.splitlines(True))
+        self.text = text
+        # the offset of the end of each line, with lines split as by
+        # text.splitlines()
+        self.line_ends = []
+        end = 0
+        for line in text.splitlines(True):
+            end += len(line)
+            self.line_ends.append(end)
+        self.next_line = 0
+        """Index in line_ends of the next line to read"""
+        self.nlines = len(self.line_ends)
         self.pos = pos
-        self.buf = ''
-        self.offset = 0
-        """Position on line.  Used to remove leading whitespace from strings."""
+        self.i = 0
+        """Offset in text of the next character to read"""
+        self.eol = 0
+        """Offset in text of the end of the current line"""
+        self.bol = 0
+        """Offset in text of the start of the current line.  Used to
+        remove leading whitespace from strings."""
 
         self.max_line_len = max_line_len
         if self.max_line_len == 0:
@@ -28,15 +55,17 @@ class YangTokenizer(object):
         self.strict_quoting = strict_quoting
 
     def readline(self):
-        if len(self.lines) == 0:
+        if self.next_line == self.nlines:
             raise error.Eof
-        self.buf = self.lines.popleft()
+        self.i = self.bol = self.eol
+        self.eol = self.line_ends[self.next_line]
+        self.next_line += 1
         self.pos.line += 1
-        self.offset = 0
         if self.max_line_len is not None:
-            curlen = len(self.buf)
-            if curlen >= 1 and self.buf[-1] == '\n':
-                if curlen >= 2 and self.buf[-2] == '\r':
+            curlen = self.eol - self.bol
+            text = self.text
+            if curlen >= 1 and text[self.eol-1] == '\n':
+                if curlen >= 2 and text[self.eol-2] == '\r':
                     curlen -= 2
                 else:
                     curlen -= 1
@@ -44,87 +73,86 @@ class YangTokenizer(object):
                 error.err_add(self.errors, self.pos, 'LONG_LINE',
                               (curlen, self.max_line_len))
 
-    def set_buf(self, i):
-        self.offset = self.offset + i
-        self.buf = self.buf[i:]
-
     def skip(self):
         """Skip whitespace and count position"""
-        buflen = len(self.buf)
-
+        text = self.text
+        if self.i < self.eol:
+            # fast path; we are already at the next token
+            c = text[self.i]
+            if not c.isspace() and (c != '/' or self.keep_comments):
+                return
         while True:
-            self.buf = self.buf.lstrip()
-            if self.buf == '':
+            self.i = re_space.match(text, self.i, self.eol).end()
+            if self.i == self.eol:
                 self.readline()
-                buflen = len(self.buf)
-            else:
-                self.offset += (buflen - len(self.buf))
-                break
-
-        # do not keep comments in the syntax tree
-        if not self.keep_comments:
+                continue
+            # do not keep comments in the syntax tree
+            if self.keep_comments or text[self.i] != '/':
+                return
             # skip line comment
-            if self.buf[0] == '/':
-                if self.buf[1] == '/':
-                    self.readline()
-                    return self.skip()
+            if text[self.i+1] == '/':
+                self.readline()
             # skip block comment
-                elif self.buf[1] == '*':
-                    i = self.buf.find('*/')
-                    while i == -1:
-                        self.readline()
-                        i = self.buf.find('*/')
-                    self.set_buf(i+2)
-                    return self.skip()
+            elif text[self.i+1] == '*':
+                i = text.find('*/', self.i, self.eol)
+                while i == -1:
+                    self.readline()
+                    i = text.find('*/', self.i, self.eol)
+                self.i = i + 2
+            else:
+                return
 
     def get_comment(self):
         """ret: string()"""
         self.skip()
-        offset = self.offset
-        m = syntax.re_comment.match(self.buf)
+        text = self.text
+        offset = self.i - self.bol
+        m = syntax.re_comment.match(text, self.i, self.eol)
         if m == None:
             return None
         else:
             cmt = m.group(0)
-            self.set_buf(m.end())
+            self.i = m.end()
             # look for a multiline comment
             if cmt[:2] == '/*' and cmt[-2:] != '*/':
-                i = self.buf.find('*/')
+                i = text.find('*/', self.i, self.eol)
                 while i == -1:
                     self.readline()
                     # remove at most the same number of whitespace as
                     # the comment start was indented
-                    j = 0
-                    while (j < offset and
-                           self.buf[j].isspace()):
+                    j = self.i
+                    while (j < self.eol and j - self.bol < offset and
+                           text[j].isspace()):
                         j = j + 1
-                    self.buf = self.buf[j:]
-                    cmt += '\n'+self.buf.replace('\n','')
-                    i = self.buf.find('*/')
-                self.set_buf(i+2)
+                    self.i = self.bol = j
+                    cmt += '\n' + text[j:self.eol].replace('\n','')
+                    i = text.find('*/', self.i, self.eol)
+                self.i = i + 2
             self.skip()
             return cmt
 
     def get_keyword(self):
         """ret: identifier | (prefix, identifier)"""
         self.skip()
+        text = self.text
 
-        m = syntax.re_keyword.match(self.buf)
+        m = syntax.re_keyword.match(text, self.i, self.eol)
         if m == None:
             error.err_add(self.errors, self.pos,
-                          'SYNTAX_ERROR', 'illegal keyword: ' + self.buf)
+                          'SYNTAX_ERROR',
+                          'illegal keyword: ' + text[self.i:self.eol])
             raise error.Abort
         else:
-            self.set_buf(m.end())
+            i = self.i = m.end()
             # check the separator
-            if (self.buf[0].isspace() or
-                (self.buf[0] == '/' and self.buf[1] in ('/', '*')) or
-                (self.buf[0] in (';','{'))):
+            if (text[i].isspace() or
+                (text[i] == '/' and text[i+1] in ('/', '*')) or
+                (text[i] in (';','{'))):
                 pass
             else:
                 error.err_add(self.errors, self.pos,
                               'SYNTAX_ERROR', 'expected separator, got: "' +
-                              self.buf[:6] + '..."')
+                              text[i:min(i+6, self.eol)] + '..."')
                 raise error.Abort
 
             if m.group(2) == None: # no prefix
@@ -139,47 +167,55 @@ class YangTokenizer(object):
         without consuming it.  Use skip_tok() to consume the characater.
         """
         self.skip()
-        try:
-            return self.buf[0]
-        except:
-            raise error.Eof
+        return self.text[self.i]
 
     def skip_tok(self):
         self.skip()
-        self.set_buf(1)
+        self.i += 1
 
     def get_string(self, need_quote=False):
         """ret: string"""
         self.skip()
+        text = self.text
 
-        if self.buf[0] == ';' or self.buf[0] == '{' or self.buf[0] == '}':
+        if text[self.i] in (';', '{', '}'):
             error.err_add(self.errors, self.pos,
-                          'EXPECTED_ARGUMENT', self.buf[0])
+                          'EXPECTED_ARGUMENT', text[self.i])
             raise error.Abort
-        if self.buf[0] == '"' or self.buf[0] == "'":
+        if text[self.i] == '"' or text[self.i] == "'":
             # for double-quoted string,  loop over string and translate
             # escaped characters.  also strip leading whitespace as
             # necessary.
             # for single-quoted string, keep going until end quote is found.
-            quote_char = self.buf[0]
+            quote_char = text[self.i]
             # collect output in strs (list of strings)
             strs = []
             # remember position of " character
-            indentpos = self.offset
-            i = 1
+            indentpos = self.i - self.bol
+            i = self.i + 1
             while True:
-                buflen = len(self.buf)
+                eol = self.eol
                 start = i
-                while i < buflen:
-                    if self.buf[i] == quote_char:
-                        # end-of-string; copy the buf to output
-                        strs.append(self.buf[start:i])
-                        # and trim buf
-                        self.set_buf(i+1)
+                while i < eol:
+                    # find the next quote or backslash on this line
+                    if quote_char == '"':
+                        m = re_dquote_special.search(text, i, eol)
+                        if m is None:
+                            break
+                        i = m.start()
+                    else:
+                        i = text.find(quote_char, i, eol)
+                        if i == -1:
+                            break
+                    if text[i] == quote_char:
+                        # end-of-string; copy the text to output
+                        strs.append(text[start:i])
+                        # and skip the quote
+                        self.i = i + 1
                         # check for '+' operator
                         self.skip()
-                        if self.buf[0] == '+':
-                            self.set_buf(1)
+                        if text[self.i] == '+':
+                            self.i += 1
                             self.skip()
                             nstr = self.get_string(need_quote=True)
                             if (type(nstr) != type(u'')):
@@ -188,60 +224,52 @@ class YangTokenizer(object):
                                 raise error.Abort
                             strs.append(nstr)
                         return u''.join(strs)
-                    elif (quote_char == '"' and
-                          self.buf[i] == '\\' and i < (buflen-1)):
-                        # check for special characters
+                    elif i < (eol-1):
+                        # a backslash; check for special characters
                         special = None
-                        if self.buf[i+1] == 'n':
+                        if text[i+1] == 'n':
                             special = '\n'
-                        elif self.buf[i+1] == 't':
+                        elif text[i+1] == 't':
                             special = '\t'
-                        elif self.buf[i+1] == '\"':
+                        elif text[i+1] == '\"':
                             special = '\"'
-                        elif self.buf[i+1] == '\\':
+                        elif text[i+1] == '\\':
                             special = '\\'
                         elif self.strict_quoting and self.is_1_1:
                             error.err_add(self.errors, self.pos,
-                                          'ILLEGAL_ESCAPE', self.buf[i+1])
+                                          'ILLEGAL_ESCAPE', text[i+1])
                             raise error.Abort
                         elif self.strict_quoting:
                             error.err_add(self.errors, self.pos,
-                                          'ILLEGAL_ESCAPE_WARN', self.buf[i+1])
+                                          'ILLEGAL_ESCAPE_WARN', text[i+1])
                         if special != None:
-                            strs.append(self.buf[start:i])
+                            strs.append(text[start:i])
                             strs.append(special)
                             i = i + 1
                             start = i + 1
                     i = i + 1
                 # end-of-line, keep going
-                strs.append(self.buf[start:i])
+                strs.append(text[start:eol])
                 self.readline()
-                i = 0
+                i = self.bol
                 if quote_char == '"':
-                    # skip whitespace used for indentation
-                    buflen = len(self.buf)
-                    while (i < buflen and self.buf[i].isspace() and
-                           i <= indentpos):
-                        i = i + 1
-                    if i == buflen:
+                    # skip whitespace used for indentation, up to and
+                    # including the column of the starting quote
+                    i = re_space.match(text, i,
+                                       min(self.eol, i + indentpos + 1)).end()
+                    if i == self.eol:
                         # whitespace only on this line; keep it as is
-                        i = 0
+                        i = self.bol
         elif need_quote == True:
             error.err_add(self.errors, self.pos, 'EXPECTED_QUOTED_STRING', ())
             raise error.Abort
         else:
             # unquoted string
-            buflen = len(self.buf)
-            i = 0
-            while i < buflen:
-                if (self.buf[i].isspace() or self.buf[i] == ';' or
-                    self.buf[i] == '{' or self.buf[i] == '}' or
-                    self.buf[i:i+2] == '//' or self.buf[i:i+2] == '/*' or
-                    self.buf[i:i+2] == '*/'):
-                    res = self.buf[:i]
-                    self.set_buf(i)
-                    return res
-                i = i + 1
+            m = re_unquoted_end.search(text, self.i, self.eol)
+            if m is not None:
+                res = text[self.i:m.start()]
+                self.i = m.start()
+                return res
 
 class YangParser(object):
     def __init__(self, extra={}):
@@ -322,6 +350,115 @@ class YangParser(object):
             raise error.Abort
         return stmt
 
+def peek_revision(ref, text):
+    """Return the latest revision of the YANG (sub)module in `text`.
+
+    Only the header of the module is scanned; the scan stops at the
+    first statement that is not a header, linkage, meta or revision
+    statement.  Returns "unknown" if the module has no revision, and
+    None if the header could not be scanned.  No errors are reported.
+    """
+    tokenizer = YangTokenizer(text, error.Position(ref), [])
+    revs = []
+    try:
+        keywd = tokenizer.get_keyword()
+        if keywd not in ('module', 'submodule'):
+            return None
+        tokenizer.get_string()
+        if tokenizer.peek() != '{':
+            return None
+        tokenizer.skip_tok()
+        while tokenizer.peek() != '}':
+            keywd = tokenizer.get_keyword()
+            if (not util.is_prefixed(keywd) and
+                keywd not in grammar.header_keywords):
+                break
+            if tokenizer.peek() in ('{', ';'):
+                arg = None
+            else:
+                arg = tokenizer.get_string()
+            if keywd == 'revision' and arg is not None:
+                revs.append(arg)
+            _skip_substatements(tokenizer)
+    except (error.Abort, error.Eof):
+        return None
+    if revs == []:
+        return "unknown"
+    return max(revs)
+
+_linkage_keywords = ('prefix', 'belongs-to', 'import', 'include', 'revision')
+
+def peek_linkage(ref, text):
+    """Return the statements of the YANG (sub)module in `text` which
+    refer to other modules, without parsing the module.
+
+    Returns (`keyword`, `arg`, `stmts`) where `keyword` and `arg` are
+    those of the module or submodule statement, and `stmts` is a list
+    of (`keyword`, `arg`, `substmts`) for the prefix, belongs-to,
+    import, include, revision, augment and deviation statements of the
+    module.  `substmts` is a list of (`keyword`, `arg`) of the
+    substatements; it is empty for augment and deviation.  Returns
+    None if the text could not be scanned.  No errors are reported.
+    """
+    tokenizer = YangTokenizer(text, error.Position(ref), [])
+    stmts = []
+    try:
+        modkeywd = tokenizer.get_keyword()
+        if modkeywd not in ('module', 'submodule'):
+            return None
+        modarg = tokenizer.get_string()
+        if tokenizer.peek() != '{':
+            return None
+        tokenizer.skip_tok()
+        while tokenizer.peek() != '}':
+            keywd = tokenizer.get_keyword()
+            if tokenizer.peek() in ('{', ';'):
+                arg = None
+            else:
+                arg = tokenizer.get_string()
+            if keywd in _linkage_keywords:
+                stmts.append((keywd, arg, _get_substatements(tokenizer)))
+            else:
+                if keywd in ('augment', 'deviation'):
+                    stmts.append((keywd, arg, []))
+                _skip_substatements(tokenizer)
+    except (error.Abort, error.Eof):
+        return None
+    return (modkeywd, modarg, stmts)
+
+def _get_substatements(tokenizer):
+    substmts = []
+    tok = tokenizer.peek()
+    tokenizer.skip_tok()
+    if tok == ';':
+        return substmts
+    elif tok != '{':
+        raise error.Abort
+    while tokenizer.peek() != '}':
+        keywd = tokenizer.get_keyword()
+        if tokenizer.peek() in ('{', ';'):
+            arg = None
+        else:
+            arg = tokenizer.get_string()
+        substmts.append((keywd, arg))
+        _skip_substatements(tokenizer)
+    tokenizer.skip_tok()
+    return substmts
+
+def _skip_substatements(tokenizer):
+    tok = tokenizer.peek()
+    tokenizer.skip_tok()
+    if tok == ';':
+        return
+    elif tok != '{':
+        raise error.Abort
+    while tokenizer.peek() != '}':
+        tokenizer.get_keyword()
+        if tokenizer.peek() not in ('{', ';'):
+            tokenizer.get_string()
+        _skip_substatements(tokenizer)
+    tokenizer.skip_tok()
+
 # FIXME: tmp debug
 import sys
 
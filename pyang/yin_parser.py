@@ -389,3 +389,46 @@ class YinParser(object):
                     return r
         return None
 
+
+class _HeaderScanned(Exception):
+    """raised to stop the parser when the header has been scanned"""
+    pass
+
+def peek_revision(ref, text):
+    """Return the latest revision of the YIN (sub)module in `text`.
+
+    Only the header of the module is scanned; the scan stops at the
+    first statement that is not a header, linkage, meta or revision
+    statement.  Returns "unknown" if the module has no revision, and
+    None if the header could not be scanned.  No errors are reported.
+    """
+    parser = expat.ParserCreate("UTF-8", YinParser.ns_sep)
+    revs = []
+    stack = []
+    def start_element(name, attrs):
+        (ns, local_name) = YinParser.split_qname(name)
+        if len(stack) == 0:
+            if ns != yin_namespace or local_name not in ('module',
+                                                         'submodule'):
+                raise error.Abort
+        elif len(stack) == 1 and ns == yin_namespace:
+            if local_name not in grammar.header_keywords:
+                raise _HeaderScanned
+            if local_name == 'revision' and 'date' in attrs:
+                revs.append(attrs['date'])
+        stack.append(local_name)
+    def end_element(name):
+        del stack[-1]
+        if len(stack) == 0:
+            raise _HeaderScanned
+    parser.StartElementHandler = start_element
+    parser.EndElementHandler = end_element
+    try:
+        parser.Parse(text.encode('utf-8'), True)
+    except _HeaderScanned:
+        pass
+    except (error.Abort, expat.ExpatError):
+        return None
+    if revs == []:
+        return "unknown"
+    return max(revs)
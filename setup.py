@@ -57,9 +57,9 @@ if os.name == "nt":
     pyang_bat_file = "{}/{}.bat".format(tempfile.gettempdir(), "pyang")
     with open(pyang_bat_file, 'w') as script:
         script.write('@echo off\npython %cd%\pyang %*\n')
-    script_files = ['bin/pyang', 'bin/yang2html', 'bin/yang2dsdl', 'bin/json2xml', pyang_bat_file]
+    script_files = ['bin/pyang', 'bin/yang2html', 'bin/yang2dsdl', 'bin/json2xml', 'bin/pyang-bench', pyang_bat_file]
 else:
-    script_files = ['bin/pyang', 'bin/yang2html', 'bin/yang2dsdl', 'bin/json2xml']
+    script_files = ['bin/pyang', 'bin/yang2html', 'bin/yang2dsdl', 'bin/json2xml', 'bin/pyang-bench']
 
 setup(name='pyang',
       version=pyang.__version__,
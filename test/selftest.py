@@ -3,14 +3,18 @@
 # check that some internal data structures are conistent
 
 import sys
+import os
 import glob
 import subprocess
+import optparse
+import importlib
 
 
 from pyang import util
 from pyang import error
 from pyang import grammar
 from pyang import syntax
+from pyang import plugin
 
 def oscmd(cmd):
     p = subprocess.Popen(cmd, shell=True,
@@ -49,8 +53,39 @@ def chk_stmts():
                     sys.stderr.write("Stmt %s in %s not found in %s" % \
                                          (stmt, name, tname))
 
+def chk_plugins():
+    """Check that plugin.builtin_plugins matches the builtin plugins"""
+    global found_error
+    sys.path.insert(0, "../pyang/plugins")
+    names = []
+    for (name, formats, options, _always) in plugin.builtin_plugins:
+        names.append(name)
+        n = len(plugin.plugins)
+        importlib.import_module(name).pyang_plugin_init()
+        fmts = {}
+        optparser = optparse.OptionParser(add_help_option=False)
+        for p in plugin.plugins[n:]:
+            p.add_output_format(fmts)
+            p.add_opts(optparser)
+        opts = []
+        for opt in optparser._get_all_options():
+            opts.extend(opt._short_opts + opt._long_opts)
+        if sorted(fmts) != sorted(formats) or sorted(opts) != sorted(options):
+            sys.stderr.write("Plugin %s: formats %s and options %s "
+                             "do not match plugin.builtin_plugins\n" %
+                             (name, sorted(fmts), sorted(opts)))
+            found_error = True
+    del plugin.plugins[:]
+    for fname in os.listdir("../pyang/plugins"):
+        if (fname.endswith(".py") and fname != '__init__.py' and
+            fname[:-3] not in names):
+            sys.stderr.write("Plugin %s not in plugin.builtin_plugins\n" %
+                             fname[:-3])
+            found_error = True
+
 chk_error_codes()
 chk_stmts()
+chk_plugins()
 if found_error:
     sys.exit(1)
 
@@ -0,0 +1,21 @@
+{
+ "file": "a.yang",
+ "fingerprints": {
+  "data /server": "845c955523ef75f1b1fc31cfa4b66457ee5b0c10",
+  "data /server/client": "babad282b9d17861e9b79a027ea17a303fdda1d4",
+  "data /server/client/kind": "a3937ebb75a3568144b03dc2c66ea813f9377341",
+  "data /server/client/name": "dffaf51860c47ea65f3062b02b8100d4bc01ee1b",
+  "data /server/ip": "7117edef64bb6008f4220df16eb4e1b3568619f0",
+  "data /server/load": "08d0d1804578cbcf5176a6aa39168d84c73ef046",
+  "data /server/port": "e930dc1279a98746cbd861144bd1d3b05bc56703",
+  "data /stats": "f20ba64fc436f8b109d1bbf2fa4973b29abd43e6",
+  "data /stats/count": "94e03a0f456045186259d996ebd8963162c2dd2b",
+  "grouping address": "a7bed8a56f2c927cbef86e43cd09d4b4de1ca9b9",
+  "identity x": "7c56580acc617d427387d6326528ad30d5c7085b",
+  "typedef percent": "ed5118170f38619fea6f7d5e1bd6d432a644f61e"
+ },
+ "module": "a",
+ "namespace": "urn:a",
+ "revision": "2014-03-01",
+ "version": 1
+}